@@ -1,25 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Response, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 import uuid
-from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 import jwt
 import bcrypt
 import base64
-from PIL import Image
+from PIL import Image, ImageOps, features
 import io
 import re
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from enum import Enum
 import json
 import asyncio
+import heapq
+import itertools
+import math
+import numpy as np
+import hashlib
+import secrets
+import time
+import multiprocessing
+from array import array
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from bson.int64 import Int64
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -32,7 +49,48 @@ db = client[os.environ['DB_NAME']]
 # JWT Configuration
 JWT_SECRET = "your-secret-key-change-in-production"
 JWT_ALGORITHM = "HS256"
-JWT_EXPIRATION_HOURS = 24
+# Access tokens are short-lived and carry their own claims; sessions are kept alive with refresh tokens
+ACCESS_TOKEN_EXPIRATION_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRATION_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRATION_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRATION_DAYS', '30'))
+# How often each worker pulls new logouts/bans from the revocations collection
+REVOCATION_SYNC_SECONDS = int(os.environ.get('REVOCATION_SYNC_SECONDS', '5'))
+
+# Authenticated principals cached per worker so most requests skip the users lookup
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '30'))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', '50000'))
+
+# In-process geohash index for discover (see GeohashCandidateIndex)
+DISCOVER_INDEX_ENABLED = os.environ.get('DISCOVER_INDEX_ENABLED', 'false').lower() == 'true'
+DISCOVER_INDEX_REFRESH_SECONDS = int(os.environ.get('DISCOVER_INDEX_REFRESH_SECONDS', '300'))
+
+# Discover page cache: "memory" (per worker) or "mongo" (shared between workers)
+DISCOVER_CACHE_BACKEND = os.environ.get('DISCOVER_CACHE_BACKEND', 'memory')
+DISCOVER_CACHE_TTL_SECONDS = int(os.environ.get('DISCOVER_CACHE_TTL_SECONDS', '60'))
+DISCOVER_CACHE_MAX_ENTRIES = int(os.environ.get('DISCOVER_CACHE_MAX_ENTRIES', '10000'))
+
+# Photo blob storage: "gridfs" (in MongoDB) or "local" (filesystem, for development and tests)
+PHOTO_STORE_BACKEND = os.environ.get('PHOTO_STORE_BACKEND', 'gridfs')
+PHOTO_STORE_PATH = os.environ.get('PHOTO_STORE_PATH', str(ROOT_DIR / 'photo_store'))
+# Verification selfies and report evidence live in a separate store that the public photo route can't read
+PRIVATE_PHOTO_STORE_PATH = os.environ.get('PRIVATE_PHOTO_STORE_PATH', str(ROOT_DIR / 'private_photo_store'))
+# Photos nobody references any more are kept this long (an undo window) before their blobs are deleted
+PHOTO_ORPHAN_GRACE_SECONDS = int(os.environ.get('PHOTO_ORPHAN_GRACE_SECONDS', '600'))
+PHOTO_GC_INTERVAL_SECONDS = int(os.environ.get('PHOTO_GC_INTERVAL_SECONDS', '300'))
+
+# Image decode/transcode runs in worker processes; uploads beyond the queue limit are turned away
+PHOTO_PROCESS_POOL_SIZE = int(os.environ.get('PHOTO_PROCESS_POOL_SIZE', str(os.cpu_count() or 2)))
+PHOTO_PROCESSING_QUEUE_LIMIT = int(os.environ.get('PHOTO_PROCESSING_QUEUE_LIMIT', str(PHOTO_PROCESS_POOL_SIZE * 4)))
+
+# bcrypt runs on its own threads (it releases the GIL); logins beyond the queue limit get a 503
+PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', str(PASSWORD_HASH_THREADS * 8)))
+
+# Throttling of login/registration: "memory" (per worker) or "mongo" (shared between workers)
+AUTH_RATE_LIMIT_BACKEND = os.environ.get('AUTH_RATE_LIMIT_BACKEND', 'memory')
+# Proxies in front of the API that append to X-Forwarded-For; 0 uses the socket address.
+# The default matches nginx.conf, whose proxy appends $remote_addr ($proxy_add_x_forwarded_for);
+# add one per load balancer in front of it that appends too, use 0 if nothing sets the header
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1'))
 
 # Email verification token service
 TOKEN_SECRET = "email-verification-secret-key-change-in-production"
@@ -79,6 +137,11 @@ class ReportStatus(str, Enum):
     RESOLVED = "resolved"
     DISMISSED = "dismissed"
 
+# Response shapes for list endpoints
+class PayloadView(str, Enum):
+    FULL = "full"
+    LITE = "lite"  # Primary photo and photo count instead of the whole gallery
+
 # Profile Questions - 28 deep questions for users to answer
 PROFILE_QUESTIONS = [
     # Personal Growth & Aspirations
@@ -213,9 +276,20 @@ class UserLogin(BaseModel):
 class EmailVerification(BaseModel):
     token: str
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class ResendVerification(BaseModel):
     email: EmailStr
 
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
+    @validator('new_password')
+    def validate_password_strength(cls, v):
+        return validate_password(v)
+
 class QuestionAnswer(BaseModel):
     question_index: int
     answer: str
@@ -228,6 +302,9 @@ class ProfileUpdate(BaseModel):
     longitude: Optional[float] = None
     search_radius: Optional[int] = None  # in miles
 
+class PhotoOrderUpdate(BaseModel):
+    photo_ids: List[str]
+
 class LocationUpdate(BaseModel):
     location: str
     latitude: float
@@ -249,7 +326,10 @@ class User(BaseModel):
     location: Optional[str] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    geo_location: Optional[Dict[str, Any]] = None  # GeoJSON point mirrored from latitude/longitude
     search_radius: int = Field(default=25)  # Default 25 miles
+    discover_exclusion: Optional[Dict[str, Any]] = None  # Bloom filter of ids hidden from discover
+    discover_generation: int = 0  # Bumped whenever the discover queue must be rebuilt
     likes_given: List[str] = []  # User IDs this user has liked
     likes_received: List[str] = []  # User IDs who liked this user
     matches: List[str] = []  # Mutual matches
@@ -314,7 +394,7 @@ class PhotoVerificationResponse(BaseModel):
 class PhotoVerification(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
-    verification_photo: str  # base64 encoded selfie
+    verification_photo: str  # base64 encoded selfie or private photo URL
     status: VerificationStatus = VerificationStatus.SUBMITTED
     submitted_at: datetime = Field(default_factory=datetime.utcnow)
     reviewed_at: Optional[datetime] = None
@@ -335,7 +415,8 @@ class UserReport(BaseModel):
     reported_user_id: str
     category: ReportCategory
     description: str
-    evidence_photos: List[str] = []
+    evidence_photos: List[str] = []  # base64 encoded images or private photo URLs
+    moderation_flag_ids: List[str] = []  # Duplicate-photo flags on the reported user
     status: ReportStatus = ReportStatus.PENDING
     created_at: datetime = Field(default_factory=datetime.utcnow)
     reviewed_at: Optional[datetime] = None
@@ -343,6 +424,10 @@ class UserReport(BaseModel):
     reviewer_notes: Optional[str] = None
     action_taken: Optional[str] = None
 
+class ModerationFlagReview(BaseModel):
+    status: ReportStatus  # resolved or dismissed
+    reviewer_notes: Optional[str] = None
+
 # Block User Model
 class BlockUserRequest(BaseModel):
     user_id: str
@@ -370,6 +455,40 @@ class SafetyPreferences(BaseModel):
     verified_only: bool = False
     enable_panic_button: bool = False
 
+# Query projections for other users' profiles - applied in the database so password hashes,
+# the unbounded likes/matches/blocks arrays and exact coordinates never leave it
+PUBLIC_PROFILE_FIELDS = [
+    "id", "first_name", "age", "gender", "gender_preference", "bio", "photos",
+    "question_answers", "location", "is_verified", "photo_verified",
+    "photo_verification_status", "last_active"
+]
+PUBLIC_PROFILE_PROJECTION = {"_id": 0, **{field: 1 for field in PUBLIC_PROFILE_FIELDS}}
+
+# Credentials and server-side bookkeeping kept on the user document - not even its owner gets these
+PRIVATE_USER_FIELDS = ["_id", "password_hash", "discover_exclusion", "discover_generation", "geo_location"]
+
+# Swipe cards and lists only render the first photo
+CARD_PROFILE_PROJECTION = {**PUBLIC_PROFILE_PROJECTION, "photos": {"$slice": 1}}
+
+# Lite payloads: the primary photo plus how many there are; galleries come from /users/{id}/photos
+LITE_PROFILE_PROJECTION = {
+    **CARD_PROFILE_PROJECTION,
+    "photo_count": {"$size": {"$ifNull": ["$photos", []]}}
+}
+
+# Candidate fields discover needs to rank users - profiles are hydrated separately per page
+DISCOVER_RANK_PROJECTION = {"_id": 0, "id": 1, "gender": 1, "gender_preference": 1}
+
+# Fields of the current user that discover needs to build its candidate query
+DISCOVER_USER_FIELDS = [
+    "id", "gender", "gender_preference", "latitude", "longitude",
+    "search_radius", "discover_exclusion", "discover_generation"
+]
+
+# Fields like_user needs from both sides
+LIKE_TARGET_FIELDS = ["id", "gender", "gender_preference", "profile_views", "likes_given"]
+LIKE_USER_FIELDS = ["id", "gender", "gender_preference"]
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
@@ -402,6 +521,856 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# ====== BOUNDED EXECUTORS ======
+class ExecutorUnavailable(Exception):
+    """Raised when a BoundedExecutor can't run a job right now; callers answer 503"""
+
+class ExecutorSaturated(ExecutorUnavailable):
+    """Raised instead of queueing work on a BoundedExecutor that is already full"""
+
+class ExecutorBroken(ExecutorUnavailable):
+    """Raised when a worker died under a job (e.g. OOM or a codec crash); the pool is rebuilt"""
+
+class BoundedExecutor:
+    """Runs blocking work off the event loop with a cap on queued + running jobs.
+    
+    The underlying executor is created on first use so importing the module doesn't
+    start workers."""
+    
+    def __init__(self, name: str, executor_factory, max_pending: int):
+        self.name = name
+        self.executor_factory = executor_factory
+        self.max_pending = max_pending
+        self.executor = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.total_seconds = 0.0
+    
+    async def run(self, fn, *args):
+        self._claim(1)
+        try:
+            return await self._execute(fn, *args)
+        finally:
+            self.pending -= 1
+    
+    async def map(self, fn, items: list, slots: int) -> list:
+        """Run fn over items, at most `slots` at a time, admitted as a whole.
+        
+        The slots are claimed before anything starts, so a batch is either turned away up
+        front or runs to the end without hitting ExecutorSaturated halfway. Raises the first
+        failure once every job has finished."""
+        slots = max(1, min(slots, len(items), self.max_pending))
+        self._claim(slots)
+        semaphore = asyncio.Semaphore(slots)
+        
+        async def run_one(item):
+            async with semaphore:
+                return await self._execute(fn, item)
+        
+        try:
+            results = await asyncio.gather(*(run_one(item) for item in items), return_exceptions=True)
+        finally:
+            self.pending -= slots
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+    
+    def _claim(self, slots: int):
+        if self.pending + slots > self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(self.name)
+        self.pending += slots
+        self.peak_pending = max(self.peak_pending, self.pending)
+    
+    async def _execute(self, fn, *args):
+        if self.executor is None:
+            self.executor = self.executor_factory()
+        
+        executor = self.executor
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenExecutor:
+            self.failed += 1
+            self._replace(executor)
+            raise ExecutorBroken(self.name)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_seconds += time.perf_counter() - started
+        self.completed += 1
+        return result
+    
+    def _replace(self, broken_executor):
+        """Drop a broken executor so the next job starts a fresh one (once, however many jobs failed)"""
+        if self.executor is not broken_executor:
+            return
+        logger.error(f"{self.name} executor broke (a worker died), starting a new one")
+        self.executor = None
+        self.restarts += 1
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+    
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "avg_ms": round(self.total_seconds / finished * 1000, 2) if finished else 0.0
+        }
+
+photo_executor = BoundedExecutor(
+    "photo_processing",
+    # Workers are started by a clean forkserver rather than forked from this process, which
+    # already runs Motor's background threads
+    lambda: ProcessPoolExecutor(
+        max_workers=PHOTO_PROCESS_POOL_SIZE,
+        mp_context=multiprocessing.get_context("forkserver")
+    ),
+    PHOTO_PROCESSING_QUEUE_LIMIT
+)
+
+password_executor = BoundedExecutor(
+    "password_hashing",
+    lambda: ThreadPoolExecutor(max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="bcrypt"),
+    PASSWORD_HASH_QUEUE_LIMIT
+)
+
+# Photo storage
+PHOTO_URL_PREFIX = "/api/photos/"
+PHOTO_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Content type of an image from its first bytes, or None if it isn't one we accept"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+# Renditions generated at upload: name -> longest side in pixels. The photo id is the
+# content hash of the "full" rendition; other sizes are requested with ?size=
+PHOTO_SIZES = {"full": 1080, "card": 480, "thumb": 96}
+PHOTO_JPEG_QUALITY = 85
+# WebP renditions are stored next to the JPEG ones and served to clients that accept them.
+# q80 WebP is roughly on par visually with q85 JPEG (see photo_format_benchmark.py)
+PHOTO_WEBP_ENABLED = os.environ.get('PHOTO_WEBP_ENABLED', 'true').lower() == 'true' and features.check('webp')
+PHOTO_WEBP_QUALITY = 80
+PHOTO_WEBP_METHOD = 4
+
+def photo_url(photo_id: str, size: Optional[str] = None) -> str:
+    if size and size != "full":
+        return f"{PHOTO_URL_PREFIX}{photo_id}?size={size}"
+    return f"{PHOTO_URL_PREFIX}{photo_id}"
+
+def photo_urls_for_size(photos: List[str], size: str) -> List[str]:
+    """Point stored photo references at a smaller rendition (legacy inline photos are kept as-is)"""
+    sized = []
+    for photo in photos:
+        photo_id = photo_id_from_url(photo)
+        sized.append(photo_url(photo_id, size) if photo_id else photo)
+    return sized
+
+# Refuse decompression bombs from the header alone, before any pixel is decoded
+PHOTO_MAX_PIXELS = 50_000_000
+EXIF_ORIENTATION_TAG = 0x0112
+
+# libjpeg's baseline luminance table; quality is estimated against it
+JPEG_STANDARD_LUMINANCE_TABLE = [
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+]
+
+def estimate_jpeg_quality(quantization: Optional[dict]) -> Optional[int]:
+    """Approximate libjpeg quality setting from a JPEG's luminance quantization table"""
+    if not quantization or 0 not in quantization:
+        return None
+    scale = sum(quantization[0]) * 100 / sum(JPEG_STANDARD_LUMINANCE_TABLE)
+    if scale <= 0:
+        return 100
+    # Inverse of libjpeg's quality -> scale mapping
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+def strip_jpeg_metadata(data: bytes) -> bytes:
+    """Drop EXIF/XMP and other APPn segments from a JPEG without touching the image data.
+    
+    JFIF (APP0) and ICC profiles (APP2) are kept since they affect how the image renders."""
+    output = [data[:2]]
+    position = 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte
+            position += 1
+            continue
+        segment_length = int.from_bytes(data[position + 2:position + 4], "big")
+        segment_end = position + 2 + segment_length
+        if marker == 0xDA:
+            # Start of scan: entropy-coded data follows, copy the rest as is
+            break
+        is_app_segment = 0xE0 <= marker <= 0xEF
+        keep = (
+            not is_app_segment
+            or marker == 0xE0
+            or (marker == 0xE2 and data[position + 4:position + 16] == b"ICC_PROFILE\x00")
+        )
+        if keep:
+            output.append(data[position:segment_end])
+        position = segment_end
+    output.append(data[position:])
+    return b"".join(output)
+
+def can_pass_through_jpeg(image: Image.Image, max_side: int, orientation: int) -> bool:
+    """Whether the uploaded JPEG can be served as-is (minus metadata) for this size"""
+    if image.format != "JPEG" or image.mode not in ('RGB', 'L') or orientation != 1:
+        return False
+    if max(image.size) > max_side:
+        return False
+    quality = estimate_jpeg_quality(getattr(image, "quantization", None))
+    return quality is not None and quality <= PHOTO_JPEG_QUALITY
+
+def decode_for_size(image: Image.Image, max_side: int) -> Image.Image:
+    """Decode an opened image no larger than needed for max_side, upright and in RGB/L"""
+    if image.format == "JPEG":
+        # Let the decoder scale the DCT by 1/2, 1/4 or 1/8 while staying >= max_side
+        image.draft(image.mode if image.mode in ('RGB', 'L') else None, (max_side, max_side))
+    # EXIF is not carried over, so bake the orientation into the pixels
+    image = ImageOps.exif_transpose(image)
+    # Convert to RGB if needed
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+def render_photo_derivatives(contents: bytes) -> dict:
+    """Encode every PHOTO_SIZES rendition of an uploaded image as metadata-free JPEG (and WebP,
+    except for sizes where the upload itself is passed through)"""
+    # Opening only parses the header, so dimensions are known before decoding
+    image = Image.open(io.BytesIO(contents))
+    if image.width * image.height > PHOTO_MAX_PIXELS:
+        raise ValueError("Image dimensions too large")
+    
+    orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    icc_profile = image.info.get("icc_profile")
+    width, height = (image.height, image.width) if orientation in (5, 6, 7, 8) else image.size
+    
+    # Decided before decoding, since draft mode changes the image's reported size
+    pass_through_sizes = {
+        size_name for size_name, max_side in PHOTO_SIZES.items()
+        if can_pass_through_jpeg(image, max_side, orientation)
+    }
+    
+    derivatives = {}
+    webp_derivatives = {}
+    rendition = None
+    # Largest first, each one downscaled from the previous rendition
+    for size_name, max_side in sorted(PHOTO_SIZES.items(), key=lambda item: -item[1]):
+        if size_name in pass_through_sizes:
+            # Already small and compressed enough: served as this JPEG in every format, so
+            # nothing is decoded for it (get_photo falls back to JPEG without a WebP rendition)
+            derivatives[size_name] = strip_jpeg_metadata(contents)
+            continue
+        
+        rendition = decode_for_size(image, max_side) if rendition is None else rendition.copy()
+        rendition.thumbnail((max_side, max_side), Image.LANCZOS)
+        output_buffer = io.BytesIO()
+        rendition.save(output_buffer, format='JPEG', quality=PHOTO_JPEG_QUALITY, icc_profile=icc_profile)
+        derivatives[size_name] = output_buffer.getvalue()
+        if PHOTO_WEBP_ENABLED:
+            output_buffer = io.BytesIO()
+            rendition.save(output_buffer, format='WEBP', quality=PHOTO_WEBP_QUALITY,
+                           method=PHOTO_WEBP_METHOD, icc_profile=icc_profile)
+            webp_derivatives[size_name] = output_buffer.getvalue()
+    
+    # Hashing the thumb is cheap and identical however the upload was encoded
+    dhash = compute_dhash(Image.open(io.BytesIO(derivatives["thumb"])))
+    return {
+        "derivatives": derivatives,
+        "webp_derivatives": webp_derivatives,
+        "width": width,
+        "height": height,
+        "dhash": dhash
+    }
+
+# Selfies and evidence keep enough resolution for review, not the camera's full size
+PRIVATE_PHOTO_MAX_SIDE = 2048
+
+def render_private_photo(contents: bytes) -> bytes:
+    """Re-encode a selfie or evidence image as JPEG, dropping EXIF (GPS included) and other metadata"""
+    image = Image.open(io.BytesIO(contents))
+    if image.width * image.height > PHOTO_MAX_PIXELS:
+        raise ValueError("Image dimensions too large")
+    
+    icc_profile = image.info.get("icc_profile")
+    image = decode_for_size(image, PRIVATE_PHOTO_MAX_SIDE)
+    image.thumbnail((PRIVATE_PHOTO_MAX_SIDE, PRIVATE_PHOTO_MAX_SIDE), Image.LANCZOS)
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format='JPEG', quality=PHOTO_JPEG_QUALITY, icc_profile=icc_profile)
+    return output_buffer.getvalue()
+
+async def store_photo_derivatives(rendered: dict, owner_id: str) -> str:
+    """Put every rendition in the blob store and record them; returns the photo id"""
+    derivative_keys = {}
+    for size_name, data in rendered["derivatives"].items():
+        derivative_keys[size_name] = await photo_store.put(data, "image/jpeg")
+    webp_derivative_keys = {}
+    for size_name, data in rendered.get("webp_derivatives", {}).items():
+        webp_derivative_keys[size_name] = await photo_store.put(data, "image/webp")
+    
+    photo_id = derivative_keys["full"]
+    await db.photos.update_one(
+        {"id": photo_id},
+        {"$setOnInsert": {
+            "id": photo_id,
+            "owner_id": owner_id,
+            "derivatives": derivative_keys,
+            "webp_derivatives": webp_derivative_keys,
+            "width": rendered["width"],
+            "height": rendered["height"],
+            "created_at": datetime.utcnow()
+        }, "$unset": {"orphaned_at": ""}},
+        upsert=True
+    )
+    return photo_id
+
+async def photo_in_use(photo_id: str) -> bool:
+    """Whether a profile or a pending moderation flag still points at a photo"""
+    return bool(
+        await db.users.find_one({"photos": photo_url(photo_id)}, {"_id": 1})
+        or await db.moderation_flags.find_one(
+            {"status": "pending", "$or": [{"photo_id": photo_id}, {"matches.photo_id": photo_id}]},
+            {"_id": 1}
+        )
+    )
+
+async def release_photo(photo_id: str):
+    """Mark a photo for collection once its last reference is gone"""
+    if await photo_in_use(photo_id):
+        return
+    # Photos migrated from inline data have no record; their only blob is the original
+    await db.photos.update_one(
+        {"id": photo_id},
+        {
+            "$set": {"orphaned_at": datetime.utcnow()},
+            "$setOnInsert": {"id": photo_id, "derivatives": {"full": photo_id}, "webp_derivatives": {}}
+        },
+        upsert=True
+    )
+
+async def collect_orphaned_photos() -> int:
+    """Delete the blobs of photos that stayed unreferenced for the grace period; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=PHOTO_ORPHAN_GRACE_SECONDS)
+    collected = 0
+    async for photo_doc in db.photos.find({"orphaned_at": {"$lte": cutoff}}, {"_id": 0, "id": 1}):
+        photo_id = photo_doc["id"]
+        if await photo_in_use(photo_id):
+            await db.photos.update_one({"id": photo_id}, {"$unset": {"orphaned_at": ""}})
+            continue
+        # A re-upload of the same picture clears orphaned_at and keeps the record
+        photo_doc = await db.photos.find_one_and_delete({"id": photo_id, "orphaned_at": {"$lte": cutoff}})
+        if photo_doc is None:
+            continue
+        
+        keys = {photo_id, *photo_doc.get("derivatives", {}).values(), *photo_doc.get("webp_derivatives", {}).values()}
+        for key in keys:
+            # Small pictures pass through unchanged, so one blob can be a rendition of several photos
+            references = [{"id": key}] + [
+                {f"{field}.{size}": key} for field in ("derivatives", "webp_derivatives") for size in PHOTO_SIZES
+            ]
+            shared = await db.photos.find_one({"$or": references}, {"_id": 1})
+            if not shared:
+                await photo_store.delete(key)
+        collected += 1
+    return collected
+
+async def maintain_photo_store():
+    """Periodically delete the blobs of photos nothing references any more"""
+    while True:
+        await asyncio.sleep(PHOTO_GC_INTERVAL_SECONDS)
+        try:
+            collected = await collect_orphaned_photos()
+            if collected:
+                logger.info(f"Deleted the blobs of {collected} unreferenced photos")
+        except Exception as e:
+            logger.error(f"Failed to collect unreferenced photos: {e}")
+
+def photo_id_from_url(url: str) -> Optional[str]:
+    """The photo id of a stored photo reference, or None for legacy inline data: URLs"""
+    if url.startswith(PHOTO_URL_PREFIX):
+        return url[len(PHOTO_URL_PREFIX):].split("?", 1)[0]
+    return None
+
+PHOTO_STREAM_CHUNK_SIZE = 256 * 1024
+
+class PhotoBlobReader(ABC):
+    """An opened blob: its size and type up front, bytes streamed on demand"""
+    
+    def __init__(self, length: int, content_type: str):
+        self.length = length
+        self.content_type = content_type
+    
+    @abstractmethod
+    def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes from start to end inclusive in chunks (implemented as an async generator)"""
+
+class GridFSPhotoBlobReader(PhotoBlobReader):
+    def __init__(self, grid_out):
+        super().__init__(grid_out.length, (grid_out.metadata or {}).get("content_type", "application/octet-stream"))
+        self.grid_out = grid_out
+    
+    async def iter_range(self, start: int, end: int):
+        self.grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await self.grid_out.read(min(PHOTO_STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class LocalPhotoBlobReader(PhotoBlobReader):
+    def __init__(self, path: Path, length: int, content_type: str):
+        super().__init__(length, content_type)
+        self.path = path
+    
+    async def iter_range(self, start: int, end: int):
+        handle = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(PHOTO_STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+class PhotoBlobStore(ABC):
+    """Content-addressed storage for photo bytes.
+    
+    Blobs are keyed by the SHA-256 of their content, so identical uploads are stored once
+    and a key always refers to the same bytes. Users only keep the small photo URLs."""
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    @abstractmethod
+    async def put(self, data: bytes, content_type: str) -> str:
+        """Store data and return its key"""
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[tuple]:
+        """(data, content_type) for a key, or None if it isn't stored"""
+    
+    @abstractmethod
+    async def open(self, key: str) -> Optional[PhotoBlobReader]:
+        """A reader for streaming the blob, or None if it isn't stored"""
+    
+    @abstractmethod
+    async def delete(self, key: str):
+        """Remove a blob; deleting a missing key is not an error"""
+
+class GridFSPhotoBlobStore(PhotoBlobStore):
+    """Blobs in a GridFS bucket (photo_blobs by default), with the content hash as the file id"""
+    
+    def __init__(self, database, bucket_name: str = "photo_blobs"):
+        self.files = database[f"{bucket_name}.files"]
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+    
+    async def put(self, data: bytes, content_type: str) -> str:
+        key = self.content_hash(data)
+        if await self.files.find_one({"_id": key}, {"_id": 1}):
+            return key
+        
+        try:
+            await self.bucket.upload_from_stream_with_id(
+                key, key, data, metadata={"content_type": content_type}
+            )
+        except DuplicateKeyError:
+            # Same content uploaded concurrently
+            pass
+        return key
+    
+    async def get(self, key: str) -> Optional[tuple]:
+        try:
+            stream = await self.bucket.open_download_stream(key)
+        except NoFile:
+            return None
+        data = await stream.read()
+        return data, (stream.metadata or {}).get("content_type", "application/octet-stream")
+    
+    async def open(self, key: str) -> Optional[PhotoBlobReader]:
+        try:
+            return GridFSPhotoBlobReader(await self.bucket.open_download_stream(key))
+        except NoFile:
+            return None
+    
+    async def delete(self, key: str):
+        try:
+            await self.bucket.delete(key)
+        except NoFile:
+            pass
+
+class LocalPhotoBlobStore(PhotoBlobStore):
+    """Blobs as files under a directory, fanned out by hash prefix"""
+    
+    def __init__(self, root: str):
+        self.root = Path(root)
+    
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+    
+    async def put(self, data: bytes, content_type: str) -> str:
+        key = self.content_hash(data)
+        path = self.path_for(key)
+        
+        def write():
+            if path.exists():
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        
+        await asyncio.to_thread(write)
+        return key
+    
+    async def get(self, key: str) -> Optional[tuple]:
+        path = self.path_for(key)
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            return None
+        return data, sniff_image_type(data[:16]) or "application/octet-stream"
+    
+    async def open(self, key: str) -> Optional[PhotoBlobReader]:
+        path = self.path_for(key)
+        
+        def read_header():
+            with open(path, "rb") as handle:
+                return os.fstat(handle.fileno()).st_size, handle.read(16)
+        
+        try:
+            length, header = await asyncio.to_thread(read_header)
+        except FileNotFoundError:
+            return None
+        return LocalPhotoBlobReader(path, length, sniff_image_type(header) or "application/octet-stream")
+    
+    async def delete(self, key: str):
+        try:
+            await asyncio.to_thread(self.path_for(key).unlink)
+        except FileNotFoundError:
+            pass
+
+photo_store: PhotoBlobStore = (
+    LocalPhotoBlobStore(PHOTO_STORE_PATH) if PHOTO_STORE_BACKEND == "local" else GridFSPhotoBlobStore(db)
+)
+
+# Only reachable through /api/private-photos/{id}, which checks who is asking
+PRIVATE_PHOTO_URL_PREFIX = "/api/private-photos/"
+
+private_photo_store: PhotoBlobStore = (
+    LocalPhotoBlobStore(PRIVATE_PHOTO_STORE_PATH) if PHOTO_STORE_BACKEND == "local"
+    else GridFSPhotoBlobStore(db, bucket_name="private_photo_blobs")
+)
+
+def private_photo_url(photo_id: str) -> str:
+    return f"{PRIVATE_PHOTO_URL_PREFIX}{photo_id}"
+
+async def migrate_inline_photos():
+    """Move legacy base64 data: URL photos into the blob store, one user at a time"""
+    migrated_users = 0
+    async for user_doc in db.users.find({"photos": {"$regex": "^data:"}}, {"_id": 0, "id": 1, "photos": 1}):
+        photos = []
+        for photo in user_doc["photos"]:
+            if photo.startswith("data:") and ";base64," in photo:
+                header, encoded = photo.split(",", 1)
+                content_type = header[len("data:"):].split(";", 1)[0] or "image/jpeg"
+                photo = photo_url(await photo_store.put(base64.b64decode(encoded), content_type))
+            photos.append(photo)
+        
+        # Only replace the list if the user didn't change it meanwhile
+        await db.users.update_one(
+            {"id": user_doc["id"], "photos": user_doc["photos"]},
+            {"$set": {"photos": photos}}
+        )
+        migrated_users += 1
+    
+    if migrated_users:
+        logger.info(f"Moved inline photos of {migrated_users} users to the blob store")
+
+async def migrate_private_photos():
+    """Move selfies and report evidence that were stored as public photos into the private store"""
+    public_pattern = {"$regex": f"^{re.escape(PHOTO_URL_PREFIX)}"}
+    moved = {}  # public photo id -> private photo id
+    
+    async def make_private(photo: str, owner_id: str, purpose: str) -> str:
+        photo_id = photo_id_from_url(photo)
+        if photo_id is None:
+            return photo
+        if photo_id not in moved:
+            blob = await photo_store.get(photo_id)
+            if blob is None:
+                return photo
+            data = await photo_executor.run(render_private_photo, blob[0])
+            moved[photo_id] = await private_photo_store.put(data, "image/jpeg")
+        await record_private_photo(moved[photo_id], owner_id, purpose)
+        return private_photo_url(moved[photo_id])
+    
+    try:
+        async for verification in db.photo_verifications.find(
+            {"verification_photo": public_pattern}, {"_id": 0, "id": 1, "user_id": 1, "verification_photo": 1}
+        ):
+            selfie = await make_private(verification["verification_photo"], verification["user_id"], "verification")
+            await db.photo_verifications.update_one({"id": verification["id"]}, {"$set": {"verification_photo": selfie}})
+        
+        async for report in db.user_reports.find(
+            {"evidence_photos": public_pattern}, {"_id": 0, "id": 1, "reporter_id": 1, "evidence_photos": 1}
+        ):
+            evidence_photos = [
+                await make_private(photo, report["reporter_id"], "report_evidence") for photo in report["evidence_photos"]
+            ]
+            await db.user_reports.update_one({"id": report["id"]}, {"$set": {"evidence_photos": evidence_photos}})
+    except Exception as e:
+        logger.error(f"Failed to move private photos out of the public store: {e}")
+    
+    # Drop the public copies unless the same bytes are also someone's profile photo
+    for photo_id in moved:
+        profile_photo = (
+            await db.photos.find_one({"id": photo_id}, {"_id": 1})
+            or await db.users.find_one({"photos": photo_url(photo_id)}, {"_id": 1})
+        )
+        if not profile_photo:
+            await photo_store.delete(photo_id)
+    
+    if moved:
+        logger.info(f"Moved {len(moved)} verification/evidence photos to the private store")
+
+# ====== UPLOAD INGESTION ======
+MAX_IMAGE_UPLOAD_BYTES = 5 * 1024 * 1024
+MAX_PROFILE_PHOTOS = 10
+MAX_EVIDENCE_PHOTOS = 5
+UPLOAD_READ_CHUNK_SIZE = 64 * 1024
+# Room for multipart boundaries and form fields on top of the file bytes
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Request body caps enforced while the body is still arriving, before it is parsed
+UPLOAD_BODY_LIMITS = [
+    (re.compile(r"^/api/profile/upload-photo$"), MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/profile/upload-photos$"),
+     MAX_PROFILE_PHOTOS * MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/profile/verify-photo/upload$"), MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/users/[^/]+/report/upload$"),
+     MAX_EVIDENCE_PHOTOS * MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    # Legacy JSON endpoints carrying base64 (4/3 of the raw size)
+    (re.compile(r"^/api/profile/verify-photo$"), MAX_IMAGE_UPLOAD_BYTES * 4 // 3 + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/users/[^/]+/report$"),
+     MAX_EVIDENCE_PHOTOS * MAX_IMAGE_UPLOAD_BYTES * 4 // 3 + MULTIPART_OVERHEAD_BYTES),
+]
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+class UploadSizeLimitMiddleware:
+    """Reject upload bodies over their cap as soon as the cap is crossed.
+    
+    Requests announcing a larger Content-Length are refused before any byte is read;
+    chunked or lying clients are cut off while streaming."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http":
+            limit = next((limit for pattern, limit in UPLOAD_BODY_LIMITS if pattern.match(scope["path"])), None)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await self.reject(send)
+                return
+        
+        received = 0
+        exceeded = False
+        rejected = False
+        
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise RequestBodyTooLarge()
+            return message
+        
+        async def limited_send(message):
+            nonlocal rejected
+            if not exceeded:
+                await send(message)
+            elif not rejected and message["type"] == "http.response.start":
+                # Body parsing turns our exception into a generic error response; replace it
+                rejected = True
+                await self.reject(send)
+        
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except RequestBodyTooLarge:
+            pass
+        if exceeded and not rejected:
+            await self.reject(send)
+    
+    async def reject(self, send):
+        body = json.dumps({"detail": "Request body too large"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MAX_IMAGE_UPLOAD_BYTES) -> tuple:
+    """Read an uploaded image in chunks, failing fast on non-images and oversize files.
+    
+    Returns (contents, sniffed content type)."""
+    first_chunk = await file.read(UPLOAD_READ_CHUNK_SIZE)
+    if not first_chunk:
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    content_type = sniff_image_type(first_chunk[:16])
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, GIF, BMP or WebP image")
+    
+    chunks = [first_chunk]
+    total = len(first_chunk)
+    while total <= max_bytes:
+        chunk = await file.read(UPLOAD_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        total += len(chunk)
+    if total > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes // (1024 * 1024)}MB)")
+    
+    return b"".join(chunks), content_type
+
+# ====== PHOTO SIMILARITY INDEX ======
+# 64-bit difference hashes split into 4 x 16-bit segments (multi-index hashing). Two hashes
+# within PHOTO_DUPLICATE_MAX_DISTANCE bits share at least one segment within
+# PHOTO_HASH_SEGMENT_RADIUS bits, so only those segment neighbourhoods need to be looked up.
+PHOTO_HASH_SEGMENTS = 4
+PHOTO_HASH_SEGMENT_BITS = 16
+PHOTO_DUPLICATE_MAX_DISTANCE = 7
+PHOTO_HASH_SEGMENT_RADIUS = PHOTO_DUPLICATE_MAX_DISTANCE // PHOTO_HASH_SEGMENTS
+
+def compute_dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel is brighter than its right neighbour on a 9x8 grid"""
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def dhash_segment_keys(dhash: int) -> List[int]:
+    """Indexed keys of a hash: each 16-bit segment tagged with its position"""
+    mask = (1 << PHOTO_HASH_SEGMENT_BITS) - 1
+    return [
+        (position << PHOTO_HASH_SEGMENT_BITS) | ((dhash >> (position * PHOTO_HASH_SEGMENT_BITS)) & mask)
+        for position in range(PHOTO_HASH_SEGMENTS)
+    ]
+
+def dhash_probe_keys(dhash: int) -> List[int]:
+    """Segment keys of every hash that could be within PHOTO_DUPLICATE_MAX_DISTANCE"""
+    probes = []
+    for key in dhash_segment_keys(dhash):
+        probes.append(key)
+        for radius in range(1, PHOTO_HASH_SEGMENT_RADIUS + 1):
+            for bits in itertools.combinations(range(PHOTO_HASH_SEGMENT_BITS), radius):
+                variant = key
+                for bit in bits:
+                    variant ^= 1 << bit
+                probes.append(variant)
+    return probes
+
+async def find_similar_photos(dhash: int, exclude_owner_id: Optional[str] = None) -> List[dict]:
+    """Photos whose hash is within PHOTO_DUPLICATE_MAX_DISTANCE bits, closest first"""
+    query = {"segments": {"$in": dhash_probe_keys(dhash)}}
+    if exclude_owner_id:
+        query["owner_id"] = {"$ne": exclude_owner_id}
+    
+    similar = []
+    async for candidate in db.photo_hashes.find(query, {"_id": 0, "photo_id": 1, "owner_id": 1, "dhash": 1}):
+        # A shared segment is only a hint; confirm on the full hash
+        distance = (int(candidate["dhash"], 16) ^ dhash).bit_count()
+        if distance <= PHOTO_DUPLICATE_MAX_DISTANCE:
+            similar.append({
+                "photo_id": candidate["photo_id"],
+                "user_id": candidate["owner_id"],
+                "distance": distance
+            })
+    similar.sort(key=lambda match: match["distance"])
+    return similar
+
+async def index_photo_hash(photo_id: str, owner_id: str, dhash: int):
+    """Record an uploaded photo's hash and flag it for moderation if another account has it"""
+    await db.photo_hashes.update_one(
+        {"photo_id": photo_id, "owner_id": owner_id},
+        {"$setOnInsert": {
+            "photo_id": photo_id,
+            "owner_id": owner_id,
+            "dhash": f"{dhash:016x}",
+            "segments": dhash_segment_keys(dhash),
+            "created_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+    
+    matches = await find_similar_photos(dhash, exclude_owner_id=owner_id)
+    if not matches:
+        return
+    
+    await db.moderation_flags.update_one(
+        {"type": "duplicate_photo", "user_id": owner_id, "photo_id": photo_id},
+        {
+            "$set": {"matches": matches, "updated_at": datetime.utcnow()},
+            "$setOnInsert": {"id": str(uuid.uuid4()), "status": "pending", "created_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+    logger.info(f"Photo {photo_id} of user {owner_id} resembles {len(matches)} photos of other users")
+
 # Utility Functions
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -409,54 +1378,464 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_access_token(user_id: str) -> str:
+async def run_password_hashing(fn, *args):
+    """Run hash_password/verify_password on the bcrypt threads, failing fast when they're saturated"""
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorUnavailable:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-ins in progress, please try again shortly",
+            headers={"Retry-After": "1"}
+        )
+
+def create_access_token(user_id: str, session_id: Optional[str] = None, email_verified: Optional[bool] = None) -> str:
+    now = datetime.utcnow()
     payload = {
         "user_id": user_id,
-        "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+        "jti": uuid.uuid4().hex,
+        # Fractional, so a revocation cutoff also separates tokens issued within the same second
+        "iat": now.replace(tzinfo=timezone.utc).timestamp(),
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRATION_MINUTES)
     }
+    # sid lets a logout revoke just this session; the user itself is checked by get_current_user
+    if session_id is not None:
+        payload["sid"] = session_id
+    if email_verified is not None:
+        payload["email_verified"] = email_verified
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
+class PrincipalCache:
+    """TTL + LRU set of (user id, token jti) pairs known to belong to an existing, verified user.
+    
+    Only successful checks are cached. Code that deletes, unverifies or bans a user calls
+    invalidate_principal; other workers pick the change up within the TTL."""
+    
+    def __init__(self, ttl_seconds: int = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, float]" = OrderedDict()  # (user_id, jti) -> expires_at
+        self.keys_by_user: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    def contains(self, user_id: str, jti: Optional[str]) -> bool:
+        key = (user_id, jti)
+        expires_at = self.entries.get(key)
+        if expires_at is None or expires_at < time.monotonic():
+            if expires_at is not None:
+                self._drop(key)
+            self.misses += 1
+            return False
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True
+    
+    def add(self, user_id: str, jti: Optional[str]):
+        key = (user_id, jti)
+        self.entries[key] = time.monotonic() + self.ttl_seconds
+        self.entries.move_to_end(key)
+        self.keys_by_user.setdefault(user_id, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+    
+    def invalidate_user(self, user_id: str):
+        self.invalidations += 1
+        for key in self.keys_by_user.pop(user_id, set()):
+            self.entries.pop(key, None)
+    
+    def _drop(self, key: tuple):
+        self.entries.pop(key, None)
+        user_keys = self.keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self.keys_by_user[key[0]]
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions
+        }
+
+principal_cache = PrincipalCache()
+
+def invalidate_principal(user_id: str):
+    """Make the next request of this user re-check the database (deleted, unverified or banned)"""
+    principal_cache.invalidate_user(user_id)
+
+# ====== SESSIONS & REVOCATION ======
+def hash_refresh_token(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+class RevocationList:
+    """This worker's copy of the revocations collection, used to reject access tokens without I/O.
+    
+    An entry either revokes one session (logout) or every token of a user issued before a
+    cutoff (ban, password change). Entries only have to outlive the access tokens they cancel,
+    so the collection stays small; refresh is refused through the sessions collection."""
+    
+    def __init__(self):
+        self.revoked_sessions: Dict[str, datetime] = {}  # session id -> expires_at
+        self.user_cutoffs: Dict[str, tuple] = {}  # user id -> (revoked_before, expires_at)
+        self.synced_until: Optional[datetime] = None
+        self.syncs = 0
+        self.rejections = 0
+    
+    def add(self, entry: dict):
+        if entry["kind"] == "session":
+            self.revoked_sessions[entry["session_id"]] = entry["expires_at"]
+        elif entry["kind"] == "user":
+            current = self.user_cutoffs.get(entry["user_id"])
+            if current is None or current[0] < entry["revoked_before"]:
+                self.user_cutoffs[entry["user_id"]] = (entry["revoked_before"], entry["expires_at"])
+    
+    def is_revoked(self, payload: dict) -> bool:
+        revoked = payload.get("sid") in self.revoked_sessions
+        cutoff = self.user_cutoffs.get(payload.get("user_id"))
+        if not revoked and cutoff is not None:
+            revoked = payload.get("iat", 0) < cutoff[0].replace(tzinfo=timezone.utc).timestamp()
+        if revoked:
+            self.rejections += 1
+        return revoked
+    
+    async def sync(self):
+        """Pull entries added since the last sync (by any worker) and forget expired ones"""
+        query = {}
+        if self.synced_until is not None:
+            # Overlap by one interval so entries committed late aren't skipped; adds are idempotent
+            query = {"created_at": {"$gte": self.synced_until - timedelta(seconds=REVOCATION_SYNC_SECONDS)}}
+        
+        async for entry in db.revocations.find(query, {"_id": 0}):
+            self.add(entry)
+            if self.synced_until is None or entry["created_at"] > self.synced_until:
+                self.synced_until = entry["created_at"]
+        if self.synced_until is None:
+            self.synced_until = datetime.utcnow()
+        
+        now = datetime.utcnow()
+        self.revoked_sessions = {sid: expires for sid, expires in self.revoked_sessions.items() if expires > now}
+        self.user_cutoffs = {uid: cutoff for uid, cutoff in self.user_cutoffs.items() if cutoff[1] > now}
+        self.syncs += 1
+    
+    def stats(self) -> dict:
+        return {
+            "revoked_sessions": len(self.revoked_sessions),
+            "revoked_users": len(self.user_cutoffs),
+            "syncs": self.syncs,
+            "rejections": self.rejections
+        }
+
+revocation_list = RevocationList()
+
+async def record_revocation(entry: dict):
+    now = datetime.utcnow()
+    entry = {
+        **entry,
+        "created_at": now,
+        # Once every access token it could cancel has expired the entry can go
+        "expires_at": now + timedelta(minutes=ACCESS_TOKEN_EXPIRATION_MINUTES + 1)
+    }
+    await db.revocations.insert_one(dict(entry))
+    # Effective on this worker right away, on the others after their next sync
+    revocation_list.add(entry)
+
+async def create_session(user_id: str) -> tuple:
+    """Start a login session; returns (session id, refresh token)"""
+    now = datetime.utcnow()
+    session_id = str(uuid.uuid4())
+    refresh_token = secrets.token_urlsafe(32)
+    await db.sessions.insert_one({
+        "id": session_id,
+        "user_id": user_id,
+        "refresh_token_hash": hash_refresh_token(refresh_token),
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS),
+        "revoked_at": None
+    })
+    return session_id, refresh_token
+
+async def revoke_session(session_id: str):
+    """Log one session out: no more refreshes, and its access tokens stop working"""
+    await db.sessions.update_one({"id": session_id}, {"$set": {"revoked_at": datetime.utcnow()}})
+    await record_revocation({"kind": "session", "session_id": session_id})
+
+async def revoke_user_tokens(user_id: str):
+    """End every session of a user, e.g. on ban or password change"""
+    now = datetime.utcnow()
+    await db.sessions.update_many({"user_id": user_id, "revoked_at": None}, {"$set": {"revoked_at": now}})
+    await record_revocation({"kind": "user", "user_id": user_id, "revoked_before": now})
+    invalidate_principal(user_id)
+
+async def maintain_revocation_list():
+    """Keep this worker's revocation list in step with the revocations collection"""
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+        try:
+            await revocation_list.sync()
+        except Exception as e:
+            logger.error(f"Failed to sync revocation list: {e}")
+
+# ====== REQUEST-SCOPED USER LOADER ======
+class UserLoader:
+    """Memoizes user documents by id for one request and batches concurrent lookups.
+    
+    Loads ask for the fields they need; fields already loaded for a user are served from
+    memory and only the missing ones are fetched. Lookups issued in the same event loop
+    tick go out as a single $in query. Returned documents are copies."""
+    
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+        self.loaded_fields: Dict[str, Optional[set]] = {}  # None = the whole document
+        self.missing: set = set()
+        self.pending: Dict[str, list] = {}  # user_id -> [(future, fields)]
+        self.dispatch_task = None
+        self.lookups = 0
+        self.round_trips = 0
+    
+    async def load(self, user_id: str, fields: Optional[List[str]] = None) -> Optional[dict]:
+        """The user's document (only `fields` if given), or None if there is no such user"""
+        self.lookups += 1
+        fields = None if fields is None else set(fields)
+        if self._is_loaded(user_id, fields):
+            return self._project(user_id, fields)
         
-        # Check if user exists and is email verified
-        user_doc = await db.users.find_one({"id": user_id})
-        if not user_doc:
-            raise HTTPException(status_code=401, detail="User not found")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(user_id, []).append((future, fields))
+        if self.dispatch_task is None:
+            self.dispatch_task = asyncio.get_running_loop().create_task(self._dispatch())
+        return await future
+    
+    async def load_many(self, user_ids: List[str], fields: Optional[List[str]] = None) -> List[Optional[dict]]:
+        return await asyncio.gather(*(self.load(user_id, fields) for user_id in user_ids))
+    
+    def forget(self, user_id: str):
+        """Drop what is known about a user, e.g. after writing to them"""
+        self.documents.pop(user_id, None)
+        self.loaded_fields.pop(user_id, None)
+        self.missing.discard(user_id)
+    
+    def _is_loaded(self, user_id: str, fields: Optional[set]) -> bool:
+        if user_id in self.missing:
+            return True
+        if user_id not in self.loaded_fields:
+            return False
+        loaded = self.loaded_fields[user_id]
+        return loaded is None or (fields is not None and fields <= loaded)
+    
+    def _project(self, user_id: str, fields: Optional[set]) -> Optional[dict]:
+        user_doc = self.documents.get(user_id)
+        if user_doc is None:
+            return None
+        if fields is None:
+            return dict(user_doc)
+        return {field: user_doc[field] for field in fields | {"id"} if field in user_doc}
+    
+    async def _dispatch(self):
+        # Let every coroutine scheduled in this tick enqueue its lookup first
+        await asyncio.sleep(0)
+        pending, self.pending = self.pending, {}
+        self.dispatch_task = None
         
-        if not user_doc.get("email_verified", False):
-            raise HTTPException(status_code=401, detail="Email not verified")
+        # One query for everything: the union of what is still missing per user
+        wanted: Optional[set] = set()
+        for user_id, waiters in pending.items():
+            loaded = self.loaded_fields.get(user_id, set())
+            for _, fields in waiters:
+                if fields is None:
+                    wanted = None
+                    break
+                wanted |= fields - loaded
+            if wanted is None:
+                break
+        projection = {"_id": 0} if wanted is None else {"_id": 0, "id": 1, **{field: 1 for field in wanted}}
         
-        return user_id
+        found = {}
+        try:
+            self.round_trips += 1
+            async for user_doc in db.users.find({"id": {"$in": list(pending)}}, projection):
+                found[user_doc["id"]] = user_doc
+        except Exception as e:
+            for waiters in pending.values():
+                for future, _ in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        
+        for user_id, waiters in pending.items():
+            user_doc = found.get(user_id)
+            if user_doc is None:
+                self.forget(user_id)
+                self.missing.add(user_id)
+            else:
+                self.documents.setdefault(user_id, {}).update(user_doc)
+                loaded = self.loaded_fields.get(user_id, set())
+                self.loaded_fields[user_id] = None if wanted is None or loaded is None else loaded | wanted
+            for future, fields in waiters:
+                if not future.done():
+                    future.set_result(self._project(user_id, fields))
+
+# Per-route totals: lookups handlers made vs. queries that actually reached MongoDB
+user_loader_stats: Dict[str, Dict[str, int]] = {}
+
+async def get_user_loader(request: Request):
+    """One UserLoader per request, shared by every dependency and the handler"""
+    loader = UserLoader()
+    try:
+        yield loader
+    finally:
+        route = request.scope.get("route")
+        route_stats = user_loader_stats.setdefault(
+            getattr(route, "path", request.url.path),
+            {"requests": 0, "lookups": 0, "round_trips": 0}
+        )
+        route_stats["requests"] += 1
+        route_stats["lookups"] += loader.lookups
+        route_stats["round_trips"] += loader.round_trips
+
+def user_loader_metrics() -> dict:
+    return {
+        path: {**route_stats, "round_trips_saved": route_stats["lookups"] - route_stats["round_trips"]}
+        for path, route_stats in sorted(user_loader_stats.items())
+    }
+
+async def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Claims of a valid, unrevoked access token"""
+    try:
+        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    if not payload.get("user_id"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Session revoked")
+    return payload
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    loader: UserLoader = Depends(get_user_loader)
+) -> str:
+    user_id = payload["user_id"]
+    
+    # Every token goes through the cache, so deleting or unverifying a user locks them out
+    # within PRINCIPAL_CACHE_TTL_SECONDS (at once on the worker that calls invalidate_principal)
+    jti = payload.get("jti")
+    if principal_cache.contains(user_id, jti):
+        return user_id
+    
+    # Check if user exists and is email verified
+    user_doc = await loader.load(user_id, ["email_verified"])
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    if not user_doc.get("email_verified", False):
+        raise HTTPException(status_code=401, detail="Email not verified")
+    
+    principal_cache.add(user_id, jti)
+    return user_id
+
+async def get_admin_user(
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+) -> str:
+    """The current user, if their account is flagged is_admin (set directly in the database)"""
+    user_doc = await loader.load(current_user_id, ["is_admin"])
+    if not user_doc or not user_doc.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user_id
 
 def count_words(text: str) -> int:
     return len(text.strip().split())
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate the great circle distance between two points on Earth in miles"""
-    import math
-    
-    # Convert latitude and longitude from degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
+# Radius of earth in miles
+EARTH_RADIUS_MILES = 3956
+
+# Up to this search radius candidates are screened with the equirectangular approximation;
+# only those inside radius * (1 + margin) get the exact haversine distance
+EQUIRECTANGULAR_MAX_RADIUS_MILES = 150
+EQUIRECTANGULAR_SCREEN_MARGIN = 0.01
+# Towards the poles the approximation overestimates short distances by more than the margin
+# (up to ~0.3% for caps reaching 80 degrees, several % past 87), so searches whose radius
+# reaches beyond this latitude skip the screen
+EQUIRECTANGULAR_MAX_LATITUDE = 80.0
+
+def _haversine_miles(lat1: float, lon1: float, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Haversine distance in miles from one point to many (all in radians)"""
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * EARTH_RADIUS_MILES
+
+def batch_distances(
+    origin_lat: float,
+    origin_lon: float,
+    latitudes,
+    longitudes,
+    radius: Optional[float] = None
+) -> tuple:
+    """Great circle distances in miles from one origin to many points.
+    
+    Returns (distances, within_radius) as NumPy arrays. For small radii away from the poles
+    the cheap equirectangular approximation screens out far candidates and only the rest are
+    computed exactly, so every distance inside the radius is a true haversine distance."""
+    lat1 = math.radians(origin_lat)
+    lon1 = math.radians(origin_lon)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+    
+    screen = (
+        radius is not None
+        and radius <= EQUIRECTANGULAR_MAX_RADIUS_MILES
+        and abs(origin_lat) + math.degrees(radius / EARTH_RADIUS_MILES) <= EQUIRECTANGULAR_MAX_LATITUDE
+    )
+    if screen:
+        # Wrap the longitude delta so the screen also works across the antimeridian
+        dlon = (lon2 - lon1 + np.pi) % (2 * np.pi) - np.pi
+        x = dlon * np.cos((lat1 + lat2) / 2)
+        y = lat2 - lat1
+        distances = np.hypot(x, y) * EARTH_RADIUS_MILES
+        
+        nearby = distances <= radius * (1 + EQUIRECTANGULAR_SCREEN_MARGIN)
+        distances[nearby] = _haversine_miles(lat1, lon1, lat2[nearby], lon2[nearby])
+    else:
+        distances = _haversine_miles(lat1, lon1, lat2, lon2)
     
-    # Radius of earth in miles
-    r = 3956
+    if radius is None:
+        within_radius = np.ones(distances.shape, dtype=bool)
+    else:
+        within_radius = distances <= radius
     
-    return c * r
+    return distances, within_radius
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate the great circle distance between two points on Earth in miles"""
+    distances, _ = batch_distances(lat1, lon1, [lat2], [lon2])
+    return float(distances[0])
+
+METERS_PER_MILE = 1609.344
+
+def build_geo_point(latitude: float, longitude: float) -> dict:
+    """Build the GeoJSON point stored for the 2dsphere index (GeoJSON uses [longitude, latitude])"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def validate_coordinates(latitude: Optional[float], longitude: Optional[float]):
+    """Reject coordinates the 2dsphere index would refuse to store"""
+    if latitude is not None and not (-90 <= latitude <= 90):
+        raise HTTPException(status_code=400, detail="Invalid latitude")
+    if longitude is not None and not (-180 <= longitude <= 180):
+        raise HTTPException(status_code=400, detail="Invalid longitude")
 
 def can_users_match(user1: dict, user2: dict) -> bool:
     """Check if two users can see each other based on gender preferences"""
@@ -479,6 +1858,22 @@ def can_users_match(user1: dict, user2: dict) -> bool:
     
     return user1_wants_user2 and user2_wants_user1
 
+def build_gender_match_query(user: dict) -> dict:
+    """Query predicates selecting the users that can_users_match would accept for `user`"""
+    user_pref = user.get("gender_preference")
+    if user_pref == GenderPreference.BOTH:
+        # "both" accepts any gender, including none set - None also matches a missing field
+        acceptable_genders = [gender.value for gender in Gender] + [None]
+    else:
+        acceptable_genders = [user_pref]
+    
+    return {
+        # I want to see their gender...
+        "gender": {"$in": acceptable_genders},
+        # ...and they want to see mine
+        "gender_preference": {"$in": [user.get("gender"), GenderPreference.BOTH.value]}
+    }
+
 def is_user_blocked(user1_id: str, user2_id: str, user1_data: dict, user2_data: dict) -> bool:
     """Check if either user has blocked the other"""
     # Check if user1 has blocked user2
@@ -491,23 +1886,811 @@ def is_user_blocked(user1_id: str, user2_id: str, user1_data: dict, user2_data:
     
     return False
 
-async def filter_blocked_users(current_user_id: str, user_list: List[dict]) -> List[dict]:
-    """Filter out blocked users from a list of users"""
-    current_user = await db.users.find_one({"id": current_user_id})
-    if not current_user:
-        return user_list
+class ExclusionFilter:
+    """Bloom filter of the user ids someone must not see in discover (liked, blocked, blocked by).
+    
+    Replaces a $nin over the full id lists: the filter is a few KB even for heavy users and
+    is checked right after the indexed candidate fetch. Stored as 32-bit words so likes and
+    blocks can set bits atomically with $bit. False positives hide a small fraction
+    (DISCOVER_EXCLUSION_ERROR_RATE) of candidates; there are no false negatives."""
+    WORD_BITS = 32
+    
+    def __init__(self, words: List[int], num_bits: int, num_hashes: int, capacity: int, count: int = 0):
+        self.words = words
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+        self.count = count
+    
+    @classmethod
+    def for_capacity(cls, capacity: int) -> "ExclusionFilter":
+        num_bits = math.ceil(-capacity * math.log(DISCOVER_EXCLUSION_ERROR_RATE) / math.log(2) ** 2)
+        num_words = math.ceil(num_bits / cls.WORD_BITS)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls([0] * num_words, num_words * cls.WORD_BITS, num_hashes, capacity)
+    
+    @classmethod
+    def from_document(cls, doc: dict) -> "ExclusionFilter":
+        return cls(list(doc["words"]), doc["num_bits"], doc["num_hashes"], doc["capacity"], doc.get("count", 0))
+    
+    def to_document(self) -> dict:
+        return {
+            "words": [Int64(word) for word in self.words],
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "capacity": self.capacity,
+            "count": self.count
+        }
     
-    blocked_users = current_user.get("blocked_users", [])
-    blocked_by_users = current_user.get("blocked_by_users", [])
+    @staticmethod
+    def bit_positions(user_id: str, num_bits: int, num_hashes: int) -> List[int]:
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(user_id.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+    
+    def add(self, user_id: str):
+        for position in self.bit_positions(user_id, self.num_bits, self.num_hashes):
+            self.words[position // self.WORD_BITS] |= 1 << (position % self.WORD_BITS)
+        self.count += 1
+    
+    def __contains__(self, user_id: str) -> bool:
+        return all(
+            self.words[position // self.WORD_BITS] >> (position % self.WORD_BITS) & 1
+            for position in self.bit_positions(user_id, self.num_bits, self.num_hashes)
+        )
+
+DISCOVER_EXCLUSION_ERROR_RATE = 0.001
+DISCOVER_EXCLUSION_MIN_CAPACITY = 1024
+
+async def rebuild_discover_exclusion(user_id: str) -> ExclusionFilter:
+    """Rebuild a user's exclusion filter from the exact liked/blocked lists"""
+    user_doc = await db.users.find_one(
+        {"id": user_id},
+        {"_id": 0, "likes_given": 1, "blocked_users": 1, "blocked_by_users": 1}
+    ) or {}
+    excluded_ids = set(
+        user_doc.get("likes_given", []) +
+        user_doc.get("blocked_users", []) +
+        user_doc.get("blocked_by_users", [])
+    )
     
-    # Filter out users who are blocked or have blocked the current user
-    filtered_users = []
-    for user in user_list:
-        user_id = user.get("id")
-        if user_id not in blocked_users and user_id not in blocked_by_users:
-            filtered_users.append(user)
+    # Leave room to grow before the next rebuild
+    exclusion = ExclusionFilter.for_capacity(max(len(excluded_ids) * 2, DISCOVER_EXCLUSION_MIN_CAPACITY))
+    for excluded_id in excluded_ids:
+        exclusion.add(excluded_id)
     
-    return filtered_users
+    await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"discover_exclusion": exclusion.to_document()}}
+    )
+    return exclusion
+
+async def load_discover_exclusion(user: dict) -> ExclusionFilter:
+    """The user's exclusion filter, built on first use for users that predate it"""
+    if user.get("discover_exclusion"):
+        return ExclusionFilter.from_document(user["discover_exclusion"])
+    return await rebuild_discover_exclusion(user["id"])
+
+async def add_to_discover_exclusion(user_id: str, excluded_id: str):
+    """Set excluded_id's bits in the stored filter without reading or rewriting it"""
+    user_doc = await db.users.find_one(
+        {"id": user_id},
+        {"_id": 0, "discover_exclusion.num_bits": 1, "discover_exclusion.num_hashes": 1,
+         "discover_exclusion.capacity": 1, "discover_exclusion.count": 1}
+    )
+    params = user_doc.get("discover_exclusion") if user_doc else None
+    if not params:
+        # Built lazily from the id lists, which already contain excluded_id
+        return
+    
+    if params.get("count", 0) >= params["capacity"]:
+        # Full - a bigger filter keeps the false positive rate in check
+        await rebuild_discover_exclusion(user_id)
+        return
+    
+    masks = {}
+    for position in ExclusionFilter.bit_positions(excluded_id, params["num_bits"], params["num_hashes"]):
+        word = position // ExclusionFilter.WORD_BITS
+        masks[word] = masks.get(word, 0) | 1 << (position % ExclusionFilter.WORD_BITS)
+    
+    await db.users.update_one(
+        # Skip if the filter was resized in between - the rebuild read the updated lists
+        {"id": user_id, "discover_exclusion.num_bits": params["num_bits"]},
+        {
+            "$bit": {f"discover_exclusion.words.{word}": {"or": Int64(mask)} for word, mask in masks.items()},
+            "$inc": {"discover_exclusion.count": 1}
+        }
+    )
+
+async def find_nearest_candidates(current_user: dict, candidate_query: dict, k: int, exclusion: ExclusionFilter) -> List[tuple]:
+    """Return the k nearest compatible users as (user_doc, distance_in_miles), nearest first.
+    
+    $geoNear walks the 2dsphere index outwards from the current user, so the cursor is
+    already distance-ordered and we can stop after k compatible users. The cost depends
+    on k and the density around the user, not on the total population."""
+    cursor = db.users.aggregate(
+        [
+            {"$geoNear": {
+                "near": build_geo_point(current_user["latitude"], current_user["longitude"]),
+                "key": "geo_location",
+                "distanceField": "distance",
+                "maxDistance": current_user.get("search_radius", 25) * METERS_PER_MILE,
+                "query": candidate_query,
+                "spherical": True
+            }},
+            {"$project": {**DISCOVER_RANK_PROJECTION, "distance": 1}}
+        ],
+        # Small batches so stopping early doesn't pull the default 101 documents
+        batchSize=max(k * 2, 10)
+    )
+    
+    nearest = []
+    async for user_doc in cursor:
+        if user_doc["id"] in exclusion:
+            continue
+        
+        # Verification fallback - the query already applies gender preferences
+        if not can_users_match(current_user, user_doc):
+            continue
+        
+        # $geoNear reports meters
+        distance = user_doc.pop("distance") / METERS_PER_MILE
+        nearest.append((user_doc, distance))
+        if len(nearest) >= k:
+            break
+    
+    return nearest
+
+# Candidates buffered per vectorized distance computation in the discover scan fallback
+DISTANCE_BATCH_SIZE = 1000
+
+async def scan_nearest_candidates(current_user: dict, candidate_query: dict, k: int, exclusion: ExclusionFilter) -> List[tuple]:
+    """Exact k-nearest fallback for when $geoNear is unavailable.
+    
+    Scans every candidate but keeps only a bounded max-heap of the k best, so memory
+    stays O(k) and the result is the true nearest k rather than the first k scanned."""
+    current_user_lat = current_user["latitude"]
+    current_user_lon = current_user["longitude"]
+    current_user_radius = current_user.get("search_radius", 25)
+    
+    heap = []  # (-distance, scan order, user_doc) - the root is the farthest kept user
+    scan_order = itertools.count()
+    
+    def push_batch(batch: List[dict]):
+        distances, within_radius = batch_distances(
+            current_user_lat, current_user_lon,
+            [user_doc["latitude"] for user_doc in batch],
+            [user_doc["longitude"] for user_doc in batch],
+            radius=current_user_radius
+        )
+        for index in np.flatnonzero(within_radius):
+            distance = float(distances[index])
+            entry = (-distance, next(scan_order), batch[index])
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, entry)
+    
+    batch = []
+    projection = {**DISCOVER_RANK_PROJECTION, "latitude": 1, "longitude": 1}
+    async for user_doc in db.users.find(candidate_query, projection):
+        if user_doc["id"] in exclusion:
+            continue
+        
+        # Verification fallback - the query already applies gender preferences
+        if not can_users_match(current_user, user_doc):
+            continue
+        
+        # Current user has location but other user doesn't - skip
+        if not (user_doc.get("latitude") and user_doc.get("longitude")):
+            continue
+        
+        batch.append(user_doc)
+        if len(batch) >= DISTANCE_BATCH_SIZE:
+            push_batch(batch)
+            batch = []
+    
+    if batch:
+        push_batch(batch)
+    
+    return [(user_doc, -neg_distance) for neg_distance, _, user_doc in sorted(heap, reverse=True)]
+
+def build_discover_candidate_query(current_user: dict) -> dict:
+    """Query for the users current_user could discover, before distance and exclusions"""
+    # Potential matches must have photos and answers
+    return {
+        "id": {"$ne": current_user["id"]},
+        "photos": {"$exists": True, "$not": {"$size": 0}},  # Must have photos
+        "question_answers": {"$exists": True, "$not": {"$size": 0}},  # Must have answered questions
+        "email_verified": True,  # Must be email verified
+        **build_gender_match_query(current_user)  # Gender preferences checked by the index
+    }
+
+class ServedExclusion:
+    """A user's exclusion filter plus the exact ids already served to them from their queue"""
+    
+    def __init__(self, exclusion: ExclusionFilter, served_ids: set):
+        self.exclusion = exclusion
+        self.served_ids = served_ids
+    
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.served_ids or user_id in self.exclusion
+
+async def find_discover_candidates(
+    current_user: dict,
+    limit: int,
+    served_ids: Optional[set] = None
+) -> List[tuple]:
+    """Rank the users current_user can discover, as (user_doc, distance_in_miles) nearest first,
+    skipping served_ids"""
+    # Users to exclude (already liked + blocked users), checked after the indexed fetch
+    exclusion = await load_discover_exclusion(current_user)
+    if served_ids:
+        exclusion = ServedExclusion(exclusion, served_ids)
+    candidate_query = build_discover_candidate_query(current_user)
+    
+    current_user_lat = current_user.get("latitude")
+    current_user_lon = current_user.get("longitude")
+    has_location = bool(current_user_lat and current_user_lon)
+    
+    if has_location and discover_index is not None and discover_index.ready:
+        # Memory lookup - the page is hydrated from Mongo afterwards
+        nearest = discover_index.query(current_user, limit, exclusion)
+    elif has_location:
+        try:
+            nearest = await find_nearest_candidates(current_user, candidate_query, limit, exclusion)
+        except OperationFailure as e:
+            # e.g. the 2dsphere index is missing - stay exact with a full scan
+            logger.warning(f"$geoNear unavailable for discover, falling back to scan: {e}")
+            nearest = await scan_nearest_candidates(current_user, candidate_query, limit, exclusion)
+    else:
+        # No location filtering if current user doesn't have location
+        nearest = []
+        async for user_doc in db.users.find(candidate_query, DISCOVER_RANK_PROJECTION):
+            if user_doc["id"] not in exclusion and can_users_match(current_user, user_doc):
+                nearest.append((user_doc, None))
+                if len(nearest) >= limit:
+                    break
+    
+    return nearest
+
+# Materialized discover queue: a capped, ranked list of candidate ids per user, stamped with
+# the user's discover_generation. Pages pop from its head; anything that changes who the user
+# should see either removes single ids or bumps the generation so the queue is rebuilt.
+# Popped ids are remembered per generation (up to DISCOVER_QUEUE_MAX_SERVED) and refills rank
+# past them, so a user pages through everyone in range before anyone is shown again.
+DISCOVER_QUEUE_SIZE = 200
+DISCOVER_QUEUE_REFILL_THRESHOLD = 20
+DISCOVER_QUEUE_REBUILD_INTERVAL_SECONDS = 30
+DISCOVER_QUEUE_MAX_SERVED = 5000
+
+async def rebuild_discover_queue(current_user: dict):
+    """Rank a fresh queue of candidates for current_user, leaving out those already served"""
+    generation = current_user.get("discover_generation", 0)
+    queue = await db.discover_queues.find_one(
+        {"user_id": current_user["id"]}, {"_id": 0, "generation": 1, "served": 1}
+    )
+    served = queue.get("served", []) if queue and queue.get("generation") == generation else []
+    
+    candidates = await find_discover_candidates(current_user, DISCOVER_QUEUE_SIZE, set(served))
+    if not candidates and served:
+        # Everyone in range has been served: start another round
+        served = []
+        candidates = await find_discover_candidates(current_user, DISCOVER_QUEUE_SIZE)
+    try:
+        await db.discover_queues.update_one(
+            # Never let a slow rebuild overwrite a queue built for a newer generation
+            {"user_id": current_user["id"], "generation": {"$lte": generation}},
+            {"$set": {
+                "generation": generation,
+                "candidates": [
+                    {"id": user_doc["id"], "distance": round(distance, 1) if distance is not None else None}
+                    for user_doc, distance in candidates
+                ],
+                "served": served,
+                "built_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A newer generation's queue already exists
+        pass
+
+async def pop_discover_queue(user_id: str, generation: int, limit: int) -> Optional[dict]:
+    """Atomically take the next `limit` entries off the user's queue.
+    
+    Returns None when there is no queue for this generation."""
+    queue = await db.discover_queues.find_one_and_update(
+        {"user_id": user_id, "generation": generation},
+        [{"$set": {
+            "candidates": {"$slice": ["$candidates", limit, DISCOVER_QUEUE_SIZE]},
+            # Both fields are computed from the queue as it was before this pop
+            "served": {"$slice": [
+                {"$concatArrays": [
+                    {"$ifNull": ["$served", []]},
+                    {"$map": {"input": {"$slice": ["$candidates", limit]}, "as": "entry", "in": "$$entry.id"}}
+                ]},
+                -DISCOVER_QUEUE_MAX_SERVED
+            ]}
+        }}],
+        projection={"_id": 0, "candidates": 1, "built_at": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if queue is None:
+        return None
+    
+    candidates = queue.get("candidates", [])
+    rebuild_cutoff = datetime.utcnow() - timedelta(seconds=DISCOVER_QUEUE_REBUILD_INTERVAL_SECONDS)
+    return {
+        "page": candidates[:limit],
+        "remaining": max(len(candidates) - limit, 0),
+        # Small candidate pools stay below the refill threshold - don't rebuild them on every page
+        "recently_built": queue["built_at"] > rebuild_cutoff
+    }
+
+async def hydrate_discover_page(current_user: dict, entries: List[dict]) -> List[dict]:
+    """Load card profiles for queue entries, keeping queue order.
+    
+    Queues are ranked ahead of time, so each entry is checked again against the live discover
+    rules (complete and verified profile, gender preferences, blocks both ways, search radius)
+    and its distance recomputed; users who no longer qualify are dropped from the page."""
+    if not entries:
+        return []
+    
+    exclusion = await load_discover_exclusion(current_user)
+    query = {
+        **build_discover_candidate_query(current_user),
+        "id": {"$in": [entry["id"] for entry in entries if entry["id"] not in exclusion]},
+        # They may have blocked the current user after the queue was built
+        "blocked_users": {"$ne": current_user["id"]}
+    }
+    users_by_id = {}
+    async for user_doc in db.users.find(query, {**CARD_PROFILE_PROJECTION, "latitude": 1, "longitude": 1}):
+        users_by_id[user_doc["id"]] = user_doc
+    
+    current_user_lat = current_user.get("latitude")
+    current_user_lon = current_user.get("longitude")
+    has_location = bool(current_user_lat and current_user_lon)
+    
+    page = []
+    for entry in entries:
+        user_doc = users_by_id.get(entry["id"])
+        if not user_doc or not can_users_match(current_user, user_doc):
+            continue
+        
+        # Exact coordinates are only used here, never returned
+        latitude = user_doc.pop("latitude", None)
+        longitude = user_doc.pop("longitude", None)
+        distance = None
+        if has_location:
+            if not (latitude and longitude):
+                continue
+            distance = calculate_distance(current_user_lat, current_user_lon, latitude, longitude)
+            if distance > current_user.get("search_radius", 25):
+                continue
+            distance = round(distance, 1)
+        
+        user_doc["distance"] = distance
+        user_doc["photos"] = photo_urls_for_size(user_doc.get("photos", []), "card")
+        page.append(user_doc)
+    
+    return page
+
+async def invalidate_discover_queue(user_id: str):
+    """Force a rebuild of the user's discover queue on their next visit"""
+    await db.users.update_one({"id": user_id}, {"$inc": {"discover_generation": 1}})
+
+async def remove_from_discover_queue(user_id: str, candidate_ids: List[str]):
+    """Drop specific candidates from a user's queue without rebuilding it"""
+    await db.discover_queues.update_one(
+        {"user_id": user_id},
+        {"$pull": {"candidates": {"id": {"$in": candidate_ids}}}}
+    )
+
+# ====== DISCOVER CANDIDATE INDEX ======
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision 4 cells are about 24 x 12 miles at the equator
+DISCOVER_INDEX_PRECISION = 4
+
+DISCOVER_INDEX_FLAG_PHOTO_VERIFIED = 1
+
+# Only counts are needed to decide whether a user is discoverable
+DISCOVER_INDEX_PROJECTION = {
+    "_id": 0, "id": 1, "age": 1, "gender": 1, "gender_preference": 1,
+    "latitude": 1, "longitude": 1, "email_verified": 1, "photo_verified": 1,
+    "photo_count": {"$size": {"$ifNull": ["$photos", []]}},
+    "answer_count": {"$size": {"$ifNull": ["$question_answers", []]}}
+}
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Standard base32 geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+def geohash_cell_size(precision: int) -> tuple:
+    """(latitude, longitude) size in degrees of a geohash cell"""
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def geohash_cells_covering(latitude: float, longitude: float, radius: float, precision: int) -> List[str]:
+    """Geohash cells intersecting the bounding box of a radius (in miles) around a point"""
+    cell_lat, cell_lon = geohash_cell_size(precision)
+    miles_per_degree = EARTH_RADIUS_MILES * math.pi / 180
+    
+    lat_delta = radius / miles_per_degree
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+    
+    widest_cos = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if widest_cos <= radius / (miles_per_degree * 180):
+        # Close enough to a pole that the box spans every longitude
+        lon_delta = 180.0
+    else:
+        lon_delta = min(radius / (miles_per_degree * widest_cos), 180.0)
+    
+    lat_rows = range(math.floor((min_lat + 90) / cell_lat), math.floor((max_lat + 90) / cell_lat) + 1)
+    lon_start = math.floor((longitude - lon_delta + 180) / cell_lon)
+    lon_end = math.floor((longitude + lon_delta + 180) / cell_lon)
+    lon_columns = {column % round(360 / cell_lon) for column in range(lon_start, lon_end + 1)}
+    
+    cells = []
+    for row in lat_rows:
+        center_lat = min(-90 + (row + 0.5) * cell_lat, 90.0)
+        for column in lon_columns:
+            cells.append(encode_geohash(center_lat, -180 + (column + 0.5) * cell_lon, precision))
+    return cells
+
+class DiscoverIndexBucket:
+    """Discoverable users of one (geohash cell, gender, preference) key, stored column-wise"""
+    
+    def __init__(self):
+        self.ids: List[str] = []
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.ages = array("H")
+        self.flags = array("B")
+        self.rows: Dict[str, int] = {}
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def add(self, user_id: str, latitude: float, longitude: float, age: int, flags: int):
+        self.rows[user_id] = len(self.ids)
+        self.ids.append(user_id)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self.ages.append(age)
+        self.flags.append(flags)
+    
+    def remove(self, user_id: str):
+        # Swap with the last row so the columns stay dense
+        row = self.rows.pop(user_id)
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.latitudes[row] = self.latitudes[last]
+            self.longitudes[row] = self.longitudes[last]
+            self.ages[row] = self.ages[last]
+            self.flags[row] = self.flags[last]
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.latitudes.pop()
+        self.longitudes.pop()
+        self.ages.pop()
+        self.flags.pop()
+
+class GeohashCandidateIndex:
+    """In-process index of discoverable users bucketed by geohash cell and gender/preference.
+    
+    Radius queries scan only the buckets of the cells around the user, with vectorized
+    distances over the bucket columns, so discover needs no database read to rank candidates.
+    Writes in this process update it immediately; a periodic reload picks up other workers'."""
+    
+    def __init__(self, precision: int = DISCOVER_INDEX_PRECISION):
+        self.precision = precision
+        self.buckets: Dict[tuple, DiscoverIndexBucket] = {}
+        self.user_keys: Dict[str, tuple] = {}
+        self.ready = False
+    
+    def __len__(self):
+        return len(self.user_keys)
+    
+    @staticmethod
+    def is_discoverable(user_doc: dict) -> bool:
+        return bool(
+            user_doc.get("email_verified")
+            and user_doc.get("photo_count")
+            and user_doc.get("answer_count")
+            and user_doc.get("latitude") is not None
+            and user_doc.get("longitude") is not None
+        )
+    
+    def upsert(self, user_doc: dict):
+        """Add, move or drop a user given a document in DISCOVER_INDEX_PROJECTION shape"""
+        self.remove(user_doc["id"])
+        if not self.is_discoverable(user_doc):
+            return
+        
+        key = (
+            encode_geohash(user_doc["latitude"], user_doc["longitude"], self.precision),
+            user_doc.get("gender"),
+            user_doc.get("gender_preference")
+        )
+        flags = DISCOVER_INDEX_FLAG_PHOTO_VERIFIED if user_doc.get("photo_verified") else 0
+        self.buckets.setdefault(key, DiscoverIndexBucket()).add(
+            user_doc["id"], user_doc["latitude"], user_doc["longitude"], user_doc.get("age") or 0, flags
+        )
+        self.user_keys[user_doc["id"]] = key
+    
+    def remove(self, user_id: str):
+        key = self.user_keys.pop(user_id, None)
+        if key is None:
+            return
+        bucket = self.buckets[key]
+        bucket.remove(user_id)
+        if not bucket:
+            del self.buckets[key]
+    
+    def query(self, current_user: dict, limit: int, exclusion: ExclusionFilter) -> List[tuple]:
+        """The `limit` nearest discoverable users for current_user as ({"id": ...}, distance), nearest first"""
+        radius = current_user.get("search_radius", 25)
+        gender_query = build_gender_match_query(current_user)
+        genders = gender_query["gender"]["$in"]
+        preferences = gender_query["gender_preference"]["$in"]
+        
+        ids = []
+        latitudes = []
+        longitudes = []
+        for cell in geohash_cells_covering(current_user["latitude"], current_user["longitude"], radius, self.precision):
+            for gender in genders:
+                for preference in preferences:
+                    bucket = self.buckets.get((cell, gender, preference))
+                    if bucket:
+                        ids.extend(bucket.ids)
+                        latitudes.append(np.frombuffer(bucket.latitudes, dtype=np.float64))
+                        longitudes.append(np.frombuffer(bucket.longitudes, dtype=np.float64))
+        
+        if not ids:
+            return []
+        
+        distances, within_radius = batch_distances(
+            current_user["latitude"], current_user["longitude"],
+            np.concatenate(latitudes), np.concatenate(longitudes),
+            radius=radius
+        )
+        in_range = np.flatnonzero(within_radius)
+        
+        nearest = []
+        for index in in_range[np.argsort(distances[in_range], kind="stable")]:
+            user_id = ids[index]
+            if user_id == current_user["id"] or user_id in exclusion:
+                continue
+            nearest.append(({"id": user_id}, float(distances[index])))
+            if len(nearest) >= limit:
+                break
+        return nearest
+    
+    async def load(self):
+        """(Re)build from the database and swap the new contents in"""
+        fresh = GeohashCandidateIndex(self.precision)
+        async for user_doc in db.users.find(
+            {
+                "email_verified": True,
+                "latitude": {"$type": "number"},
+                "longitude": {"$type": "number"}
+            },
+            DISCOVER_INDEX_PROJECTION
+        ):
+            fresh.upsert(user_doc)
+        
+        self.buckets = fresh.buckets
+        self.user_keys = fresh.user_keys
+        self.ready = True
+
+discover_index: Optional[GeohashCandidateIndex] = GeohashCandidateIndex() if DISCOVER_INDEX_ENABLED else None
+
+async def refresh_discover_index(user_filter: dict):
+    """Re-read one user into the discover index after a write that may change their eligibility"""
+    if discover_index is None:
+        return
+    
+    user_doc = await db.users.find_one(user_filter, DISCOVER_INDEX_PROJECTION)
+    if user_doc:
+        discover_index.upsert(user_doc)
+
+async def maintain_discover_index():
+    """Load the discover index, then periodically reload it to pick up other workers' writes"""
+    while True:
+        try:
+            await discover_index.load()
+            logger.info(f"Discover index loaded with {len(discover_index)} users")
+        except Exception as e:
+            logger.error(f"Failed to load discover index: {e}")
+        await asyncio.sleep(DISCOVER_INDEX_REFRESH_SECONDS)
+
+# ====== DISCOVER RESULT CACHE ======
+
+class DiscoverCache(ABC):
+    """Cache of served discover pages keyed by user, discover_generation and page size.
+    
+    Reopening the discover screen returns the cached page instead of popping a new one.
+    Bumping discover_generation makes old entries unreachable; likes, blocks and candidates
+    going away invalidate explicitly. Backends implement the storage, this class the counters."""
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    async def get(self, user_id: str, generation: int, limit: int) -> Optional[List[dict]]:
+        users = await self._get(user_id, generation, limit)
+        if users is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return users
+    
+    async def set(self, user_id: str, generation: int, limit: int, users: List[dict]):
+        await self._set(user_id, generation, limit, users)
+    
+    async def invalidate_user(self, user_id: str):
+        """Drop every cached page of this user"""
+        self.invalidations += 1
+        await self._invalidate_user(user_id)
+    
+    async def invalidate_candidate(self, candidate_id: str):
+        """Drop every cached page showing this candidate"""
+        self.invalidations += 1
+        await self._invalidate_candidate(candidate_id)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "invalidations": self.invalidations
+        }
+    
+    @abstractmethod
+    async def _get(self, user_id: str, generation: int, limit: int) -> Optional[List[dict]]:
+        """The cached page, or None if there is none or it expired"""
+    
+    @abstractmethod
+    async def _set(self, user_id: str, generation: int, limit: int, users: List[dict]):
+        """Store a page, replacing any cached under the same key"""
+    
+    @abstractmethod
+    async def _invalidate_user(self, user_id: str):
+        """Drop every cached page of this user"""
+    
+    @abstractmethod
+    async def _invalidate_candidate(self, candidate_id: str):
+        """Drop every cached page showing this candidate"""
+
+class InMemoryDiscoverCache(DiscoverCache):
+    """TTL + LRU cache local to this worker"""
+    
+    def __init__(self, ttl_seconds: int = DISCOVER_CACHE_TTL_SECONDS, max_entries: int = DISCOVER_CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, users)
+        self.keys_by_user: Dict[str, set] = {}
+        self.keys_by_candidate: Dict[str, set] = {}
+        self.evictions = 0
+    
+    async def _get(self, user_id: str, generation: int, limit: int) -> Optional[List[dict]]:
+        key = (user_id, generation, limit)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+    
+    async def _set(self, user_id: str, generation: int, limit: int, users: List[dict]):
+        key = (user_id, generation, limit)
+        self._drop(key)
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, users)
+        self.keys_by_user.setdefault(user_id, set()).add(key)
+        for user_doc in users:
+            self.keys_by_candidate.setdefault(user_doc["id"], set()).add(key)
+        
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+    
+    async def _invalidate_user(self, user_id: str):
+        for key in list(self.keys_by_user.get(user_id, ())):
+            self._drop(key)
+    
+    async def _invalidate_candidate(self, candidate_id: str):
+        for key in list(self.keys_by_candidate.get(candidate_id, ())):
+            self._drop(key)
+    
+    def _drop(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self._unlink(self.keys_by_user, key[0], key)
+        for user_doc in entry[1]:
+            self._unlink(self.keys_by_candidate, user_doc["id"], key)
+    
+    @staticmethod
+    def _unlink(index: Dict[str, set], index_key: str, key: tuple):
+        keys = index.get(index_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[index_key]
+    
+    def stats(self) -> dict:
+        return {**super().stats(), "size": len(self.entries), "evictions": self.evictions}
+
+class MongoDiscoverCache(DiscoverCache):
+    """Cache shared by all workers in the discover_cache collection (expired by a TTL index)"""
+    
+    def __init__(self, ttl_seconds: int = DISCOVER_CACHE_TTL_SECONDS):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+    
+    async def _get(self, user_id: str, generation: int, limit: int) -> Optional[List[dict]]:
+        entry = await db.discover_cache.find_one(
+            # The TTL monitor only runs once a minute - check expiry here too
+            {"user_id": user_id, "generation": generation, "limit": limit, "expires_at": {"$gt": datetime.utcnow()}},
+            {"_id": 0, "users": 1}
+        )
+        return entry["users"] if entry else None
+    
+    async def _set(self, user_id: str, generation: int, limit: int, users: List[dict]):
+        await db.discover_cache.update_one(
+            {"user_id": user_id, "generation": generation, "limit": limit},
+            {"$set": {
+                "users": users,
+                "candidate_ids": [user_doc["id"] for user_doc in users],
+                "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            }},
+            upsert=True
+        )
+    
+    async def _invalidate_user(self, user_id: str):
+        await db.discover_cache.delete_many({"user_id": user_id})
+    
+    async def _invalidate_candidate(self, candidate_id: str):
+        await db.discover_cache.delete_many({"candidate_ids": candidate_id})
+
+discover_cache: DiscoverCache = MongoDiscoverCache() if DISCOVER_CACHE_BACKEND == "mongo" else InMemoryDiscoverCache()
 
 def compare_faces(profile_photo: str, verification_photo: str) -> float:
     """
@@ -600,19 +2783,202 @@ async def initialize_safety_tips():
         tip["id"] = str(uuid.uuid4())
         await db.safety_tips.insert_one(tip)
 
+async def initialize_indexes():
+    """Create the indexes the API queries rely on"""
+    # Backfill GeoJSON points for users whose coordinates predate the geo_location field
+    await db.users.update_many(
+        {
+            "latitude": {"$type": "number"},
+            "longitude": {"$type": "number"},
+            "geo_location": {"$exists": False}
+        },
+        [{"$set": {"geo_location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}]
+    )
+    
+    await db.users.create_index([("geo_location", "2dsphere")])
+    await db.discover_queues.create_index("user_id", unique=True)
+    await db.photos.create_index("id", unique=True)
+    await db.photos.create_index("orphaned_at", sparse=True)
+    await db.private_photos.create_index([("id", 1), ("owner_id", 1)], unique=True)
+    await db.sessions.create_index("id", unique=True)
+    await db.sessions.create_index("refresh_token_hash", unique=True)
+    await db.sessions.create_index("user_id")
+    await db.sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.revocations.create_index("created_at")
+    await db.revocations.create_index("expires_at", expireAfterSeconds=0)
+    await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+    await db.photo_hashes.create_index([("photo_id", 1), ("owner_id", 1)], unique=True)
+    await db.photo_hashes.create_index("segments")
+    await db.moderation_flags.create_index([("type", 1), ("user_id", 1), ("photo_id", 1)], unique=True)
+    await db.moderation_flags.create_index([("status", 1), ("created_at", -1)])
+    await db.discover_cache.create_index([("user_id", 1), ("generation", 1), ("limit", 1)])
+    await db.discover_cache.create_index("candidate_ids")
+    await db.discover_cache.create_index("expires_at", expireAfterSeconds=0)
+    # Serves the discover candidate query: verification + two-sided gender preference + radius
+    await db.users.create_index([
+        ("email_verified", 1),
+        ("gender", 1),
+        ("gender_preference", 1),
+        ("geo_location", "2dsphere")
+    ])
+
+# ====== AUTH RATE LIMITING ======
+class RateLimitRule(BaseModel):
+    """Token bucket: `burst` attempts at once, refilled at one per `refill_seconds`"""
+    name: str
+    burst: int
+    refill_seconds: float
+
+AUTH_RATE_LIMITS = {
+    "login": [
+        RateLimitRule(name="login:ip", burst=20, refill_seconds=6),
+        RateLimitRule(name="login:email", burst=5, refill_seconds=60),
+    ],
+    "register": [
+        RateLimitRule(name="register:ip", burst=5, refill_seconds=360),
+    ],
+    "resend-verification": [
+        RateLimitRule(name="resend-verification:ip", burst=10, refill_seconds=60),
+        RateLimitRule(name="resend-verification:email", burst=3, refill_seconds=600),
+    ],
+    "change-password": [
+        RateLimitRule(name="change-password:ip", burst=5, refill_seconds=60),
+    ],
+}
+
+class RateLimiter(ABC):
+    """Token-bucket limiter; backends implement the bucket storage, this class the counters"""
+    
+    def __init__(self):
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+    
+    async def hit(self, rule: RateLimitRule, key: str) -> float:
+        """Take one token; returns 0 if allowed, else seconds until the next token"""
+        retry_after = await self._take(rule, key)
+        counters = self.limited if retry_after else self.allowed
+        counters[rule.name] = counters.get(rule.name, 0) + 1
+        return retry_after
+    
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited)
+        }
+    
+    @abstractmethod
+    async def _take(self, rule: RateLimitRule, key: str) -> float:
+        """Refill the (rule, key) bucket and take one token; returns 0 if there was one, else seconds to wait"""
+
+class InMemoryRateLimiter(RateLimiter):
+    """Buckets local to this worker, capped in number (least recently used go first)"""
+    
+    def __init__(self, max_buckets: int = 100000):
+        super().__init__()
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[tuple, tuple]" = OrderedDict()  # (rule, key) -> (tokens, updated_at)
+    
+    async def _take(self, rule: RateLimitRule, key: str) -> float:
+        now = time.monotonic()
+        bucket_key = (rule.name, key)
+        tokens, updated_at = self.buckets.pop(bucket_key, (rule.burst, now))
+        tokens = min(rule.burst, tokens + (now - updated_at) / rule.refill_seconds)
+        
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) * rule.refill_seconds
+        
+        self.buckets[bucket_key] = (tokens, now)
+        while len(self.buckets) > self.max_buckets:
+            # A forgotten bucket is a full one, so this only ever errs towards allowing
+            self.buckets.popitem(last=False)
+        return retry_after
+
+class MongoRateLimiter(RateLimiter):
+    """Buckets shared by all workers in the rate_limits collection, updated atomically server-side"""
+    
+    async def _take(self, rule: RateLimitRule, key: str) -> float:
+        refill_ms = rule.refill_seconds * 1000
+        # Refill from elapsed server time ($$NOW), then take a token if there is one
+        refilled = {"$min": [
+            rule.burst,
+            {"$add": [
+                {"$ifNull": ["$tokens", rule.burst]},
+                {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, refill_ms]}
+            ]}
+        ]}
+        bucket = await db.rate_limits.find_one_and_update(
+            {"_id": f"{rule.name}:{key}"},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # An expired bucket would have refilled completely anyway
+                    "expires_at": {"$add": ["$$NOW", rule.burst * refill_ms]}
+                }}
+            ],
+            projection={"_id": 0, "allowed": 1, "tokens": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) * rule.refill_seconds
+
+auth_rate_limiter: RateLimiter = MongoRateLimiter() if AUTH_RATE_LIMIT_BACKEND == "mongo" else InMemoryRateLimiter()
+
+def client_ip(request: Request) -> str:
+    """Caller address, taken from X-Forwarded-For as appended by our own proxies"""
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if TRUSTED_PROXY_HOPS and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            # Entries left of the ones our proxies added are client-controlled
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+async def enforce_auth_rate_limit(action: str, request: Request, email: Optional[str] = None):
+    """Raise 429 with Retry-After once the caller's IP or the target email is over its limit.
+    
+    Called first thing in the handler, before any bcrypt or database work."""
+    subjects = {"ip": client_ip(request), "email": email.strip().lower() if email else None}
+    for rule in AUTH_RATE_LIMITS[action]:
+        subject = subjects[rule.name.rsplit(":", 1)[1]]
+        if subject is None:
+            continue
+        try:
+            retry_after = await auth_rate_limiter.hit(rule, subject)
+        except Exception as e:
+            # Don't lock everyone out because the limiter's storage is unavailable
+            logger.error(f"Rate limiter failed for {rule.name}: {e}")
+            continue
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
 # API Routes
 @api_router.post("/register")
 async def register(
     user_data: UserRegistration,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    request: Request
 ):
+    await enforce_auth_rate_limit("register", request)
+    
     # Check if user already exists
     existing_user = await db.users.find_one({"email": user_data.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await run_password_hashing(hash_password, user_data.password)
     user = User(
         email=user_data.email,
         first_name=user_data.first_name,
@@ -649,27 +3015,33 @@ async def verify_email(verification_data: EmailVerification):
         raise HTTPException(status_code=400, detail="Invalid or expired verification token")
     
     # Update user verification status
-    result = await db.users.update_one(
+    user_doc = await db.users.find_one_and_update(
         {"email": email},
         {
             "$set": {
                 "email_verified": True,
                 "verified_at": datetime.utcnow()
             }
-        }
+        },
+        projection={"_id": 0, "id": 1}
     )
     
-    if result.matched_count == 0:
+    if user_doc is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await refresh_discover_index({"id": user_doc["id"]})
+    
     return {"message": "Email verified successfully"}
 
 @api_router.post("/resend-verification")
 async def resend_verification(
     resend_data: ResendVerification,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    request: Request
 ):
     """Resend verification email"""
+    await enforce_auth_rate_limit("resend-verification", request, resend_data.email)
+    
     user_doc = await db.users.find_one({"email": resend_data.email})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
@@ -688,14 +3060,16 @@ async def resend_verification(
     return {"message": "Verification email resent"}
 
 @api_router.post("/login")
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, request: Request):
+    await enforce_auth_rate_limit("login", request, login_data.email)
+    
     # Find user
     user_doc = await db.users.find_one({"email": login_data.email})
     if not user_doc:
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(login_data.password, user_doc["password_hash"]):
+    if not await run_password_hashing(verify_password, login_data.password, user_doc["password_hash"]):
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
     # Check email verification
@@ -708,11 +3082,14 @@ async def login(login_data: UserLogin):
         {"$set": {"last_active": datetime.utcnow()}}
     )
     
-    # Generate token
-    token = create_access_token(user_doc["id"])
+    # Generate tokens
+    session_id, refresh_token = await create_session(user_doc["id"])
+    token = create_access_token(user_doc["id"], session_id=session_id, email_verified=True)
     
     return {
         "access_token": token,
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRATION_MINUTES * 60,
         "user": {
             "id": user_doc["id"],
             "email": user_doc["email"],
@@ -723,6 +3100,76 @@ async def login(login_data: UserLogin):
         }
     }
 
+@api_router.post("/token/refresh")
+async def refresh_access_token(refresh_data: RefreshTokenRequest):
+    """Trade a refresh token for a new access token; the refresh token is rotated"""
+    now = datetime.utcnow()
+    new_refresh_token = secrets.token_urlsafe(32)
+    session = await db.sessions.find_one_and_update(
+        {
+            "refresh_token_hash": hash_refresh_token(refresh_data.refresh_token),
+            "revoked_at": None,
+            "expires_at": {"$gt": now}
+        },
+        {"$set": {"refresh_token_hash": hash_refresh_token(new_refresh_token), "last_used_at": now}},
+        projection={"_id": 0, "id": 1, "user_id": 1}
+    )
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    # A user deleted or unverified meanwhile doesn't get a new access token
+    user_doc = await db.users.find_one({"id": session["user_id"]}, {"_id": 0, "email_verified": 1})
+    if not user_doc or not user_doc.get("email_verified", False):
+        await revoke_session(session["id"])
+        invalidate_principal(session["user_id"])
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    return {
+        "access_token": create_access_token(session["user_id"], session_id=session["id"], email_verified=True),
+        "refresh_token": new_refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRATION_MINUTES * 60
+    }
+
+@api_router.post("/logout")
+async def logout(payload: dict = Depends(get_token_payload)):
+    """End the session the access token belongs to"""
+    if payload.get("sid"):
+        await revoke_session(payload["sid"])
+    return {"message": "Logged out successfully"}
+
+@api_router.post("/logout-all")
+async def logout_all(current_user_id: str = Depends(get_current_user)):
+    """End every session of the current user, on all devices"""
+    await revoke_user_tokens(current_user_id)
+    return {"message": "Logged out of all sessions"}
+
+@api_router.put("/profile/password")
+async def change_password(
+    password_data: PasswordChange,
+    request: Request,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Change the password; every other session is logged out and this one gets fresh tokens"""
+    await enforce_auth_rate_limit("change-password", request)
+    
+    user_doc = await db.users.find_one({"id": current_user_id}, {"_id": 0, "password_hash": 1})
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not await run_password_hashing(verify_password, password_data.current_password, user_doc["password_hash"]):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    
+    hashed_password = await run_password_hashing(hash_password, password_data.new_password)
+    await db.users.update_one({"id": current_user_id}, {"$set": {"password_hash": hashed_password}})
+    await revoke_user_tokens(current_user_id)
+    
+    session_id, refresh_token = await create_session(current_user_id)
+    return {
+        "message": "Password changed successfully",
+        "access_token": create_access_token(current_user_id, session_id=session_id, email_verified=True),
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRATION_MINUTES * 60
+    }
+
 @api_router.get("/profile/questions")
 async def get_profile_questions():
     """Get all available profile questions"""
@@ -730,60 +3177,397 @@ async def get_profile_questions():
         "questions": [{"index": i, "question": q} for i, q in enumerate(PROFILE_QUESTIONS)]
     }
 
+async def run_photo_batch(fn, contents_list: List[bytes]) -> list:
+    """Run an image rendering function over uploads in the photo process pool, mapping failures to HTTP errors.
+    
+    A batch is admitted as a whole and renders at most a pool's worth of images at a time, so it
+    gets one clean 503 when the pool is busy instead of failing part way through."""
+    try:
+        return await photo_executor.map(fn, contents_list, PHOTO_PROCESS_POOL_SIZE)
+    except ExecutorUnavailable:
+        raise HTTPException(
+            status_code=503,
+            detail="Photo processing is busy, please try again shortly",
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+
+async def run_photo_processing(fn, contents: bytes):
+    return (await run_photo_batch(fn, [contents]))[0]
+
+async def read_profile_photo(file: UploadFile) -> bytes:
+    """Read and validate an uploaded profile photo"""
+    # Validate file type
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    contents, _ = await read_image_upload(file)
+    return contents
+
+async def process_photo_upload(file: UploadFile) -> dict:
+    """Read, validate and render an uploaded profile photo"""
+    contents = await read_profile_photo(file)
+    # Verify it's a valid image and re-encode it at every served size
+    return await run_photo_processing(render_photo_derivatives, contents)
+
+async def record_private_photo(photo_id: str, owner_id: str, purpose: str):
+    """Let owner_id (besides admins) read a private photo"""
+    await db.private_photos.update_one(
+        {"id": photo_id, "owner_id": owner_id},
+        {"$setOnInsert": {"id": photo_id, "owner_id": owner_id, "purpose": purpose, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def store_private_photo(file: UploadFile, owner_id: str, purpose: str) -> str:
+    """Strip an uploaded selfie or evidence image of its metadata and keep it in the private store.
+    
+    Returns the private photo URL."""
+    contents, _ = await read_image_upload(file)
+    data = await run_photo_processing(render_private_photo, contents)
+    photo_id = await private_photo_store.put(data, "image/jpeg")
+    await record_private_photo(photo_id, owner_id, purpose)
+    return private_photo_url(photo_id)
+
+async def append_profile_photos(user_id: str, new_photo_urls: List[str]) -> int:
+    """Append photos in one write that only applies while the limit leaves room for all of them.
+    
+    Returns the new photo count. When nothing is appended the photos are released, so blobs
+    stored for this upload are collected unless something else references them."""
+    user_doc = await db.users.find_one_and_update(
+        {
+            "id": user_id,
+            # Index MAX - n must not exist yet, i.e. at most MAX - n photos today
+            f"photos.{MAX_PROFILE_PHOTOS - len(new_photo_urls)}": {"$exists": False},
+            "photos": {"$nin": new_photo_urls}
+        },
+        {"$push": {"photos": {"$each": new_photo_urls}}},
+        projection={"_id": 0, "photo_count": {"$size": "$photos"}},
+        return_document=ReturnDocument.AFTER
+    )
+    if user_doc is not None:
+        await refresh_discover_index({"id": user_id})
+        return user_doc["photo_count"]
+    
+    for photo in new_photo_urls:
+        await release_photo(photo_id_from_url(photo))
+    
+    # Work out which guard failed
+    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "photos": 1})
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    if set(new_photo_urls) & set(user_doc.get("photos", [])):
+        raise HTTPException(status_code=400, detail="Photo already uploaded")
+    raise HTTPException(status_code=400, detail=f"Maximum {MAX_PROFILE_PHOTOS} photos allowed")
+
 @api_router.post("/profile/upload-photo")
 async def upload_photo(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user_id: str = Depends(get_current_user)
 ):
     """Upload a profile photo"""
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    rendered = await process_photo_upload(file)
     
-    # Read and validate image
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:  # 5MB limit
-        raise HTTPException(status_code=400, detail="File too large (max 5MB)")
+    # The bytes go to the blob store, the user only keeps a reference
+    photo_id = await store_photo_derivatives(rendered, current_user_id)
+    new_photo_url = photo_url(photo_id)
+    photo_count = await append_profile_photos(current_user_id, [new_photo_url])
+    background_tasks.add_task(index_photo_hash, photo_id, current_user_id, rendered["dhash"])
     
-    if len(contents) == 0:
-        raise HTTPException(status_code=400, detail="Empty file")
+    return {
+        "message": "Photo uploaded successfully",
+        "photo_count": photo_count,
+        "photo_id": photo_id,
+        "photo_url": new_photo_url
+    }
+
+@api_router.post("/profile/upload-photos")
+async def upload_photos(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user_id: str = Depends(get_current_user)
+):
+    """Upload several profile photos in one request; either all of them are added or none"""
+    if len(files) > MAX_PROFILE_PHOTOS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_PROFILE_PHOTOS} photos allowed")
+    
+    # Every file is read and checked before the batch claims room in the photo process pool
+    uploads = [await read_profile_photo(file) for file in files]
+    rendered_photos = await run_photo_batch(render_photo_derivatives, uploads)
+    photo_ids = await asyncio.gather(*(
+        store_photo_derivatives(rendered, current_user_id) for rendered in rendered_photos
+    ))
+    dhashes = dict(zip(photo_ids, (rendered["dhash"] for rendered in rendered_photos)))
+    
+    # The same picture twice in one batch is only added once
+    photo_ids = list(dict.fromkeys(photo_ids))
+    new_photo_urls = [photo_url(photo_id) for photo_id in photo_ids]
+    photo_count = await append_profile_photos(current_user_id, new_photo_urls)
+    for photo_id in photo_ids:
+        background_tasks.add_task(index_photo_hash, photo_id, current_user_id, dhashes[photo_id])
     
-    try:
-        # Verify it's a valid image and create a new copy to avoid image verification issues
-        image = Image.open(io.BytesIO(contents))
-        # Convert to RGB if needed and create a copy
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        
-        # Create a new image buffer
-        output_buffer = io.BytesIO()
-        image.save(output_buffer, format='JPEG', quality=85)
-        processed_contents = output_buffer.getvalue()
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+    return {
+        "message": f"{len(photo_ids)} photos uploaded successfully",
+        "photo_count": photo_count,
+        "photos": [
+            {"photo_id": photo_id, "photo_url": url} for photo_id, url in zip(photo_ids, new_photo_urls)
+        ]
+    }
+
+async def can_view_gallery(current_user: dict, user_doc: dict) -> bool:
+    """Whether current_user may open user_doc's gallery: they matched, or discover could show user_doc"""
+    if can_users_match(current_user, user_doc):
+        current_user_lat = current_user.get("latitude")
+        current_user_lon = current_user.get("longitude")
+        if not (current_user_lat and current_user_lon):
+            return True
+        latitude = user_doc.get("latitude")
+        longitude = user_doc.get("longitude")
+        if latitude and longitude and calculate_distance(
+            current_user_lat, current_user_lon, latitude, longitude
+        ) <= current_user.get("search_radius", 25):
+            return True
     
-    # Convert to base64 for storage (in production, use cloud storage)
-    photo_data = base64.b64encode(processed_contents).decode('utf-8')
-    photo_url = f"data:image/jpeg;base64,{photo_data}"
+    matched = await db.users.find_one({"id": user_doc["id"], "matches": current_user["id"]}, {"_id": 1})
+    return matched is not None
+
+@api_router.get("/users/{user_id}/photos")
+async def get_user_photos(
+    user_id: str,
+    size: str = "card",
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    """Get a user's full photo gallery, for screens that opened a lite payload"""
+    if size not in PHOTO_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown photo size: {size}")
     
-    # Update user photos
-    user_doc = await db.users.find_one({"id": current_user_id})
+    if user_id == current_user_id:
+        user_doc = await loader.load(current_user_id, ["photos"])
+    else:
+        # Blocked either way, unverified or not someone you could meet: looks like they don't exist
+        user_doc = await db.users.find_one(
+            {
+                "id": user_id,
+                "email_verified": True,
+                "blocked_users": {"$ne": current_user_id},
+                "blocked_by_users": {"$ne": current_user_id}
+            },
+            {"_id": 0, "id": 1, "photos": 1, "gender": 1, "gender_preference": 1, "latitude": 1, "longitude": 1}
+        )
+        current_user = await loader.load(current_user_id, DISCOVER_USER_FIELDS)
+        if user_doc and (not current_user or not await can_view_gallery(current_user, user_doc)):
+            user_doc = None
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    photos = user_doc.get("photos", [])
+    return {
+        "user_id": user_id,
+        "photo_count": len(photos),
+        "photos": [
+            {"photo_id": photo_id_from_url(photo), "photo_url": sized_url}
+            for photo, sized_url in zip(photos, photo_urls_for_size(photos, size))
+        ]
+    }
+
+@api_router.put("/profile/photos/order")
+async def reorder_photos(
+    order_data: PhotoOrderUpdate,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Reorder profile photos by id; the first one becomes the primary photo"""
+    user_doc = await db.users.find_one({"id": current_user_id}, {"_id": 0, "photos": 1})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
     photos = user_doc.get("photos", [])
-    if len(photos) >= 10:  # Limit to 10 photos
-        raise HTTPException(status_code=400, detail="Maximum 10 photos allowed")
+    # Legacy inline photos have no id and are addressed by their stored value
+    photos_by_id = {photo_id_from_url(photo) or photo: photo for photo in photos}
+    if len(order_data.photo_ids) != len(photos) or set(order_data.photo_ids) != photos_by_id.keys():
+        raise HTTPException(status_code=400, detail="photo_ids must list every current photo exactly once")
     
-    photos.append(photo_url)
+    # Only apply if nobody added or removed a photo since we read the list
+    result = await db.users.update_one(
+        {"id": current_user_id, "photos": photos},
+        {"$set": {"photos": [photos_by_id[photo_id] for photo_id in order_data.photo_ids]}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Photos changed meanwhile, please reload")
     
-    await db.users.update_one(
-        {"id": current_user_id},
-        {"$set": {"photos": photos}}
+    await discover_cache.invalidate_candidate(current_user_id)
+    return {"message": "Photos reordered successfully", "photo_ids": order_data.photo_ids}
+
+@api_router.delete("/profile/photos/{photo_id}")
+async def delete_photo(
+    photo_id: str,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Remove one profile photo by id"""
+    user_doc = await db.users.find_one_and_update(
+        {"id": current_user_id, "photos": photo_url(photo_id)},
+        {"$pull": {"photos": photo_url(photo_id)}},
+        projection={"_id": 0, "photo_count": {"$size": "$photos"}},
+        return_document=ReturnDocument.AFTER
     )
+    if user_doc is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    await db.photo_hashes.delete_one({"photo_id": photo_id, "owner_id": current_user_id})
+    # Blobs are content-addressed and may be shared; they are collected once nobody references them
+    await release_photo(photo_id)
+    await refresh_discover_index({"id": current_user_id})
+    await discover_cache.invalidate_candidate(current_user_id)
+    return {"message": "Photo deleted successfully", "photo_count": user_doc["photo_count"]}
+
+# Photo ids are content hashes, so a URL's bytes never change
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header value covers the given ETag"""
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison is what If-None-Match calls for
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def parse_byte_range(range_header: str, length: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single "bytes=" range.
+    
+    Returns None when the header should be ignored (other units, multiple ranges or
+    malformed) and raises 416 when the range can't be satisfied."""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else length - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix_length = int(last)
+            if suffix_length == 0:
+                raise ValueError
+            start = max(length - suffix_length, 0)
+            end = length - 1
+    except ValueError:
+        return None
+    
+    if start >= length:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    if start > end:
+        return None
+    return start, min(end, length - 1)
+
+def photo_etag(photo_id: str, size: str, image_format: str) -> str:
+    """ETag of one rendition; a photo id always maps to the same renditions"""
+    tag = photo_id if size == "full" else f"{photo_id}-{size}"
+    return f'"{tag}-webp"' if image_format == "webp" else f'"{tag}"'
+
+def accepts_webp(accept: str) -> bool:
+    for media_range in accept.split(","):
+        media_type, _, params = media_range.partition(";")
+        if media_type.strip().lower() == "image/webp":
+            # An explicit q=0 means "not acceptable"
+            return not re.search(r"\bq=0(\.0*)?\s*(;|$)", params)
+    return False
+
+@api_router.get("/photos/{photo_id}")
+async def get_photo(photo_id: str, request: Request, size: str = "full"):
+    """Stream a stored photo rendition with strong caching and byte range support.
+    
+    Clients sending image/webp in Accept get the WebP rendition when there is one."""
+    if not PHOTO_ID_PATTERN.match(photo_id):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if size not in PHOTO_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown photo size: {size}")
+    
+    preferred_format = "webp" if PHOTO_WEBP_ENABLED and accepts_webp(request.headers.get("accept", "")) else "jpeg"
+    etag = photo_etag(photo_id, size, preferred_format)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PHOTO_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept"
+    }
     
-    return {"message": "Photo uploaded successfully", "photo_count": len(photos), "photo_url": photo_url}
+    # The ETag is derived from the id, so revalidation needs no storage read at all
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    blob_key = photo_id
+    if size != "full" or preferred_format == "webp":
+        photo_doc = await db.photos.find_one(
+            {"id": photo_id},
+            {"_id": 0, f"derivatives.{size}": 1, f"webp_derivatives.{size}": 1}
+        ) or {}
+        webp_key = photo_doc.get("webp_derivatives", {}).get(size)
+        if preferred_format == "webp" and webp_key:
+            blob_key = webp_key
+        else:
+            # Photos stored before renditions existed only have the original
+            blob_key = photo_doc.get("derivatives", {}).get(size, photo_id)
+            if preferred_format == "webp":
+                # No WebP rendition: the client gets (and may already hold) the JPEG one
+                etag = headers["ETag"] = photo_etag(photo_id, size, "jpeg")
+                if if_none_match and etag_matches(if_none_match, etag):
+                    return Response(status_code=304, headers=headers)
+    
+    blob = await photo_store.open(blob_key)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    start, end = 0, blob.length - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and blob.length and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_byte_range(range_header, blob.length)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{blob.length}"
+    
+    headers["Content-Length"] = str(end - start + 1 if blob.length else 0)
+    return StreamingResponse(
+        blob.iter_range(start, end),
+        status_code=status_code,
+        media_type=blob.content_type,
+        headers=headers
+    )
+
+@api_router.get("/private-photos/{photo_id}")
+async def get_private_photo(
+    photo_id: str,
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
+    """Stream a verification selfie or report evidence image to the user who uploaded it or an admin"""
+    if not PHOTO_ID_PATTERN.match(photo_id):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    owned = await db.private_photos.find_one({"id": photo_id, "owner_id": current_user_id}, {"_id": 1})
+    if not owned:
+        user_doc = await loader.load(current_user_id, ["is_admin"])
+        if not user_doc or not user_doc.get("is_admin", False):
+            # Same answer as a missing photo, so ids can't be probed
+            raise HTTPException(status_code=404, detail="Photo not found")
+    
+    blob = await private_photo_store.open(photo_id)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    return StreamingResponse(
+        blob.iter_range(0, blob.length - 1),
+        media_type=blob.content_type,
+        headers={"Cache-Control": "private, no-store", "Content-Length": str(blob.length)}
+    )
 
 @api_router.put("/profile")
 async def update_profile(
@@ -805,6 +3589,24 @@ async def update_profile(
     if profile_data.longitude is not None:
         update_data["longitude"] = profile_data.longitude
     
+    if profile_data.latitude is not None or profile_data.longitude is not None:
+        validate_coordinates(profile_data.latitude, profile_data.longitude)
+        latitude = profile_data.latitude
+        longitude = profile_data.longitude
+        
+        # Only one coordinate sent - pair it with the stored one to keep the geo point in sync
+        if latitude is None or longitude is None:
+            user_doc = await db.users.find_one(
+                {"id": current_user_id},
+                {"latitude": 1, "longitude": 1}
+            )
+            if user_doc:
+                latitude = latitude if latitude is not None else user_doc.get("latitude")
+                longitude = longitude if longitude is not None else user_doc.get("longitude")
+        
+        if latitude is not None and longitude is not None:
+            update_data["geo_location"] = build_geo_point(latitude, longitude)
+    
     if profile_data.search_radius is not None:
         if profile_data.search_radius < 1 or profile_data.search_radius > 100:
             raise HTTPException(status_code=400, detail="Search radius must be between 1 and 100 miles")
@@ -826,23 +3628,37 @@ async def update_profile(
         update_data["question_answers"] = [qa.dict() for qa in profile_data.question_answers]
     
     if update_data:
+        update = {"$set": update_data}
+        if {"latitude", "longitude", "search_radius"} & update_data.keys():
+            # Who is in range changed - rebuild the discover queue
+            update["$inc"] = {"discover_generation": 1}
+        
         await db.users.update_one(
             {"id": current_user_id},
-            {"$set": update_data}
+            update
         )
+        await refresh_discover_index({"id": current_user_id})
+        if "$inc" in update:
+            await discover_cache.invalidate_user(current_user_id)
+        # Cached pages showing this user have a stale card, or shouldn't show them at all any more
+        # (moved out of range, answers removed)
+        await discover_cache.invalidate_candidate(current_user_id)
     
     return {"message": "Profile updated successfully"}
 
 @api_router.get("/profile/me")
-async def get_my_profile(current_user_id: str = Depends(get_current_user)):
+async def get_my_profile(
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
     """Get current user's profile"""
-    user_doc = await db.users.find_one({"id": current_user_id})
+    user_doc = await loader.load(current_user_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Remove sensitive data
-    user_doc.pop("password_hash", None)
-    user_doc.pop("_id", None)
+    for field in PRIVATE_USER_FIELDS:
+        user_doc.pop(field, None)
     
     return user_doc
 
@@ -853,19 +3669,22 @@ async def update_location(
 ):
     """Update user location"""
     # Validate coordinates
-    if not (-90 <= location_data.latitude <= 90):
-        raise HTTPException(status_code=400, detail="Invalid latitude")
-    if not (-180 <= location_data.longitude <= 180):
-        raise HTTPException(status_code=400, detail="Invalid longitude")
+    validate_coordinates(location_data.latitude, location_data.longitude)
     
     await db.users.update_one(
         {"id": current_user_id},
         {"$set": {
             "location": location_data.location,
             "latitude": location_data.latitude,
-            "longitude": location_data.longitude
-        }}
+            "longitude": location_data.longitude,
+            "geo_location": build_geo_point(location_data.latitude, location_data.longitude)
+        },
+         "$inc": {"discover_generation": 1}}
     )
+    await refresh_discover_index({"id": current_user_id})
+    await discover_cache.invalidate_user(current_user_id)
+    # They may have moved out of range of people whose cached page shows them
+    await discover_cache.invalidate_candidate(current_user_id)
     
     return {"message": "Location updated successfully"}
 
@@ -877,83 +3696,43 @@ async def update_search_preferences(
     """Update search preferences"""
     await db.users.update_one(
         {"id": current_user_id},
-        {"$set": {"search_radius": preferences.search_radius}}
+        {"$set": {"search_radius": preferences.search_radius},
+         "$inc": {"discover_generation": 1}}
     )
+    await discover_cache.invalidate_user(current_user_id)
     
     return {"message": "Search preferences updated successfully"}
 
 @api_router.get("/discover")
 async def discover_users(
+    background_tasks: BackgroundTasks,
     current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader),
     limit: int = 10
 ):
     """Get users to swipe on (exclude already liked/passed users and apply gender filtering and distance filtering)"""
-    current_user = await db.users.find_one({"id": current_user_id})
+    current_user = await loader.load(current_user_id, DISCOVER_USER_FIELDS)
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get users to exclude (already liked + self + blocked users)
-    exclude_ids = current_user.get("likes_given", []) + [current_user_id]
-    blocked_users = current_user.get("blocked_users", [])
-    blocked_by_users = current_user.get("blocked_by_users", [])
-    exclude_ids.extend(blocked_users + blocked_by_users)
-    
-    # Find all potential matches first (must have photos and answers)
-    cursor = db.users.find({
-        "id": {"$nin": exclude_ids},
-        "photos": {"$exists": True, "$not": {"$size": 0}},  # Must have photos
-        "question_answers": {"$exists": True, "$not": {"$size": 0}},  # Must have answered questions
-        "email_verified": True  # Must be email verified
-    })
+    generation = current_user.get("discover_generation", 0)
     
-    # Filter by gender preferences and distance
-    compatible_users = []
-    current_user_lat = current_user.get("latitude")
-    current_user_lon = current_user.get("longitude")
-    current_user_radius = current_user.get("search_radius", 25)
+    # Reopening discover shows the same page until the user acts on it
+    cached_users = await discover_cache.get(current_user_id, generation, limit)
+    if cached_users is not None:
+        return {"users": cached_users}
     
-    async for user_doc in cursor:
-        # Check gender compatibility
-        if not can_users_match(current_user, user_doc):
-            continue
-            
-        # Check distance if both users have location
-        if current_user_lat and current_user_lon and user_doc.get("latitude") and user_doc.get("longitude"):
-            distance = calculate_distance(
-                current_user_lat, current_user_lon,
-                user_doc["latitude"], user_doc["longitude"]
-            )
-            
-            # Skip if user is outside search radius
-            if distance > current_user_radius:
-                continue
-                
-            # Add distance to user data
-            user_doc["distance"] = round(distance, 1)
-        elif current_user_lat and current_user_lon:
-            # Current user has location but other user doesn't - skip
-            continue
-        else:
-            # No location filtering if current user doesn't have location
-            user_doc["distance"] = None
-        
-        # Remove sensitive data
-        user_doc.pop("password_hash", None)
-        user_doc.pop("_id", None)
-        user_doc.pop("likes_given", None)
-        user_doc.pop("likes_received", None)
-        user_doc.pop("matches", None)
-        user_doc.pop("latitude", None)  # Don't expose exact coordinates
-        user_doc.pop("longitude", None)
-        
-        compatible_users.append(user_doc)
-        
-        if len(compatible_users) >= limit:
-            break
+    queue = await pop_discover_queue(current_user_id, generation, limit)
+    if queue is None or not queue["page"]:
+        # First visit, invalidated or exhausted queue - build it inline
+        await rebuild_discover_queue(current_user)
+        queue = await pop_discover_queue(current_user_id, generation, limit)
+    elif queue["remaining"] < DISCOVER_QUEUE_REFILL_THRESHOLD and not queue["recently_built"]:
+        # Running low - refill after the response is sent
+        background_tasks.add_task(rebuild_discover_queue, current_user)
     
-    # Sort by distance if available
-    if current_user_lat and current_user_lon:
-        compatible_users.sort(key=lambda x: x.get("distance", float('inf')))
+    compatible_users = await hydrate_discover_page(current_user, queue["page"] if queue else [])
+    await discover_cache.set(current_user_id, generation, limit, compatible_users)
     
     return {"users": compatible_users}
 
@@ -977,14 +3756,20 @@ async def view_profile(
 @api_router.post("/profile/{user_id}/like")
 async def like_user(
     user_id: str,
-    current_user_id: str = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
     """Like another user (only after viewing their profile)"""
     if user_id == current_user_id:
         raise HTTPException(status_code=400, detail="Cannot like yourself")
     
+    # Both users come back from one query
+    target_user, current_user = await asyncio.gather(
+        loader.load(user_id, LIKE_TARGET_FIELDS),
+        loader.load(current_user_id, LIKE_USER_FIELDS)
+    )
+    
     # Check if current user has viewed the profile
-    target_user = await db.users.find_one({"id": user_id})
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -993,8 +3778,7 @@ async def like_user(
         raise HTTPException(status_code=400, detail="Must view profile before liking")
     
     # Verify users are compatible (gender preferences)
-    current_user = await db.users.find_one({"id": current_user_id})
-    if not can_users_match(current_user, target_user):
+    if not current_user or not can_users_match(current_user, target_user):
         raise HTTPException(status_code=400, detail="Users are not compatible")
     
     # Add like
@@ -1008,6 +3792,11 @@ async def like_user(
         {"$addToSet": {"likes_received": current_user_id}}
     )
     
+    # Liked users are excluded from discover from now on
+    await add_to_discover_exclusion(current_user_id, user_id)
+    await remove_from_discover_queue(current_user_id, [user_id])
+    await discover_cache.invalidate_user(current_user_id)
+    
     # Check for mutual match
     target_user_likes = target_user.get("likes_given", [])
     is_match = current_user_id in target_user_likes
@@ -1032,9 +3821,12 @@ async def like_user(
     return {"message": "Like sent", "match": False}
 
 @api_router.get("/matches")
-async def get_matches(current_user_id: str = Depends(get_current_user)):
+async def get_matches(
+    view: PayloadView = PayloadView.FULL,
+    current_user_id: str = Depends(get_current_user)
+):
     """Get user's matches"""
-    user_doc = await db.users.find_one({"id": current_user_id})
+    user_doc = await db.users.find_one({"id": current_user_id}, {"_id": 0, "matches": 1})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -1042,11 +3834,9 @@ async def get_matches(current_user_id: str = Depends(get_current_user)):
     
     # Get match details
     matches = []
-    async for match_user in db.users.find({"id": {"$in": match_ids}}):
-        match_user.pop("password_hash", None)
-        match_user.pop("_id", None)
-        match_user.pop("likes_given", None)
-        match_user.pop("likes_received", None)
+    projection = LITE_PROFILE_PROJECTION if view == PayloadView.LITE else PUBLIC_PROFILE_PROJECTION
+    async for match_user in db.users.find({"id": {"$in": match_ids}}, projection):
+        match_user["photos"] = photo_urls_for_size(match_user.get("photos", []), "card")
         matches.append(match_user)
     
     return {"matches": matches}
@@ -1063,10 +3853,10 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         token_user_id = payload.get("user_id")
-        if not token_user_id or token_user_id != user_id:
+        if not token_user_id or token_user_id != user_id or revocation_list.is_revoked(payload):
             await websocket.close(code=4001, reason="Invalid token")
             return
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         await websocket.close(code=4001, reason="Invalid token")
         return
     
@@ -1211,6 +4001,7 @@ async def get_messages(
 @api_router.get("/conversations/{match_id}/questions")
 async def get_conversation_questions(
     match_id: str,
+    view: PayloadView = PayloadView.FULL,
     current_user_id: str = Depends(get_current_user)
 ):
     """Get the other user's profile questions for responding to (first message)"""
@@ -1227,7 +4018,14 @@ async def get_conversation_questions(
     other_user_id = match_doc["user1_id"] if current_user_id == match_doc["user2_id"] else match_doc["user2_id"]
     
     # Get the other user's profile
-    other_user = await db.users.find_one({"id": other_user_id})
+    projection = {"_id": 0, "id": 1, "first_name": 1, "age": 1, "photos": 1, "question_answers": 1}
+    if view == PayloadView.LITE:
+        projection = {
+            **projection,
+            "photos": {"$slice": 1},
+            "photo_count": LITE_PROFILE_PROJECTION["photo_count"]
+        }
+    other_user = await db.users.find_one({"id": other_user_id}, projection)
     if not other_user:
         raise HTTPException(status_code=404, detail="Other user not found")
     
@@ -1245,13 +4043,18 @@ async def get_conversation_questions(
                 "answer": qa.get("answer", "")
             })
     
+    other_user_summary = {
+        "id": other_user["id"],
+        "first_name": other_user["first_name"],
+        "age": other_user["age"],
+        # The chat header only shows an avatar
+        "photos": photo_urls_for_size(other_user.get("photos", []), "thumb")
+    }
+    if view == PayloadView.LITE:
+        other_user_summary["photo_count"] = other_user["photo_count"]
+    
     return {
-        "other_user": {
-            "id": other_user["id"],
-            "first_name": other_user["first_name"],
-            "age": other_user["age"],
-            "photos": other_user.get("photos", [])
-        },
+        "other_user": other_user_summary,
         "questions_with_answers": questions_with_answers
     }
 
@@ -1337,12 +4140,8 @@ async def mark_message_as_read(
 # ====== SAFETY & SECURITY ENDPOINTS ======
 
 # Photo Verification Endpoints
-@api_router.post("/profile/verify-photo")
-async def submit_photo_verification(
-    verification_data: PhotoVerificationRequest,
-    current_user_id: str = Depends(get_current_user)
-):
-    """Submit a selfie for photo verification"""
+async def create_photo_verification(current_user_id: str, verification_photo: str) -> dict:
+    """Record a verification selfie (base64 or blob reference) and auto-approve when it matches"""
     # Check if user already has a pending verification
     existing_verification = await db.photo_verifications.find_one({
         "user_id": current_user_id,
@@ -1353,20 +4152,20 @@ async def submit_photo_verification(
         raise HTTPException(status_code=400, detail="Verification already in progress")
     
     # Get user's profile photos for comparison
-    user_doc = await db.users.find_one({"id": current_user_id})
+    user_doc = await db.users.find_one({"id": current_user_id}, {"_id": 0, "photos": {"$slice": 1}})
     if not user_doc or not user_doc.get("photos"):
         raise HTTPException(status_code=400, detail="Must have profile photos to verify")
     
     # Create verification record
     verification = PhotoVerification(
         user_id=current_user_id,
-        verification_photo=verification_data.verification_photo,
+        verification_photo=verification_photo,
         status=VerificationStatus.SUBMITTED
     )
     
     # Compare faces (mock implementation)
     primary_photo = user_doc["photos"][0]
-    similarity_score = compare_faces(primary_photo, verification_data.verification_photo)
+    similarity_score = compare_faces(primary_photo, verification_photo)
     verification.similarity_score = similarity_score
     
     # Auto-approve if similarity is high enough
@@ -1383,6 +4182,7 @@ async def submit_photo_verification(
                 "photo_verification_status": VerificationStatus.APPROVED
             }}
         )
+        await refresh_discover_index({"id": current_user_id})
     
     await db.photo_verifications.insert_one(verification.dict())
     
@@ -1392,6 +4192,23 @@ async def submit_photo_verification(
         "message": "Photo verification submitted successfully" if verification.status == VerificationStatus.SUBMITTED else "Photo verification approved!"
     }
 
+@api_router.post("/profile/verify-photo")
+async def submit_photo_verification(
+    verification_data: PhotoVerificationRequest,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Submit a base64 encoded selfie for photo verification"""
+    return await create_photo_verification(current_user_id, verification_data.verification_photo)
+
+@api_router.post("/profile/verify-photo/upload")
+async def upload_photo_verification(
+    file: UploadFile = File(...),
+    current_user_id: str = Depends(get_current_user)
+):
+    """Submit a selfie for photo verification as a multipart file"""
+    selfie_url = await store_private_photo(file, current_user_id, "verification")
+    return await create_photo_verification(current_user_id, selfie_url)
+
 @api_router.get("/profile/verification-status")
 async def get_verification_status(current_user_id: str = Depends(get_current_user)):
     """Get user's photo verification status"""
@@ -1438,6 +4255,14 @@ async def block_user(
         {"$addToSet": {"blocked_by_users": current_user_id}}
     )
     
+    # Neither user should see the other in discover
+    await add_to_discover_exclusion(current_user_id, user_id)
+    await add_to_discover_exclusion(user_id, current_user_id)
+    await remove_from_discover_queue(current_user_id, [user_id])
+    await remove_from_discover_queue(user_id, [current_user_id])
+    await discover_cache.invalidate_user(current_user_id)
+    await discover_cache.invalidate_user(user_id)
+    
     # Remove any existing match between the users
     await db.matches.delete_many({
         "$or": [
@@ -1475,12 +4300,21 @@ async def unblock_user(
         {"$pull": {"blocked_by_users": current_user_id}}
     )
     
+    # They may be discoverable again - Bloom filters can't remove ids, so rebuild
+    await rebuild_discover_exclusion(current_user_id)
+    await rebuild_discover_exclusion(user_id)
+    await invalidate_discover_queue(current_user_id)
+    await invalidate_discover_queue(user_id)
+    
     return {"message": "User unblocked successfully"}
 
 @api_router.get("/users/blocked")
-async def get_blocked_users(current_user_id: str = Depends(get_current_user)):
+async def get_blocked_users(
+    current_user_id: str = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
     """Get list of blocked users"""
-    user_doc = await db.users.find_one({"id": current_user_id})
+    user_doc = await loader.load(current_user_id, ["blocked_users"])
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -1488,37 +4322,37 @@ async def get_blocked_users(current_user_id: str = Depends(get_current_user)):
     
     # Get details of blocked users
     blocked_users = []
-    async for user in db.users.find({"id": {"$in": blocked_user_ids}}):
-        user.pop("password_hash", None)
-        user.pop("_id", None)
+    async for user in db.users.find({"id": {"$in": blocked_user_ids}}, CARD_PROFILE_PROJECTION):
+        user["photos"] = photo_urls_for_size(user.get("photos", []), "thumb")
         blocked_users.append(user)
     
     return {"blocked_users": blocked_users}
 
-@api_router.post("/users/{user_id}/report")
-async def report_user(
+async def create_user_report(
+    current_user_id: str,
     user_id: str,
-    report_data: UserReportRequest,
-    current_user_id: str = Depends(get_current_user)
-):
-    """Report a user for inappropriate behavior"""
-    if user_id == current_user_id:
-        raise HTTPException(status_code=400, detail="Cannot report yourself")
-    
-    # Check if user exists
-    target_user = await db.users.find_one({"id": user_id})
-    if not target_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    category: ReportCategory,
+    description: str,
+    evidence_photos: List[str]
+) -> dict:
+    """Store a report and link it to both users"""
     # Create report
     report = UserReport(
         reporter_id=current_user_id,
         reported_user_id=user_id,
-        category=report_data.category,
-        description=report_data.description,
-        evidence_photos=report_data.evidence_photos
+        category=category,
+        description=description,
+        evidence_photos=evidence_photos
     )
     
+    if category == ReportCategory.FAKE_PROFILE:
+        # Give moderators the photos this account shares with others
+        async for flag in db.moderation_flags.find(
+            {"type": "duplicate_photo", "$or": [{"user_id": user_id}, {"matches.user_id": user_id}]},
+            {"_id": 0, "id": 1}
+        ):
+            report.moderation_flag_ids.append(flag["id"])
+    
     await db.user_reports.insert_one(report.dict())
     
     # Update user records
@@ -1537,6 +4371,44 @@ async def report_user(
         "message": "Report submitted successfully. Our team will review it shortly."
     }
 
+async def check_report_target(current_user_id: str, user_id: str):
+    if user_id == current_user_id:
+        raise HTTPException(status_code=400, detail="Cannot report yourself")
+    
+    # Check if user exists
+    target_user = await db.users.find_one({"id": user_id}, {"_id": 1})
+    if not target_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+@api_router.post("/users/{user_id}/report")
+async def report_user(
+    user_id: str,
+    report_data: UserReportRequest,
+    current_user_id: str = Depends(get_current_user)
+):
+    """Report a user for inappropriate behavior"""
+    await check_report_target(current_user_id, user_id)
+    return await create_user_report(
+        current_user_id, user_id, report_data.category, report_data.description, report_data.evidence_photos
+    )
+
+@api_router.post("/users/{user_id}/report/upload")
+async def report_user_with_evidence(
+    user_id: str,
+    category: ReportCategory = Form(...),
+    description: str = Form(...),
+    evidence: List[UploadFile] = File([]),
+    current_user_id: str = Depends(get_current_user)
+):
+    """Report a user, attaching evidence screenshots as multipart files"""
+    await check_report_target(current_user_id, user_id)
+    if len(evidence) > MAX_EVIDENCE_PHOTOS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_EVIDENCE_PHOTOS} evidence photos allowed")
+    
+    evidence_photos = [await store_private_photo(file, current_user_id, "report_evidence") for file in evidence]
+    
+    return await create_user_report(current_user_id, user_id, category, description, evidence_photos)
+
 @api_router.get("/users/reports")
 async def get_user_reports(current_user_id: str = Depends(get_current_user)):
     """Get reports made by current user"""
@@ -1554,6 +4426,55 @@ async def get_user_reports(current_user_id: str = Depends(get_current_user)):
     
     return {"reports": reports}
 
+# Moderation Endpoints (admins only)
+MODERATION_FLAGS_MAX_PAGE = 200
+
+@api_router.get("/admin/moderation-flags")
+async def get_moderation_flags(
+    status: ReportStatus = ReportStatus.PENDING,
+    limit: int = 50,
+    current_user_id: str = Depends(get_admin_user)
+):
+    """List moderation flags (e.g. duplicate photos across accounts), newest first"""
+    limit = max(1, min(limit, MODERATION_FLAGS_MAX_PAGE))
+    flags = await db.moderation_flags.find(
+        {"status": status.value}, {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    return {"flags": flags}
+
+@api_router.post("/admin/moderation-flags/{flag_id}/resolve")
+async def resolve_moderation_flag(
+    flag_id: str,
+    review: ModerationFlagReview,
+    current_user_id: str = Depends(get_admin_user)
+):
+    """Close a pending moderation flag as resolved or dismissed"""
+    if review.status not in (ReportStatus.RESOLVED, ReportStatus.DISMISSED):
+        raise HTTPException(status_code=400, detail="A flag can only be resolved or dismissed")
+    
+    flag = await db.moderation_flags.find_one_and_update(
+        {"id": flag_id, "status": ReportStatus.PENDING.value},
+        {"$set": {
+            "status": review.status.value,
+            "reviewed_at": datetime.utcnow(),
+            "reviewed_by": current_user_id,
+            "reviewer_notes": review.reviewer_notes
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if flag is None:
+        if await db.moderation_flags.find_one({"id": flag_id}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Flag already reviewed")
+        raise HTTPException(status_code=404, detail="Flag not found")
+    
+    # Only pending flags keep photos alive - let the ones already removed from profiles be collected
+    flagged_photo_ids = {flag["photo_id"], *(match["photo_id"] for match in flag.get("matches", []))}
+    for photo_id in flagged_photo_ids:
+        await release_photo(photo_id)
+    
+    return {"flag": flag}
+
 # Safety Center Endpoints
 @api_router.get("/safety/tips")
 async def get_safety_tips():
@@ -1648,9 +4569,24 @@ async def get_safety_stats():
         "pending_reports": pending_reports
     }
 
+@api_router.get("/metrics")
+async def get_metrics(current_user_id: str = Depends(get_admin_user)):
+    """Get in-process performance counters for sizing caches and pools (admins only)"""
+    return {
+        "discover_cache": discover_cache.stats(),
+        "photo_processing": photo_executor.stats(),
+        "password_hashing": password_executor.stats(),
+        "principal_cache": principal_cache.stats(),
+        "user_loader": user_loader_metrics(),
+        "revocations": revocation_list.stats(),
+        "auth_rate_limits": auth_rate_limiter.stats()
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(UploadSizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1669,8 +4605,20 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     """Initialize data on startup"""
+    await initialize_indexes()
     await initialize_safety_tips()
+    
+    await revocation_list.sync()
+    app.state.revocation_sync_task = asyncio.create_task(maintain_revocation_list())
+    app.state.photo_migration_task = asyncio.create_task(migrate_inline_photos())
+    app.state.private_photo_migration_task = asyncio.create_task(migrate_private_photos())
+    app.state.photo_gc_task = asyncio.create_task(maintain_photo_store())
+    
+    if discover_index is not None:
+        app.state.discover_index_task = asyncio.create_task(maintain_discover_index())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    photo_executor.shutdown()
+    password_executor.shutdown()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Discover scalability benchmark for DateConnect
+
+Seeds a synthetic population (clustered coordinates, gender/preference mix, photo payloads,
+like histories) into a local MongoDB, then drives GET /api/discover through the ASGI app
+in-process and reports, per population size:
+  * p50 / p95 / p99 latency
+  * documents examined per request (from serverStatus query executor counters)
+  * response bytes per request
+
+Three phases are measured for a sample of users:
+  * cold   - first visit, the discover queue is built
+  * reopen - the same screen opened again (served from the discover cache)
+  * next   - the following page after the user acted on the first one
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python discover_benchmark.py --sizes 10000 100000 1000000
+
+The benchmark drops and recreates its own database (default: discover_benchmark).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Metro centres with rough relative weights
+METROS = [
+    ((40.7128, -74.0060), 8),   # New York
+    ((34.0522, -118.2437), 4),  # Los Angeles
+    ((41.8781, -87.6298), 3),   # Chicago
+    ((29.7604, -95.3698), 2),   # Houston
+    ((39.9526, -75.1652), 2),   # Philadelphia
+    ((47.6062, -122.3321), 1),  # Seattle
+]
+
+SEED_BATCH_SIZE = 5000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark /discover across population sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--requests", type=int, default=200, help="users sampled per phase")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=10, help="discover page size")
+    parser.add_argument("--photo-kb", type=int, default=8,
+                        help="size of each synthetic photo; real uploads are ~100-300 KB")
+    parser.add_argument("--max-photos", type=int, default=6)
+    parser.add_argument("--db-name", default="discover_benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+args = parse_args()
+
+# server.py reads its database from the environment at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = args.db_name
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import server  # noqa: E402
+
+def weighted_metro(rng):
+    return rng.choices([centre for centre, _ in METROS], weights=[weight for _, weight in METROS])[0]
+
+async def make_photo(rng, size_kb):
+    """Store a synthetic photo blob and return the reference users keep"""
+    payload = b"\xff\xd8\xff" + rng.randbytes(size_kb * 1024)
+    return server.photo_url(await server.photo_store.put(payload, "image/jpeg"))
+
+def generate_user(rng, photo_pool, max_photos):
+    """A user document shaped like the ones the API writes"""
+    metro_lat, metro_lon = weighted_metro(rng)
+    latitude = max(min(metro_lat + rng.gauss(0, 0.35), 90), -90)
+    longitude = metro_lon + rng.gauss(0, 0.35)
+    gender = rng.choice(["male", "female"])
+    roll = rng.random()
+    if roll < 0.85:
+        preference = "female" if gender == "male" else "male"
+    elif roll < 0.93:
+        preference = gender
+    else:
+        preference = "both"
+    now = datetime.utcnow()
+
+    # A slice of unfinished profiles, as in production
+    photo_count = rng.randint(1, max_photos) if rng.random() < 0.9 else 0
+    answer_count = rng.randint(1, 5) if rng.random() < 0.9 else 0
+
+    return {
+        "id": str(uuid.uuid4()),
+        "email": f"bench-{uuid.uuid4().hex}@example.com",
+        "first_name": "Bench",
+        "age": rng.randint(18, 60),
+        "gender": gender,
+        "gender_preference": preference,
+        "bio": "Synthetic benchmark user",
+        "photos": [rng.choice(photo_pool) for _ in range(photo_count)],
+        "question_answers": [
+            {"question_index": index, "answer": "word " * 25}
+            for index in rng.sample(range(len(server.PROFILE_QUESTIONS)), answer_count)
+        ],
+        "location": "Benchmark City",
+        "latitude": latitude,
+        "longitude": longitude,
+        "geo_location": server.build_geo_point(latitude, longitude),
+        "search_radius": rng.choice([10, 25, 25, 50, 100]),
+        "discover_generation": 0,
+        "likes_given": [],
+        "likes_received": [],
+        "matches": [],
+        "profile_views": [],
+        "is_verified": False,
+        "email_verified": rng.random() < 0.95,
+        "photo_verified": rng.random() < 0.3,
+        "photo_verification_status": "pending",
+        "blocked_users": [],
+        "blocked_by_users": [],
+        "reports_made": [],
+        "reports_received": [],
+        "emergency_contact": None,
+        "safety_preferences": {},
+        "created_at": now - timedelta(days=rng.randint(0, 700)),
+        "verified_at": now,
+        "last_active": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+        "password_hash": "benchmark-not-a-real-hash",
+    }
+
+async def seed_population(size, rng):
+    """Insert `size` users and give them heavy-tailed like histories"""
+    await server.db.users.drop()
+    await server.db.discover_queues.drop()
+    await server.db.discover_cache.drop()
+
+    # Reuse a pool of payloads so generation is not the bottleneck
+    photo_pool = [await make_photo(rng, args.photo_kb) for _ in range(32)]
+
+    user_ids = []
+    started = time.perf_counter()
+    batch = []
+    for _ in range(size):
+        user_doc = generate_user(rng, photo_pool, args.max_photos)
+        user_ids.append(user_doc["id"])
+        batch.append(user_doc)
+        if len(batch) >= SEED_BATCH_SIZE:
+            await server.db.users.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await server.db.users.insert_many(batch, ordered=False)
+
+    # Pareto-distributed like counts: most users like a few dozen, some like thousands
+    for start in range(0, size, SEED_BATCH_SIZE):
+        updates = []
+        for user_id in user_ids[start:start + SEED_BATCH_SIZE]:
+            like_count = min(int(rng.paretovariate(1.2) * 10), 5000, size - 1)
+            updates.append((user_id, rng.sample(user_ids, like_count)))
+        await asyncio.gather(*(
+            server.db.users.update_one({"id": user_id}, {"$set": {"likes_given": likes}})
+            for user_id, likes in updates
+        ))
+
+    await server.initialize_indexes()
+    logger.info(f"Seeded {size:,} users in {time.perf_counter() - started:.1f}s")
+    return user_ids
+
+async def asgi_get(path, query_string, headers):
+    """Issue one GET against the ASGI app; returns (status, body, seconds until the body was sent)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.disconnect"}
+
+    status = None
+    chunks = []
+    elapsed = None
+    started = time.perf_counter()
+
+    async def send(message):
+        nonlocal status, elapsed
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                # Background tasks (queue refills) run after this and are not user-visible latency
+                elapsed = time.perf_counter() - started
+
+    await server.app(scope, receive, send)
+    return status, b"".join(chunks), elapsed
+
+async def query_executor_counters():
+    status = await server.db.command("serverStatus")
+    executor = status.get("metrics", {}).get("queryExecutor", {})
+    return executor.get("scanned", 0), executor.get("scannedObjects", 0)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def run_phase(name, user_ids):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    sizes = []
+    failures = 0
+
+    async def one(user_id):
+        nonlocal failures
+        headers = {"Authorization": f"Bearer {server.create_access_token(user_id)}"}
+        async with semaphore:
+            status, body, elapsed = await asgi_get("/api/discover", f"limit={args.limit}", headers)
+        if status != 200:
+            failures += 1
+            return
+        latencies.append(elapsed * 1000)
+        sizes.append(len(body))
+
+    keys_before, docs_before = await query_executor_counters()
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    keys_after, docs_after = await query_executor_counters()
+
+    requests = max(len(user_ids), 1)
+    return {
+        "phase": name,
+        "p50": percentile(latencies, 0.50) if latencies else 0,
+        "p95": percentile(latencies, 0.95) if latencies else 0,
+        "p99": percentile(latencies, 0.99) if latencies else 0,
+        "keys": (keys_after - keys_before) / requests,
+        "docs": (docs_after - docs_before) / requests,
+        "bytes": sum(sizes) / len(sizes) if sizes else 0,
+        "failures": failures,
+    }
+
+async def benchmark_population(size, rng):
+    await seed_population(size, rng)
+
+    # Only verified users can call the API
+    sample = []
+    async for user_doc in server.db.users.aggregate([
+        {"$match": {"email_verified": True}},
+        {"$sample": {"size": args.requests}},
+        {"$project": {"_id": 0, "id": 1}},
+    ]):
+        sample.append(user_doc["id"])
+
+    results = [
+        await run_phase("cold", sample),
+        await run_phase("reopen", sample),
+    ]
+
+    # Acting on the page (like/pass) moves the user on to the next one
+    for user_id in sample:
+        await server.discover_cache.invalidate_user(user_id)
+    results.append(await run_phase("next", sample))
+
+    print(f"\n{'='*96}")
+    print(f"Population: {size:,} users   sampled: {len(sample)}   page size: {args.limit}   "
+          f"photo: {args.photo_kb} KB")
+    print(f"{'phase':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'keys/req':>12}{'docs/req':>12}{'bytes/req':>14}{'errors':>8}")
+    for result in results:
+        print(f"{result['phase']:<8}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}"
+              f"{result['keys']:>12,.0f}{result['docs']:>12,.0f}{result['bytes']:>14,.0f}{result['failures']:>8}")
+    print(f"{'='*96}")
+
+async def main():
+    rng = random.Random(args.seed)
+    logger.info(f"🚀 Starting discover benchmark against {os.environ['MONGO_URL']}/{args.db_name}")
+    for size in args.sizes:
+        await benchmark_population(size, rng)
+    await server.client.drop_database(args.db_name)
+    server.client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark for nearest-first top-k selection in /discover
+
+Seeds a synthetic population into a local MongoDB (with the indexes the app creates, including
+the 2dsphere index) and runs, for a sample of users, the candidate selection strategies the
+server actually ships:
+  * legacy - the old loop: stop after the first k compatible users the cursor returns, then sort
+  * scan   - server.scan_nearest_candidates: full scan keeping a bounded heap of the k nearest
+  * geo    - server.find_nearest_candidates: $geoNear cursor, stop after k compatible
+
+Every strategy is timed end to end, database round trips and ordering included. For each one it
+reports wall time, index keys and documents examined (serverStatus query executor counters) and
+recall against the true k nearest (the exact scan).
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python discover_topk_benchmark.py --sizes 1000 10000 50000
+
+The benchmark drops and recreates its own database (default: discover_topk_benchmark).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark nearest-first top-k discover strategies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius", type=int, default=25)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--db-name", default="discover_topk_benchmark")
+    return parser.parse_args()
+
+args = parse_args()
+
+# server.py reads its database from the environment at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = args.db_name
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import server  # noqa: E402
+
+# Metro centres the synthetic users are clustered around
+METROS = [
+    (40.7128, -74.0060),   # New York
+    (34.0522, -118.2437),  # Los Angeles
+    (41.8781, -87.6298),   # Chicago
+    (29.7604, -95.3698),   # Houston
+    (39.9526, -75.1652),   # Philadelphia
+]
+
+SEED_BATCH_SIZE = 5000
+
+def generate_user(rng, radius):
+    """A user with the fields discover filters and ranks on, clustered around a metro centre"""
+    metro_lat, metro_lon = rng.choice(METROS)
+    latitude = metro_lat + rng.gauss(0, 0.4)
+    longitude = metro_lon + rng.gauss(0, 0.4)
+    gender = rng.choice(["male", "female"])
+    roll = rng.random()
+    if roll < 0.85:
+        preference = "female" if gender == "male" else "male"
+    elif roll < 0.93:
+        preference = gender
+    else:
+        preference = "both"
+    return {
+        "id": str(uuid.uuid4()),
+        "gender": gender,
+        "gender_preference": preference,
+        "photos": [server.photo_url("0" * 64)],
+        "question_answers": [{"question_index": 0, "answer": "word " * 25}],
+        "email_verified": True,
+        "latitude": latitude,
+        "longitude": longitude,
+        "geo_location": server.build_geo_point(latitude, longitude),
+        "search_radius": radius,
+    }
+
+async def seed_population(size, rng, radius):
+    await server.db.users.drop()
+    population = []
+    batch = []
+    for _ in range(size):
+        user_doc = generate_user(rng, radius)
+        population.append(dict(user_doc))
+        batch.append(user_doc)
+        if len(batch) >= SEED_BATCH_SIZE:
+            await server.db.users.insert_many(batch)
+            batch = []
+    if batch:
+        await server.db.users.insert_many(batch)
+    await server.initialize_indexes()
+    return population
+
+async def legacy_first_k(current_user, candidate_query, k, exclusion):
+    """The pre-top-k discover loop: first k compatible in cursor order, sorted afterwards"""
+    found = []
+    projection = {**server.DISCOVER_RANK_PROJECTION, "latitude": 1, "longitude": 1}
+    async for user_doc in server.db.users.find(candidate_query, projection):
+        if user_doc["id"] in exclusion or not server.can_users_match(current_user, user_doc):
+            continue
+        distance = server.calculate_distance(
+            current_user["latitude"], current_user["longitude"],
+            user_doc["latitude"], user_doc["longitude"]
+        )
+        if distance > current_user["search_radius"]:
+            continue
+        found.append((user_doc, distance))
+        if len(found) >= k:
+            break
+    found.sort(key=lambda pair: pair[1])
+    return found
+
+STRATEGIES = {
+    "legacy": legacy_first_k,
+    "scan": server.scan_nearest_candidates,
+    "geo": server.find_nearest_candidates,
+}
+
+async def query_executor_counters():
+    status = await server.db.command("serverStatus")
+    executor = status.get("metrics", {}).get("queryExecutor", {})
+    return executor.get("scanned", 0), executor.get("scannedObjects", 0)
+
+def recall(result, truth):
+    if not truth:
+        return 1.0
+    truth_ids = {user_doc["id"] for user_doc, _ in truth}
+    return len(truth_ids & {user_doc["id"] for user_doc, _ in result}) / len(truth_ids)
+
+async def run_benchmark(size, k, radius, queries):
+    rng = random.Random(42)
+    population = await seed_population(size, rng, radius)
+    exclusion = server.ExclusionFilter.for_capacity(server.DISCOVER_EXCLUSION_MIN_CAPACITY)
+    results = {strategy: [] for strategy in STRATEGIES}
+
+    for current_user in random.Random(7).sample(population, min(queries, size)):
+        candidate_query = server.build_discover_candidate_query(current_user)
+        truth = await server.scan_nearest_candidates(current_user, candidate_query, k, exclusion)
+
+        for strategy, select in STRATEGIES.items():
+            keys_before, docs_before = await query_executor_counters()
+            start = time.perf_counter()
+            found = await select(current_user, candidate_query, k, exclusion)
+            elapsed = time.perf_counter() - start
+            keys_after, docs_after = await query_executor_counters()
+            results[strategy].append(
+                (elapsed, keys_after - keys_before, docs_after - docs_before, recall(found, truth))
+            )
+
+    print(f"\n{'='*80}")
+    print(f"Population: {size:,}  k={k}  radius={radius} miles  queries={len(results['scan'])}")
+    print(f"{'strategy':<10}{'avg ms':>12}{'keys/query':>14}{'docs/query':>14}{'avg recall':>14}")
+    for strategy, samples in results.items():
+        count = max(len(samples), 1)
+        avg_ms = sum(s[0] for s in samples) / count * 1000
+        avg_keys = sum(s[1] for s in samples) / count
+        avg_docs = sum(s[2] for s in samples) / count
+        avg_recall = sum(s[3] for s in samples) / count
+        print(f"{strategy:<10}{avg_ms:>12.2f}{avg_keys:>14,.0f}{avg_docs:>14,.0f}{avg_recall:>14.2%}")
+    print(f"{'='*80}")
+
+async def main():
+    logger.info(f"🚀 Starting discover top-k benchmark against {os.environ['MONGO_URL']}/{args.db_name}")
+    for population_size in args.sizes:
+        await run_benchmark(population_size, args.k, args.radius, args.queries)
+    await server.client.drop_database(args.db_name)
+    server.client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,11 +5,19 @@ import axios from "axios";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Access tokens live 15 minutes; renew well before they expire
+const TOKEN_REFRESH_INTERVAL_MS = 10 * 60 * 1000;
+
+// Requests whose 401 means bad credentials or an ended session, not an expired access token
+const NO_REFRESH_PATHS = ['/login', '/logout', '/token/refresh'];
+
 // Main App Component
 function App() {
   const [currentUser, setCurrentUser] = useState(null);
   const [currentView, setCurrentView] = useState('auth'); // 'auth', 'email-verification', 'profile-setup', 'main'
   const [token, setToken] = useState(localStorage.getItem('token'));
+  // The refresh in flight, shared by the timer and every request that hits a 401 meanwhile
+  const pendingRefresh = useRef(null);
 
   useEffect(() => {
     if (token) {
@@ -17,6 +25,75 @@ function App() {
     }
   }, [token]);
 
+  useEffect(() => {
+    if (!token) return;
+    const timer = setInterval(refreshSession, TOKEN_REFRESH_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [token]);
+
+  const clearSession = () => {
+    localStorage.removeItem('token');
+    localStorage.removeItem('refresh-token');
+    setToken(null);
+    setCurrentUser(null);
+    setCurrentView('auth');
+  };
+
+  // Returns the new access token, or null (and signs out) if the session is over
+  const refreshAccessToken = async () => {
+    const refreshToken = localStorage.getItem('refresh-token');
+    if (!refreshToken) {
+      clearSession();
+      return null;
+    }
+    try {
+      const response = await axios.post(`${API}/token/refresh`, { refresh_token: refreshToken });
+      localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh-token', response.data.refresh_token);
+      setToken(response.data.access_token);
+      return response.data.access_token;
+    } catch (error) {
+      console.error('Failed to refresh session:', error);
+      if (error.response?.status === 401) {
+        clearSession();
+      }
+      return null;
+    }
+  };
+
+  // Refresh tokens rotate, so concurrent refreshes would make all but the first one fail
+  const refreshSession = () => {
+    if (!pendingRefresh.current) {
+      pendingRefresh.current = refreshAccessToken().finally(() => {
+        pendingRefresh.current = null;
+      });
+    }
+    return pendingRefresh.current;
+  };
+
+  // An access token that expired (or was revoked) mid-session: refresh once and retry the request
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(undefined, async (error) => {
+      const request = error.config;
+      const isApiRequest = request?.url?.startsWith(API);
+      if (
+        error.response?.status !== 401 || !isApiRequest || request._retried ||
+        NO_REFRESH_PATHS.some((path) => request.url === `${API}${path}`)
+      ) {
+        throw error;
+      }
+      
+      const newToken = await refreshSession();
+      if (!newToken) {
+        throw error;
+      }
+      request._retried = true;
+      request.headers.Authorization = `Bearer ${newToken}`;
+      return axios(request);
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const fetchUserProfile = async () => {
     try {
       const response = await axios.get(`${API}/profile/me`, {
@@ -34,19 +111,16 @@ function App() {
         setCurrentView('profile-setup');
       }
     } catch (error) {
+      // A 401 has already been through the refresh-and-retry interceptor
       console.error('Failed to fetch profile:', error);
-      if (error.response?.status === 401) {
-        localStorage.removeItem('token');
-        setToken(null);
-        setCurrentView('auth');
-      }
     }
   };
 
-  const handleLogin = (userData, userToken) => {
+  const handleLogin = (userData, userToken, refreshToken) => {
     setCurrentUser(userData);
     setToken(userToken);
     localStorage.setItem('token', userToken);
+    localStorage.setItem('refresh-token', refreshToken);
   };
 
   const handleRegistration = (registrationData) => {
@@ -63,11 +137,15 @@ function App() {
     setCurrentView('auth');
   };
 
-  const handleLogout = () => {
-    localStorage.removeItem('token');
-    setToken(null);
-    setCurrentUser(null);
-    setCurrentView('auth');
+  const handleLogout = async () => {
+    try {
+      await axios.post(`${API}/logout`, {}, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+    } catch (error) {
+      console.error('Failed to end session:', error);
+    }
+    clearSession();
   };
 
   // Check URL for verification token
@@ -276,7 +354,7 @@ const AuthView = ({ onLogin, onRegistration }) => {
           email: formData.email,
           password: formData.password
         });
-        onLogin(response.data.user, response.data.access_token);
+        onLogin(response.data.user, response.data.access_token, response.data.refresh_token);
       } else {
         // Validate required fields for registration
         if (!formData.email || !formData.password || !formData.first_name || 
@@ -575,28 +653,36 @@ const ProfileSetupView = ({ token, currentUser, onComplete }) => {
   };
 
   const handlePhotoUpload = async (e) => {
-    const file = e.target.files[0];
-    if (!file) return;
+    const files = Array.from(e.target.files);
+    if (files.length === 0) return;
 
-    // Validate file type
-    if (!file.type.startsWith('image/')) {
-      setError('Please select an image file');
+    if (photos.length + files.length > 10) {
+      setError(`You can add ${10 - photos.length} more photo(s)`);
       return;
     }
 
-    // Validate file size (5MB)
-    if (file.size > 5 * 1024 * 1024) {
-      setError('File too large. Please select an image under 5MB');
-      return;
+    for (const file of files) {
+      // Validate file type
+      if (!file.type.startsWith('image/')) {
+        setError('Please select an image file');
+        return;
+      }
+
+      // Validate file size (5MB)
+      if (file.size > 5 * 1024 * 1024) {
+        setError('File too large. Please select an image under 5MB');
+        return;
+      }
     }
 
+    // All selected photos go up in one request
     const formData = new FormData();
-    formData.append('file', file);
+    files.forEach((file) => formData.append('files', file));
 
     try {
       setLoading(true);
       setError('');
-      const response = await axios.post(`${API}/profile/upload-photo`, formData, {
+      const response = await axios.post(`${API}/profile/upload-photos`, formData, {
         headers: {
           Authorization: `Bearer ${token}`,
           'Content-Type': 'multipart/form-data'
@@ -610,7 +696,7 @@ const ProfileSetupView = ({ token, currentUser, onComplete }) => {
       setPhotos(profileResponse.data.photos || []);
       
       // Show success message
-      console.log(`Photo uploaded successfully! Total photos: ${response.data.photo_count}`);
+      console.log(`Photos uploaded successfully! Total photos: ${response.data.photo_count}`);
     } catch (err) {
       console.error('Upload error:', err);
       setError(err.response?.data?.detail || 'Failed to upload photo. Please try again.');
@@ -742,6 +828,7 @@ const ProfileSetupView = ({ token, currentUser, onComplete }) => {
                     <input
                       type="file"
                       accept="image/*"
+                      multiple
                       onChange={handlePhotoUpload}
                       className="hidden"
                       disabled={loading}
@@ -885,6 +972,7 @@ const ProfileSetupView = ({ token, currentUser, onComplete }) => {
                     <input
                       type="file"
                       accept="image/*"
+                      multiple
                       onChange={handlePhotoUpload}
                       className="hidden"
                       disabled={loading}
@@ -1056,7 +1144,7 @@ const MainView = ({ token, currentUser, onLogout }) => {
 
   const fetchMatches = async () => {
     try {
-      const response = await axios.get(`${API}/matches`, {
+      const response = await axios.get(`${API}/matches?view=lite`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       setMatches(response.data.matches);
@@ -1578,7 +1666,7 @@ const ChatView = ({ conversation, currentUser, token, onBack }) => {
 
   const fetchAvailableQuestions = async () => {
     try {
-      const response = await axios.get(`${API}/conversations/${conversation.match_id}/questions`, {
+      const response = await axios.get(`${API}/conversations/${conversation.match_id}/questions?view=lite`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       setAvailableQuestions(response.data.questions_with_answers);
@@ -1974,22 +2062,19 @@ const SafetyCenter = ({ currentUser, token, onUpdate }) => {
     setSuccess('');
 
     try {
-      // Convert image to base64
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64String = reader.result.split(',')[1];
-        
-        const response = await axios.post(`${API}/profile/verify-photo`, {
-          verification_photo: base64String
-        }, {
-          headers: { Authorization: `Bearer ${token}` }
-        });
+      const formData = new FormData();
+      formData.append('file', file);
 
-        setSuccess(response.data.message);
-        fetchVerificationStatus();
-        onUpdate();
-      };
-      reader.readAsDataURL(file);
+      const response = await axios.post(`${API}/profile/verify-photo/upload`, formData, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+          'Content-Type': 'multipart/form-data'
+        }
+      });
+
+      setSuccess(response.data.message);
+      fetchVerificationStatus();
+      onUpdate();
     } catch (err) {
       setError(err.response?.data?.detail || 'Failed to submit verification');
     } finally {
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Photo delivery format benchmark for DateConnect
+
+Encodes every PHOTO_SIZES rendition of each corpus image as JPEG (PHOTO_JPEG_QUALITY) and as
+WebP (PHOTO_WEBP_QUALITY) and reports, per size:
+  * bytes of each format and the share WebP saves
+  * encode CPU milliseconds of each format
+  * PSNR against the uncompressed rendition, to check the two qualities are comparable
+
+Uses the same corpus as photo_transcode_benchmark.py (synthetic unless --corpus is given).
+
+Usage:
+    python photo_format_benchmark.py --corpus ~/Pictures/samples
+"""
+
+import argparse
+import io
+import logging
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from photo_transcode_benchmark import load_corpus, synthetic_corpus
+from server import PHOTO_JPEG_QUALITY, PHOTO_SIZES, PHOTO_WEBP_METHOD, PHOTO_WEBP_QUALITY
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def encode(image, image_format, repeat):
+    """Best-of CPU milliseconds and the encoded bytes"""
+    options = (
+        {"quality": PHOTO_JPEG_QUALITY} if image_format == "JPEG"
+        else {"quality": PHOTO_WEBP_QUALITY, "method": PHOTO_WEBP_METHOD}
+    )
+    best = None
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        started = time.process_time()
+        image.save(buffer, format=image_format, **options)
+        elapsed = (time.process_time() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, buffer.getvalue()
+
+def psnr(reference, encoded):
+    decoded = np.asarray(Image.open(io.BytesIO(encoded)).convert("RGB"), dtype=np.float64)
+    mse = np.mean((np.asarray(reference, dtype=np.float64) - decoded) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JPEG and WebP photo renditions")
+    parser.add_argument("--corpus", help="directory of images (default: synthetic corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    logger.info(f"🚀 Encoding {len(corpus)} images at {len(PHOTO_SIZES)} sizes, best of {args.repeat}")
+
+    totals = {size_name: {"jpeg": [0, 0.0, 0.0], "webp": [0, 0.0, 0.0]} for size_name in PHOTO_SIZES}
+    for _, contents in corpus:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(contents))).convert("RGB")
+        for size_name, max_side in PHOTO_SIZES.items():
+            rendition = image.copy()
+            rendition.thumbnail((max_side, max_side), Image.LANCZOS)
+            for image_format in ("JPEG", "WEBP"):
+                cpu_ms, encoded = encode(rendition, image_format, args.repeat)
+                total = totals[size_name][image_format.lower()]
+                total[0] += len(encoded)
+                total[1] += cpu_ms
+                total[2] += psnr(rendition, encoded)
+
+    count = max(len(corpus), 1)
+    print(f"\n{'='*100}")
+    print(f"JPEG q{PHOTO_JPEG_QUALITY} vs WebP q{PHOTO_WEBP_QUALITY} (method {PHOTO_WEBP_METHOD}), "
+          f"means over {len(corpus)} images")
+    print(f"{'size':<8}{'jpeg KB':>10}{'webp KB':>10}{'saved':>9}{'jpeg ms':>10}{'webp ms':>10}"
+          f"{'jpeg PSNR':>12}{'webp PSNR':>12}")
+    for size_name, total in totals.items():
+        jpeg_bytes, jpeg_ms, jpeg_psnr = total["jpeg"]
+        webp_bytes, webp_ms, webp_psnr = total["webp"]
+        saved = 1 - webp_bytes / jpeg_bytes if jpeg_bytes else 0
+        print(f"{size_name:<8}{jpeg_bytes / count / 1024:>10,.1f}{webp_bytes / count / 1024:>10,.1f}{saved:>9.1%}"
+              f"{jpeg_ms / count:>10.1f}{webp_ms / count:>10.1f}{jpeg_psnr / count:>12.2f}{webp_psnr / count:>12.2f}")
+    print(f"{'='*100}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Photo transcoding micro-benchmark for DateConnect
+
+Runs every image of a corpus through two upload pipelines and reports CPU time per upload
+and output bytes:
+  * legacy - full decode, then thumbnail + JPEG q85 for each rendition
+  * fast   - render_photo_derivatives: header-first, JPEG draft (DCT-scaled) decoding,
+             pass-through of already small JPEGs, metadata stripped in the same pass
+
+Without --corpus a synthetic corpus is generated: camera-sized JPEGs (with EXIF and rotation),
+a screenshot-like PNG and already small JPEGs.
+
+Usage:
+    python photo_transcode_benchmark.py --corpus ~/Pictures/samples --repeat 5
+"""
+
+import argparse
+import io
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from server import PHOTO_JPEG_QUALITY, PHOTO_SIZES, render_photo_derivatives  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+def synthetic_image(width, height, seed):
+    """Smooth gradients plus noise, so JPEG sizes look like photos rather than pure noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        128 + 100 * np.sin(x / (width / 6) + seed),
+        128 + 100 * np.cos(y / (height / 4)),
+        128 + 80 * np.sin((x + y) / (width / 3)),
+    ], axis=-1)
+    noise = rng.normal(0, 12, base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype("uint8"))
+
+def encode(image, image_format, quality=None, orientation=None):
+    buffer = io.BytesIO()
+    options = {}
+    if quality is not None:
+        options["quality"] = quality
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010F] = "Benchmark Camera"
+        options["exif"] = exif.tobytes()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+def synthetic_corpus():
+    return [
+        ("camera-12mp-q92", encode(synthetic_image(4032, 3024, 1), "JPEG", 92, orientation=1)),
+        ("camera-12mp-rotated", encode(synthetic_image(4032, 3024, 2), "JPEG", 92, orientation=6)),
+        ("phone-8mp-q85", encode(synthetic_image(3264, 2448, 3), "JPEG", 85, orientation=1)),
+        ("hd-1080p-q90", encode(synthetic_image(1920, 1080, 4), "JPEG", 90)),
+        ("screenshot-png", encode(synthetic_image(1170, 2532, 5), "PNG")),
+        ("small-1080-q80", encode(synthetic_image(1080, 1080, 6), "JPEG", 80)),
+        ("small-400-q75", encode(synthetic_image(400, 300, 7), "JPEG", 75)),
+    ]
+
+def load_corpus(directory):
+    return [
+        (path.name, path.read_bytes())
+        for path in sorted(Path(directory).expanduser().iterdir())
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    ]
+
+def legacy_render(contents):
+    """The upload pipeline before draft decoding and pass-through"""
+    image = Image.open(io.BytesIO(contents))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    derivatives = {}
+    rendition = image
+    for size_name, max_side in sorted(PHOTO_SIZES.items(), key=lambda item: -item[1]):
+        rendition = rendition.copy()
+        rendition.thumbnail((max_side, max_side), Image.LANCZOS)
+        output_buffer = io.BytesIO()
+        rendition.save(output_buffer, format='JPEG', quality=PHOTO_JPEG_QUALITY)
+        derivatives[size_name] = output_buffer.getvalue()
+    return {"derivatives": derivatives}
+
+def measure(render, contents, repeat):
+    """Best-of CPU milliseconds and the output of the last run"""
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        rendered = render(contents)
+        elapsed = (time.process_time() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rendered
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU per photo upload")
+    parser.add_argument("--corpus", help="directory of images (default: synthetic corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    logger.info(f"🚀 Transcoding {len(corpus)} images, best of {args.repeat}")
+
+    print(f"\n{'='*100}")
+    print(f"{'image':<24}{'input KB':>10}{'legacy ms':>12}{'fast ms':>10}{'speedup':>9}"
+          f"{'legacy KB':>12}{'fast KB':>10}{'exif left':>11}")
+    totals = {"legacy": 0.0, "fast": 0.0}
+    for name, contents in corpus:
+        legacy_ms, legacy = measure(legacy_render, contents, args.repeat)
+        fast_ms, fast = measure(render_photo_derivatives, contents, args.repeat)
+        totals["legacy"] += legacy_ms
+        totals["fast"] += fast_ms
+        legacy_kb = sum(len(data) for data in legacy["derivatives"].values()) / 1024
+        fast_kb = sum(len(data) for data in fast["derivatives"].values()) / 1024
+        exif_left = any(
+            len(Image.open(io.BytesIO(data)).getexif()) for data in fast["derivatives"].values()
+        )
+        print(f"{name[:23]:<24}{len(contents) / 1024:>10,.0f}{legacy_ms:>12.1f}{fast_ms:>10.1f}"
+              f"{legacy_ms / max(fast_ms, 0.001):>8.1f}x{legacy_kb:>12,.0f}{fast_kb:>10,.0f}{str(exif_left):>11}")
+
+    count = max(len(corpus), 1)
+    print(f"{'-'*100}")
+    print(f"{'mean per upload':<34}{totals['legacy'] / count:>12.1f}{totals['fast'] / count:>10.1f}"
+          f"{totals['legacy'] / max(totals['fast'], 0.001):>8.1f}x")
+    print(f"{'='*100}")
+
+if __name__ == "__main__":
+    main()
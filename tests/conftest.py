@@ -0,0 +1,136 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py reads its database settings at import time; the client only connects on first use
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+# Projection operators mongomock evaluates itself; anything else (e.g. $size) is computed through $project
+NATIVE_PROJECTION_OPERATORS = {"$slice", "$elemMatch"}
+
+class FakeCursor:
+    """The slice of Motor's cursor API the server uses, over a mongomock cursor or a list"""
+
+    def __init__(self, documents, finish=lambda document: document):
+        self.documents = documents
+        self.finish = finish
+
+    def sort(self, *args, **kwargs):
+        self.documents = self.documents.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents.limit(count)
+        return self
+
+    def skip(self, count):
+        self.documents = self.documents.skip(count)
+        return self
+
+    def __aiter__(self):
+        self.iterator = iter(self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return self.finish(next(self.iterator))
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        documents = [self.finish(document) for document in self.documents]
+        return documents[:length] if length else documents
+
+class FakeCollection:
+    """Motor-style awaitable collection over mongomock"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def _split_projection(self, projection):
+        """(projection mongomock can apply, computed fields, whether _id must be dropped afterwards)"""
+        if not projection:
+            return projection, {}, False
+        computed = {
+            field: value for field, value in projection.items()
+            if isinstance(value, dict) and not value.keys() <= NATIVE_PROJECTION_OPERATORS
+        }
+        if not computed:
+            return projection, {}, False
+        native = {field: value for field, value in projection.items() if field not in computed}
+        drop_id = native.get("_id", 1) == 0
+        native["_id"] = 1
+        return native, computed, drop_id
+
+    def _finisher(self, computed, drop_id):
+        def finish(document):
+            if document is None or not computed:
+                return document
+            values = next(self.collection.aggregate([
+                {"$match": {"_id": document["_id"]}},
+                {"$project": {"_id": 0, **computed}}
+            ]))
+            document.update(values)
+            if drop_id:
+                document.pop("_id")
+            return document
+        return finish
+
+    def find(self, query=None, projection=None, **kwargs):
+        native, computed, drop_id = self._split_projection(projection)
+        return FakeCursor(self.collection.find(query or {}, native, **kwargs), self._finisher(computed, drop_id))
+
+    def aggregate(self, pipeline, **kwargs):
+        return FakeCursor(list(self.collection.aggregate(pipeline)))
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        native, computed, drop_id = self._split_projection(projection)
+        return self._finisher(computed, drop_id)(self.collection.find_one(query or {}, native, **kwargs))
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False, **kwargs):
+        native, computed, drop_id = self._split_projection(projection)
+        if not return_document:
+            document = self.collection.find_one_and_update(query, update, projection=native, **kwargs)
+            return self._finisher(computed, drop_id)(document)
+        # mongomock re-runs the filter after updating, missing documents the update moved out of it;
+        # Mongo returns the updated document itself
+        before = self.collection.find_one_and_update(query, update, projection={"_id": 1}, **kwargs)
+        if before is None:
+            document = self.collection.find_one(query, native) if kwargs.get("upsert") else None
+        else:
+            document = self.collection.find_one({"_id": before["_id"]}, native)
+        return self._finisher(computed, drop_id)(document)
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class FakeDatabase:
+    def __init__(self):
+        import mongomock
+        self.database = mongomock.MongoClient().db
+
+    def __getattr__(self, name):
+        return FakeCollection(self.database[name])
+
+    def __getitem__(self, name):
+        return FakeCollection(self.database[name])
+
+    async def command(self, *args, **kwargs):
+        return {}
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """server.db backed by mongomock; tests seed and inspect it through fake_db.database"""
+    pytest.importorskip("mongomock")
+    import server
+    database = FakeDatabase()
+    monkeypatch.setattr(server, "db", database)
+    return database
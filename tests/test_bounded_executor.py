@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import BoundedExecutor, ExecutorBroken, ExecutorSaturated
+
+def thread_executor(max_pending, workers=1):
+    return BoundedExecutor("test", lambda: ThreadPoolExecutor(max_workers=workers), max_pending)
+
+def fail_on_odd(value):
+    if value % 2:
+        raise ValueError(f"odd: {value}")
+    return value
+
+def die(_):
+    # What an OOM kill or a codec segfault looks like to the pool
+    os._exit(1)
+
+def test_saturated_executor_turns_work_away():
+    executor = thread_executor(max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(abs, -1)
+        release.set()
+        await blocked
+        return await executor.run(abs, -2)
+
+    assert asyncio.run(scenario()) == 2
+    assert executor.stats()["rejected"] == 1
+    assert executor.pending == 0
+    executor.shutdown()
+
+def test_failing_jobs_release_their_slots():
+    executor = thread_executor(max_pending=2)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await executor.run(fail_on_odd, 1)
+        with pytest.raises(ValueError, match="odd: 3"):
+            await executor.map(fail_on_odd, [2, 3, 4, 6], slots=2)
+        return await executor.map(fail_on_odd, [2, 4], slots=2)
+
+    assert asyncio.run(scenario()) == [2, 4]
+    assert executor.pending == 0
+    assert executor.stats()["failed"] == 2
+    executor.shutdown()
+
+def test_map_admits_a_batch_as_a_whole():
+    executor = thread_executor(max_pending=3, workers=4)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def track(value):
+        with lock:
+            running.append(value)
+            peak.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.remove(value)
+        return value * 10
+
+    async def scenario():
+        results = await executor.map(track, list(range(8)), slots=2)
+        executor.pending = 2  # another request holding two slots
+        with pytest.raises(ExecutorSaturated):
+            await executor.map(track, [1, 2], slots=2)
+        executor.pending = 0
+        return results
+
+    assert asyncio.run(scenario()) == [value * 10 for value in range(8)]
+    assert max(peak) <= 2
+    assert executor.stats()["peak_pending"] == 2
+    executor.shutdown()
+
+def test_busy_photo_pool_returns_503(monkeypatch):
+    executor = thread_executor(max_pending=1)
+    executor.pending = 1
+    monkeypatch.setattr(server, "photo_executor", executor)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.run_photo_batch(abs, [b"a", b"b"]))
+    assert raised.value.status_code == 503
+    assert raised.value.headers == {"Retry-After": "5"}
+
+def test_broken_process_pool_is_replaced():
+    executor = BoundedExecutor(
+        "test",
+        lambda: ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("forkserver")),
+        max_pending=2
+    )
+
+    async def scenario():
+        assert await executor.run(abs, -1) == 1
+        first_pool = executor.executor
+        with pytest.raises(ExecutorBroken):
+            await executor.run(die, None)
+        assert executor.executor is None
+        assert await executor.run(abs, -3) == 3
+        return first_pool
+
+    first_pool = asyncio.run(scenario())
+    assert executor.executor is not first_pool
+    assert executor.stats()["restarts"] == 1
+    assert executor.pending == 0
+    executor.shutdown()
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import DiscoverCache, InMemoryDiscoverCache, MongoDiscoverCache
+
+def page(*user_ids):
+    return [{"id": user_id, "first_name": user_id.upper()} for user_id in user_ids]
+
+@pytest.fixture(params=["memory", "mongo"])
+def cache(request):
+    if request.param == "mongo":
+        request.getfixturevalue("fake_db")
+        return MongoDiscoverCache()
+    return InMemoryDiscoverCache()
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_hit_is_keyed_by_generation_and_limit(cache):
+    run(cache.set("viewer", 3, 20, page("a", "b")))
+    assert run(cache.get("viewer", 3, 20)) == page("a", "b")
+    # A bumped discover_generation or another page size never sees the old page
+    assert run(cache.get("viewer", 4, 20)) is None
+    assert run(cache.get("viewer", 3, 10)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_set_replaces_the_page_under_the_same_key(cache):
+    run(cache.set("viewer", 1, 20, page("a")))
+    run(cache.set("viewer", 1, 20, page("b")))
+    assert run(cache.get("viewer", 1, 20)) == page("b")
+    # "a" is no longer on the page, so invalidating it keeps the entry
+    run(cache.invalidate_candidate("a"))
+    assert run(cache.get("viewer", 1, 20)) == page("b")
+
+def test_invalidate_candidate_evicts_every_page_showing_them(cache):
+    run(cache.set("ann", 1, 20, page("x", "y")))
+    run(cache.set("bob", 7, 20, page("y", "z")))
+    run(cache.set("bob", 7, 10, page("y")))
+    run(cache.set("cat", 2, 20, page("z")))
+
+    run(cache.invalidate_candidate("y"))
+    assert run(cache.get("ann", 1, 20)) is None
+    assert run(cache.get("bob", 7, 20)) is None
+    assert run(cache.get("bob", 7, 10)) is None
+    assert run(cache.get("cat", 2, 20)) == page("z")
+
+def test_invalidate_user_drops_only_their_pages(cache):
+    run(cache.set("ann", 1, 20, page("bob")))
+    run(cache.set("ann", 2, 10, page("cat")))
+    run(cache.set("bob", 1, 20, page("ann")))
+
+    run(cache.invalidate_user("ann"))
+    assert run(cache.get("ann", 1, 20)) is None
+    assert run(cache.get("ann", 2, 10)) is None
+    assert run(cache.get("bob", 1, 20)) == page("ann")
+    assert cache.stats()["invalidations"] == 1
+
+def test_mongo_entries_expire_before_the_ttl_monitor_runs(fake_db):
+    cache = MongoDiscoverCache(ttl_seconds=-1)
+    run(cache.set("viewer", 1, 20, page("a")))
+    assert fake_db.database.discover_cache.count_documents({}) == 1
+    assert run(cache.get("viewer", 1, 20)) is None
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_memory_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    cache = InMemoryDiscoverCache(ttl_seconds=60)
+    run(cache.set("viewer", 1, 20, page("a")))
+    clock.now += 59
+    assert run(cache.get("viewer", 1, 20)) == page("a")
+    clock.now += 2
+    assert run(cache.get("viewer", 1, 20)) is None
+    # Expiry unlinks the reverse indexes too
+    assert cache.keys_by_user == {} and cache.keys_by_candidate == {}
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = InMemoryDiscoverCache(max_entries=2)
+    run(cache.set("ann", 1, 20, page("x")))
+    run(cache.set("bob", 1, 20, page("y")))
+    run(cache.get("ann", 1, 20))
+    run(cache.set("cat", 1, 20, page("z")))
+
+    assert run(cache.get("bob", 1, 20)) is None
+    assert run(cache.get("ann", 1, 20)) == page("x")
+    assert run(cache.get("cat", 1, 20)) == page("z")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+    assert "bob" not in cache.keys_by_user and "y" not in cache.keys_by_candidate
+
+def test_discover_cache_is_abstract():
+    with pytest.raises(TypeError):
+        DiscoverCache()
+
+def test_profile_edit_evicts_every_page_showing_the_user(fake_db, monkeypatch):
+    cache = InMemoryDiscoverCache()
+    monkeypatch.setattr(server, "discover_cache", cache)
+    monkeypatch.setattr(server, "discover_index", None)
+    monkeypatch.setattr(server, "principal_cache", server.PrincipalCache())
+    fake_db.database.users.insert_one({"id": "bob", "email_verified": True, "discover_generation": 0})
+    run(cache.set("ann", 1, 20, page("bob", "cat")))
+    run(cache.set("dan", 4, 20, page("bob")))
+    run(cache.set("bob", 0, 20, page("cat")))
+    run(cache.set("eve", 2, 20, page("cat")))
+
+    token = server.create_access_token("bob", email_verified=True)
+    response = TestClient(server.app).put(
+        "/api/profile", json={"bio": "new bio"}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert run(cache.get("ann", 1, 20)) is None
+    assert run(cache.get("dan", 4, 20)) is None
+    # A bio edit leaves bob's own page and pages without him alone
+    assert run(cache.get("bob", 0, 20)) == page("cat")
+    assert run(cache.get("eve", 2, 20)) == page("cat")
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import DISCOVER_QUEUE_SIZE
+
+POPULATION = DISCOVER_QUEUE_SIZE * 2 + 50
+PAGE_SIZE = 50
+
+def candidate(index):
+    return {
+        "id": f"candidate-{index:04d}",
+        "gender": "female",
+        "gender_preference": "male",
+        "email_verified": True,
+        "photos": [server.photo_url(f"{index:064x}")],
+        "question_answers": [{"question_index": 0, "answer": "yes"}],
+    }
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "discover_cache", server.InMemoryDiscoverCache())
+    monkeypatch.setattr(server, "discover_index", None)
+    fake_db.database.users.insert_many([candidate(index) for index in range(POPULATION)])
+    fake_db.database.users.insert_one({
+        "id": "viewer", "gender": "male", "gender_preference": "female", "email_verified": True
+    })
+    return TestClient(server.app)
+
+def next_page(client):
+    # Stands in for the cached page expiring; the viewer neither likes nor passes anyone
+    asyncio.run(server.discover_cache.invalidate_user("viewer"))
+    token = server.create_access_token("viewer", email_verified=True)
+    response = client.get(
+        "/api/discover", params={"limit": PAGE_SIZE}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    return [user["id"] for user in response.json()["users"]]
+
+def test_paging_past_one_queue_reaches_everyone_once(client):
+    seen = []
+    for _ in range(POPULATION // PAGE_SIZE):
+        seen.extend(next_page(client))
+    assert len(seen) == POPULATION
+    assert len(set(seen)) == POPULATION
+
+def test_a_new_round_starts_once_everyone_was_served(client):
+    for _ in range(POPULATION // PAGE_SIZE):
+        next_page(client)
+    assert len(next_page(client)) == PAGE_SIZE
+
+def test_a_new_generation_forgets_what_was_served(client, fake_db):
+    first = next_page(client)
+    fake_db.database.users.update_one({"id": "viewer"}, {"$inc": {"discover_generation": 1}})
+    assert next_page(client) == first
@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+import pytest
+
+from server import EQUIRECTANGULAR_MAX_RADIUS_MILES, batch_distances, calculate_distance
+
+NEW_YORK = (40.7128, -74.0060)
+PHILADELPHIA = (39.9526, -75.1652)
+
+def reference_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * math.asin(math.sqrt(a)) * 3956
+
+def test_calculate_distance_matches_haversine():
+    distance = calculate_distance(*NEW_YORK, *PHILADELPHIA)
+    assert math.isclose(distance, reference_haversine(*NEW_YORK, *PHILADELPHIA), rel_tol=1e-9)
+    assert 75 < distance < 85
+
+def test_distances_inside_radius_are_exact():
+    rng = np.random.default_rng(3)
+    latitudes = NEW_YORK[0] + rng.normal(0, 0.5, 2000)
+    longitudes = NEW_YORK[1] + rng.normal(0, 0.5, 2000)
+
+    distances, within_radius = batch_distances(*NEW_YORK, latitudes, longitudes, radius=25)
+
+    exact = np.array([reference_haversine(*NEW_YORK, lat, lon) for lat, lon in zip(latitudes, longitudes)])
+    assert np.array_equal(within_radius, exact <= 25)
+    assert np.allclose(distances[within_radius], exact[within_radius], rtol=1e-9)
+
+def test_screen_works_across_the_antimeridian():
+    distances, within_radius = batch_distances(0.0, 179.9, [0.0, 0.0], [-179.9, 0.0], radius=50)
+    assert within_radius.tolist() == [True, False]
+    assert math.isclose(distances[0], reference_haversine(0.0, 179.9, 0.0, -179.9), rel_tol=1e-9)
+
+def test_large_radius_skips_the_screen():
+    radius = EQUIRECTANGULAR_MAX_RADIUS_MILES * 4
+    distances, within_radius = batch_distances(*NEW_YORK, [PHILADELPHIA[0]], [PHILADELPHIA[1]], radius=radius)
+    assert within_radius.tolist() == [True]
+    assert math.isclose(distances[0], reference_haversine(*NEW_YORK, *PHILADELPHIA), rel_tol=1e-9)
+
+def test_no_radius_keeps_everything():
+    _, within_radius = batch_distances(*NEW_YORK, [-33.87, 51.5], [151.21, -0.13])
+    assert within_radius.tolist() == [True, True]
+
+@pytest.mark.parametrize("origin_lat, radius", [
+    (88.0, 100), (88.0, 150), (89.5, 25), (85.0, 150), (-88.0, 100), (79.0, 150), (80.0, 5),
+])
+def test_nothing_inside_the_radius_is_dropped_near_the_poles(origin_lat, radius):
+    rng = np.random.default_rng(11)
+    spread = math.degrees(radius / 3956) * 1.2
+    latitudes = np.clip(origin_lat + rng.uniform(-spread, spread, 20000), -90, 90)
+    longitudes = rng.uniform(-180, 180, 20000)
+
+    distances, within_radius = batch_distances(origin_lat, 10.0, latitudes, longitudes, radius=radius)
+
+    exact = np.array([reference_haversine(origin_lat, 10.0, lat, lon) for lat, lon in zip(latitudes, longitudes)])
+    assert (exact <= radius).sum() > 0
+    assert np.array_equal(within_radius, exact <= radius)
+    assert np.allclose(distances[within_radius], exact[within_radius], rtol=1e-9)
@@ -0,0 +1,42 @@
+from server import DISCOVER_EXCLUSION_ERROR_RATE, ExclusionFilter
+
+def filled_filter(capacity, count):
+    exclusion = ExclusionFilter.for_capacity(capacity)
+    for index in range(count):
+        exclusion.add(f"excluded-{index}")
+    return exclusion
+
+def test_added_ids_are_always_excluded():
+    exclusion = filled_filter(1024, 1024)
+    assert all(f"excluded-{index}" in exclusion for index in range(1024))
+    assert exclusion.count == 1024
+
+def test_false_positive_rate_stays_within_bound_at_capacity():
+    exclusion = filled_filter(1024, 1024)
+    probes = 50_000
+    false_positives = sum(f"candidate-{index}" in exclusion for index in range(probes))
+    # Twice the design rate leaves room for sampling noise without hiding a broken filter
+    assert false_positives / probes <= 2 * DISCOVER_EXCLUSION_ERROR_RATE
+
+def test_empty_filter_excludes_nobody():
+    exclusion = ExclusionFilter.for_capacity(1024)
+    assert not any(f"candidate-{index}" in exclusion for index in range(1000))
+
+def test_document_round_trip_keeps_membership():
+    exclusion = filled_filter(2048, 300)
+    restored = ExclusionFilter.from_document(exclusion.to_document())
+    assert restored.words == exclusion.words
+    assert (restored.num_bits, restored.num_hashes, restored.capacity, restored.count) == (
+        exclusion.num_bits, exclusion.num_hashes, exclusion.capacity, exclusion.count
+    )
+    assert all(f"excluded-{index}" in restored for index in range(300))
+
+def test_words_fit_signed_64_bit_bson_integers():
+    exclusion = filled_filter(1024, 1024)
+    assert all(0 <= word < 2 ** ExclusionFilter.WORD_BITS for word in exclusion.words)
+
+def test_bit_positions_are_stable_and_in_range():
+    first = ExclusionFilter.bit_positions("user-1", 9856, 10)
+    assert first == ExclusionFilter.bit_positions("user-1", 9856, 10)
+    assert len(first) == 10
+    assert all(0 <= position < 9856 for position in first)
@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import photo_url
+
+PHOTOS = [photo_url(f"{index:064x}") for index in range(3)]
+ANSWERS = [{"question_index": 0, "answer": "an answer"}]
+NEARBY = {"latitude": 40.0, "longitude": -74.0}
+FAR_AWAY = {"latitude": 34.0, "longitude": -118.0}
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "principal_cache", server.PrincipalCache())
+    return TestClient(server.app)
+
+def add_user(fake_db, user_id, gender="female", preference="male", **fields):
+    fake_db.database.users.insert_one({
+        "id": user_id, "email_verified": True, "first_name": user_id.title(), "age": 30,
+        "gender": gender, "gender_preference": preference, "photos": PHOTOS,
+        "question_answers": ANSWERS, "search_radius": 25, "blocked_users": [], "blocked_by_users": [],
+        **NEARBY, **fields
+    })
+
+def bearer(user_id):
+    return {"Authorization": f"Bearer {server.create_access_token(user_id, email_verified=True)}"}
+
+def gallery(client, viewer, owner):
+    return client.get(f"/api/users/{owner}/photos", headers=bearer(viewer))
+
+def test_owner_sees_their_own_gallery(client, fake_db):
+    add_user(fake_db, "ann", **FAR_AWAY)
+    response = gallery(client, "ann", "ann")
+    assert response.status_code == 200
+    assert response.json()["photo_count"] == 3
+
+def test_someone_discover_could_show_sees_the_gallery(client, fake_db):
+    add_user(fake_db, "ann")
+    add_user(fake_db, "bob", gender="male", preference="female")
+    assert gallery(client, "bob", "ann").status_code == 200
+
+def test_incompatible_or_out_of_range_users_do_not(client, fake_db):
+    add_user(fake_db, "ann")
+    add_user(fake_db, "cat", gender="female", preference="female")
+    add_user(fake_db, "dan", gender="male", preference="female", **FAR_AWAY)
+    assert gallery(client, "cat", "ann").status_code == 404
+    assert gallery(client, "dan", "ann").status_code == 404
+
+def test_matches_see_each_other_at_any_distance(client, fake_db):
+    add_user(fake_db, "ann", matches=["dan"])
+    add_user(fake_db, "dan", gender="male", preference="female", matches=["ann"], **FAR_AWAY)
+    assert gallery(client, "dan", "ann").status_code == 200
+    assert gallery(client, "ann", "dan").status_code == 200
+
+def test_a_like_alone_does_not_open_a_distant_gallery(client, fake_db):
+    add_user(fake_db, "ann", likes_received=["dan"])
+    add_user(fake_db, "dan", gender="male", preference="female", likes_given=["ann"], **FAR_AWAY)
+    assert gallery(client, "dan", "ann").status_code == 404
+    # Once they are back in range the like doesn't hide it either
+    fake_db.database.users.update_one({"id": "dan"}, {"$set": NEARBY})
+    assert gallery(client, "dan", "ann").status_code == 200
+
+@pytest.mark.parametrize("blocked", [
+    {"blocked_users": ["bob"]},
+    {"blocked_by_users": ["bob"]},
+])
+def test_blocking_hides_the_gallery_even_from_a_match(client, fake_db, blocked):
+    add_user(fake_db, "ann", matches=["bob"], **blocked)
+    add_user(fake_db, "bob", gender="male", preference="female", matches=["ann"])
+    response = gallery(client, "bob", "ann")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
+
+def test_lite_matches_carry_the_primary_photo_and_a_count(client, fake_db):
+    add_user(fake_db, "ann", matches=["bob"])
+    add_user(fake_db, "bob", gender="male", preference="female", matches=["ann"], password_hash="secret")
+
+    full = client.get("/api/matches", headers=bearer("ann")).json()["matches"][0]
+    lite = client.get("/api/matches?view=lite", headers=bearer("ann")).json()["matches"][0]
+    assert len(full["photos"]) == 3 and "photo_count" not in full
+    assert lite["photos"] == full["photos"][:1]
+    assert lite["photo_count"] == 3
+    assert {key: value for key, value in lite.items() if key not in ("photos", "photo_count")} == {
+        key: value for key, value in full.items() if key != "photos"
+    }
+    assert set(lite) - {"photo_count"} <= set(server.PUBLIC_PROFILE_FIELDS)
+
+def test_lite_conversation_questions_keep_the_answers(client, fake_db):
+    add_user(fake_db, "ann")
+    add_user(fake_db, "bob", gender="male", preference="female", bio="private to the profile")
+    fake_db.database.matches.insert_one({"id": "m1", "user1_id": "ann", "user2_id": "bob"})
+    url = "/api/conversations/m1/questions"
+
+    full = client.get(url, headers=bearer("ann")).json()
+    lite = client.get(url + "?view=lite", headers=bearer("ann")).json()
+    assert set(full["other_user"]) == {"id", "first_name", "age", "photos"}
+    assert set(lite["other_user"]) == {"id", "first_name", "age", "photos", "photo_count"}
+    assert len(full["other_user"]["photos"]) == 3
+    assert lite["other_user"]["photos"] == full["other_user"]["photos"][:1]
+    assert lite["other_user"]["photo_count"] == 3
+    assert lite["questions_with_answers"] == full["questions_with_answers"]
+    assert lite["questions_with_answers"][0]["answer"] == "an answer"
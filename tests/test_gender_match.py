@@ -0,0 +1,32 @@
+import itertools
+
+import pytest
+
+from server import build_gender_match_query, can_users_match
+
+MISSING = object()
+GENDERS = ["male", "female", MISSING]
+PREFERENCES = ["male", "female", "both", MISSING]
+
+def profile(gender, preference):
+    user = {"id": f"{'-' if gender is MISSING else gender}/{'-' if preference is MISSING else preference}"}
+    if gender is not MISSING:
+        user["gender"] = gender
+    if preference is not MISSING:
+        user["gender_preference"] = preference
+    return user
+
+PROFILES = [profile(gender, preference) for gender, preference in itertools.product(GENDERS, PREFERENCES)]
+
+@pytest.fixture(scope="module")
+def users():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.users
+    collection.insert_many([dict(user) for user in PROFILES])
+    return collection
+
+@pytest.mark.parametrize("viewer", PROFILES, ids=[user["id"] for user in PROFILES])
+def test_query_selects_exactly_the_users_can_users_match_accepts(users, viewer):
+    selected = {user["id"] for user in users.find(build_gender_match_query(viewer), {"_id": 0, "id": 1})}
+    expected = {user["id"] for user in PROFILES if can_users_match(viewer, user)}
+    assert selected == expected
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+from server import (
+    EARTH_RADIUS_MILES, calculate_distance, encode_geohash, geohash_cell_size, geohash_cells_covering
+)
+
+def destination(latitude, longitude, bearing, miles):
+    """Point `miles` away from (latitude, longitude) along an initial bearing in degrees"""
+    lat1, lon1, theta = map(math.radians, (latitude, longitude, bearing))
+    delta = miles / EARTH_RADIUS_MILES
+    lat2 = math.asin(math.sin(lat1) * math.cos(delta) + math.cos(lat1) * math.sin(delta) * math.cos(theta))
+    lon2 = lon1 + math.atan2(
+        math.sin(theta) * math.sin(delta) * math.cos(lat1),
+        math.cos(delta) - math.sin(lat1) * math.sin(lat2)
+    )
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180
+
+def test_encode_geohash_matches_reference_values():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode_geohash(40.7128, -74.0060, 5) == "dr5re"
+    assert encode_geohash(-90.0, -180.0, 4) == "0000"
+
+def test_cell_size_halves_alternately():
+    assert geohash_cell_size(1) == (45.0, 45.0)
+    assert geohash_cell_size(4) == (180.0 / 2 ** 10, 360.0 / 2 ** 10)
+
+@pytest.mark.parametrize("latitude, longitude, radius", [
+    (40.7128, -74.0060, 25),    # New York
+    (0.0, 0.0, 10),             # on cell edges in both axes
+    (0.0, 179.95, 50),          # across the antimeridian
+    (-33.8688, -179.99, 100),   # antimeridian, southern hemisphere
+    (89.9, 12.0, 40),           # box reaches the north pole
+    (-89.5, -45.0, 80),         # and the south pole
+    (64.1466, -21.9426, 150),   # high latitude, wide radius
+])
+def test_cells_cover_every_point_within_radius(latitude, longitude, radius):
+    precision = 4
+    cells = set(geohash_cells_covering(latitude, longitude, radius, precision))
+    rng = random.Random(f"{latitude},{longitude}")
+    points = [destination(latitude, longitude, bearing, radius) for bearing in range(0, 360, 5)]
+    points += [
+        destination(latitude, longitude, rng.uniform(0, 360), radius * math.sqrt(rng.random()))
+        for _ in range(500)
+    ]
+    for point_lat, point_lon in points:
+        assert calculate_distance(latitude, longitude, point_lat, point_lon) <= radius * (1 + 1e-9)
+        assert encode_geohash(point_lat, point_lon, precision) in cells
+
+def test_covering_has_no_duplicate_cells():
+    cells = geohash_cells_covering(0.0, 179.95, 50, 4)
+    assert len(cells) == len(set(cells))
+
+def test_polar_box_spans_every_longitude():
+    precision = 2
+    cells = set(geohash_cells_covering(89.99, 0.0, 5, precision))
+    assert {encode_geohash(89.99, longitude, precision) for longitude in range(-180, 180, 5)} <= cells
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import photo_url
+
+KEPT = "a" * 64
+REMOVED = "b" * 64
+OTHER = "c" * 64
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "principal_cache", server.PrincipalCache())
+    users = fake_db.database.users
+    users.insert_one({"id": "admin", "email_verified": True, "is_admin": True})
+    users.insert_one({"id": "ann", "email_verified": True, "photos": [photo_url(KEPT)]})
+    users.insert_one({"id": "bob", "email_verified": True, "photos": []})
+    now = datetime.utcnow()
+    fake_db.database.moderation_flags.insert_many([
+        {
+            "id": "older", "type": "duplicate_photo", "user_id": "ann", "photo_id": KEPT, "status": "pending",
+            "matches": [{"photo_id": OTHER, "user_id": "cat", "distance": 2}], "created_at": now - timedelta(hours=1)
+        },
+        {
+            # bob already deleted the flagged photo; the pending flag is all that keeps it
+            "id": "newer", "type": "duplicate_photo", "user_id": "bob", "photo_id": REMOVED, "status": "pending",
+            "matches": [{"photo_id": KEPT, "user_id": "ann", "distance": 0}], "created_at": now
+        },
+    ])
+    return TestClient(server.app)
+
+def bearer(user_id):
+    return {"Authorization": f"Bearer {server.create_access_token(user_id, email_verified=True)}"}
+
+def test_moderation_endpoints_are_admin_only(client):
+    assert client.get("/api/admin/moderation-flags", headers=bearer("ann")).status_code == 403
+    response = client.post(
+        "/api/admin/moderation-flags/newer/resolve", json={"status": "dismissed"}, headers=bearer("ann")
+    )
+    assert response.status_code == 403
+
+def test_pending_flags_are_listed_newest_first(client):
+    response = client.get("/api/admin/moderation-flags", headers=bearer("admin"))
+    assert response.status_code == 200
+    flags = response.json()["flags"]
+    assert [flag["id"] for flag in flags] == ["newer", "older"]
+    assert flags[0]["matches"] == [{"photo_id": KEPT, "user_id": "ann", "distance": 0}]
+
+    response = client.get("/api/admin/moderation-flags?status=resolved", headers=bearer("admin"))
+    assert response.json()["flags"] == []
+
+def test_resolving_a_flag_releases_photos_nobody_uses(client, fake_db):
+    assert asyncio.run(server.photo_in_use(REMOVED))
+    response = client.post(
+        "/api/admin/moderation-flags/newer/resolve",
+        json={"status": "resolved", "reviewer_notes": "same person"},
+        headers=bearer("admin")
+    )
+    assert response.status_code == 200
+    flag = response.json()["flag"]
+    assert (flag["status"], flag["reviewed_by"], flag["reviewer_notes"]) == ("resolved", "admin", "same person")
+
+    listed = client.get("/api/admin/moderation-flags?status=resolved", headers=bearer("admin")).json()["flags"]
+    assert [flag["id"] for flag in listed] == ["newer"]
+    # The removed photo can now be collected; the one still on ann's profile is left alone
+    photos = fake_db.database.photos
+    assert photos.find_one({"id": REMOVED})["orphaned_at"]
+    assert photos.find_one({"id": KEPT}) is None
+
+def test_only_pending_flags_can_be_closed(client):
+    admin = bearer("admin")
+    url = "/api/admin/moderation-flags/older/resolve"
+    assert client.post(url, json={"status": "pending"}, headers=admin).status_code == 400
+    assert client.post(url, json={"status": "dismissed"}, headers=admin).status_code == 200
+    response = client.post(url, json={"status": "resolved"}, headers=admin)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Flag already reviewed"
+    missing = client.post("/api/admin/moderation-flags/nope/resolve", json={"status": "resolved"}, headers=admin)
+    assert missing.status_code == 404
@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import PRIVATE_USER_FIELDS, build_geo_point
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "principal_cache", server.PrincipalCache())
+    return TestClient(server.app)
+
+def test_own_profile_leaves_out_credentials_and_bookkeeping(client, fake_db):
+    fake_db.database.users.insert_one({
+        "id": "ann", "email_verified": True, "first_name": "Ann", "password_hash": "hash",
+        "latitude": 40.0, "longitude": -74.0, "geo_location": build_geo_point(40.0, -74.0),
+        "discover_exclusion": {"bits": "AAAA"}, "discover_generation": 3, "search_radius": 25
+    })
+    token = server.create_access_token("ann", email_verified=True)
+    profile = client.get("/api/profile/me", headers={"Authorization": f"Bearer {token}"}).json()
+
+    assert not set(PRIVATE_USER_FIELDS) & set(profile)
+    assert profile["first_name"] == "Ann"
+    assert (profile["latitude"], profile["longitude"], profile["search_radius"]) == (40.0, -74.0, 25)
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+from server import accepts_webp, etag_matches, parse_byte_range
+
+PHOTO_BYTES = bytes(range(256)) * 40
+
+@pytest.fixture
+def stored_photo(tmp_path, monkeypatch):
+    """A photo in a local blob store, served as the full-size JPEG (no database read needed)"""
+    store = server.LocalPhotoBlobStore(str(tmp_path))
+    monkeypatch.setattr(server, "photo_store", store)
+    photo_id = asyncio.run(store.put(b"\xff\xd8\xff" + PHOTO_BYTES, "image/jpeg"))
+    return photo_id, b"\xff\xd8\xff" + PHOTO_BYTES
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("BYTES = 5-5", (5, 5)),
+])
+def test_parse_byte_range_satisfiable(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", [
+    "items=0-10",       # other unit
+    "bytes=0-10,20-30",  # multiple ranges
+    "bytes=abc-",       # malformed
+    "bytes=-0",         # empty suffix
+    "bytes=50-10",      # inverted
+])
+def test_parse_byte_range_ignored(header):
+    assert parse_byte_range(header, 1000) is None
+
+def test_parse_byte_range_unsatisfiable():
+    with pytest.raises(HTTPException) as raised:
+        parse_byte_range("bytes=1000-", 1000)
+    assert raised.value.status_code == 416
+    assert raised.value.headers["Content-Range"] == "bytes */1000"
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ("*", True),
+    ('"other"', False),
+    ('"abc-webp"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+@pytest.mark.parametrize("accept, expected", [
+    ("image/avif,image/webp,image/apng,*/*;q=0.8", True),
+    ("IMAGE/WEBP", True),
+    ("image/webp;q=0.5", True),
+    ("image/webp;q=0", False),
+    ("image/webp; q=0.0", False),
+    ("image/webp;q=0.01", True),
+    ("image/*,*/*", False),
+    ("", False),
+])
+def test_accepts_webp(accept, expected):
+    assert accepts_webp(accept) is expected
+
+def test_full_photo_is_served_with_caching_headers(client, stored_photo):
+    photo_id, contents = stored_photo
+    response = client.get(f"/api/photos/{photo_id}")
+    assert response.status_code == 200
+    assert response.content == contents
+    assert response.headers["etag"] == f'"{photo_id}"'
+    assert response.headers["cache-control"] == server.PHOTO_CACHE_CONTROL
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "image/jpeg"
+
+def test_matching_if_none_match_returns_304(client, stored_photo):
+    photo_id, _ = stored_photo
+    response = client.get(f"/api/photos/{photo_id}", headers={"If-None-Match": f'W/"{photo_id}"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{photo_id}"'
+
+def test_byte_range_returns_206(client, stored_photo):
+    photo_id, contents = stored_photo
+    response = client.get(f"/api/photos/{photo_id}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == contents[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(contents)}"
+    assert response.headers["content-length"] == "10"
+
+def test_range_beyond_the_end_returns_416(client, stored_photo):
+    photo_id, contents = stored_photo
+    response = client.get(f"/api/photos/{photo_id}", headers={"Range": f"bytes={len(contents)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(contents)}"
+
+def test_stale_if_range_serves_the_whole_photo(client, stored_photo):
+    photo_id, contents = stored_photo
+    response = client.get(f"/api/photos/{photo_id}", headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == contents
+
+def test_malformed_photo_id_is_not_found(client):
+    assert client.get("/api/photos/not-a-hash").status_code == 404
+
+def test_blob_readers_must_implement_iter_range():
+    class IncompleteReader(server.PhotoBlobReader):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteReader(0, "image/jpeg")
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+from PIL import Image
+
+from server import (
+    PHOTO_DUPLICATE_MAX_DISTANCE, PHOTO_HASH_SEGMENT_BITS, PHOTO_HASH_SEGMENTS, compute_dhash,
+    dhash_probe_keys, dhash_segment_keys
+)
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(PHOTO_HASH_SEGMENTS * PHOTO_HASH_SEGMENT_BITS), count):
+        value ^= 1 << bit
+    return value
+
+def test_segment_keys_are_tagged_with_their_position():
+    keys = dhash_segment_keys(0x0123_4567_89AB_CDEF)
+    assert keys == [0x0_CDEF, 0x1_89AB, 0x2_4567, 0x3_0123]
+
+def test_equal_segments_in_different_positions_do_not_collide():
+    assert len(set(dhash_segment_keys(0xAAAA_AAAA_AAAA_AAAA))) == PHOTO_HASH_SEGMENTS
+
+def test_probe_keys_cover_every_hash_within_max_distance():
+    rng = random.Random(3)
+    for _ in range(500):
+        dhash = rng.getrandbits(64)
+        probes = set(dhash_probe_keys(dhash))
+        for distance in range(PHOTO_DUPLICATE_MAX_DISTANCE + 1):
+            neighbour = flip_bits(dhash, distance, rng)
+            assert probes & set(dhash_segment_keys(neighbour))
+
+def test_all_flips_in_one_segment_still_match_through_the_others():
+    dhash = random.Random(5).getrandbits(64)
+    neighbour = dhash ^ ((1 << PHOTO_DUPLICATE_MAX_DISTANCE) - 1)
+    assert set(dhash_probe_keys(dhash)) & set(dhash_segment_keys(neighbour))
+
+def test_probe_count_is_segments_times_ball_size():
+    # 1 + 16 keys per segment at radius 1
+    assert len(dhash_probe_keys(0)) == PHOTO_HASH_SEGMENTS * (1 + PHOTO_HASH_SEGMENT_BITS)
+
+def test_dhash_survives_resizing():
+    rng = np.random.default_rng(1)
+    pixels = np.clip(rng.normal(128, 60, (8, 9, 3)), 0, 255).astype("uint8")
+    image = Image.fromarray(pixels).resize((900, 800), Image.BICUBIC)
+    smaller = image.resize((450, 400), Image.LANCZOS)
+    assert (compute_dhash(image) ^ compute_dhash(smaller)).bit_count() <= PHOTO_DUPLICATE_MAX_DISTANCE
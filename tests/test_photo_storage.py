@@ -0,0 +1,85 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+from server import MAX_PROFILE_PHOTOS, photo_url
+
+def jpeg(seed, size=(1200, 900)):
+    # Distinct noise per seed, so the pictures don't look like near-duplicates of each other
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1] // 100, size[0] // 100, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize(size).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+def stored_blobs(root):
+    return sorted(path.name for path in root.rglob("*") if path.is_file())
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, fake_db):
+    monkeypatch.setattr(server, "photo_store", server.LocalPhotoBlobStore(str(tmp_path)))
+    monkeypatch.setattr(server, "PHOTO_ORPHAN_GRACE_SECONDS", 0)
+    return tmp_path
+
+def login(fake_db, user_id, **fields):
+    fake_db.database.users.insert_one({"id": user_id, "email_verified": True, "photos": [], **fields})
+    token = server.create_access_token(user_id, email_verified=True)
+    return {"Authorization": f"Bearer {token}"}
+
+def test_upload_at_the_limit_leaves_no_blob_behind(store, fake_db):
+    full_profile = [photo_url(f"{index:064x}") for index in range(MAX_PROFILE_PHOTOS)]
+    headers = login(fake_db, "u1", photos=full_profile)
+    client = TestClient(server.app)
+
+    response = client.post(
+        "/api/profile/upload-photo", files={"file": ("a.jpg", jpeg(1), "image/jpeg")}, headers=headers
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Maximum {MAX_PROFILE_PHOTOS} photos allowed"
+    response = client.post(
+        "/api/profile/upload-photos",
+        files=[("files", ("b.jpg", jpeg(2), "image/jpeg")), ("files", ("c.jpg", jpeg(3), "image/jpeg"))],
+        headers=headers
+    )
+    assert response.status_code == 400
+
+    assert stored_blobs(store)
+    assert asyncio.run(server.collect_orphaned_photos()) == 3
+    assert stored_blobs(store) == []
+    assert fake_db.database.photos.count_documents({}) == 0
+
+def test_duplicate_upload_keeps_the_photo_in_use(store, fake_db):
+    headers = login(fake_db, "u1")
+    client = TestClient(server.app)
+    upload = {"file": ("a.jpg", jpeg(1), "image/jpeg")}
+
+    first = client.post("/api/profile/upload-photo", files=upload, headers=headers)
+    assert first.status_code == 200
+    again = client.post("/api/profile/upload-photo", files=upload, headers=headers)
+    assert again.status_code == 400
+    assert again.json()["detail"] == "Photo already uploaded"
+
+    blobs = stored_blobs(store)
+    assert asyncio.run(server.collect_orphaned_photos()) == 0
+    assert stored_blobs(store) == blobs
+
+def test_deleted_photo_is_collected_unless_shared(store, fake_db):
+    headers = login(fake_db, "u1")
+    other_headers = login(fake_db, "u2")
+    client = TestClient(server.app)
+    shared = {"file": ("a.jpg", jpeg(1), "image/jpeg")}
+    photo_id = client.post("/api/profile/upload-photo", files=shared, headers=headers).json()["photo_id"]
+    assert client.post("/api/profile/upload-photo", files=shared, headers=other_headers).status_code == 200
+    own_id = client.post(
+        "/api/profile/upload-photo", files={"file": ("b.jpg", jpeg(2), "image/jpeg")}, headers=headers
+    ).json()["photo_id"]
+
+    assert client.delete(f"/api/profile/photos/{photo_id}", headers=headers).status_code == 200
+    assert client.delete(f"/api/profile/photos/{own_id}", headers=headers).status_code == 200
+    assert asyncio.run(server.collect_orphaned_photos()) == 1
+    assert asyncio.run(server.photo_store.open(photo_id)) is not None
+    assert asyncio.run(server.photo_store.open(own_id)) is None
@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageCms
+
+import server
+from server import PHOTO_SIZES, estimate_jpeg_quality, render_photo_derivatives, strip_jpeg_metadata
+
+def photo(width, height, seed=1):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x % 256, y % 256, (x + y) % 256], axis=-1) + rng.normal(0, 8, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype("uint8"))
+
+def jpeg(image, quality, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, **options)
+    return buffer.getvalue()
+
+def camera_exif(orientation=1):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010F] = "Test Camera"
+    exif.get_ifd(0x8825)[2] = (48.0, 51.0, 0.0)
+    return exif.tobytes()
+
+@pytest.mark.parametrize("quality", [30, 50, 75, 85, 95])
+def test_estimate_jpeg_quality_recovers_the_encoder_setting(quality):
+    image = Image.open(io.BytesIO(jpeg(photo(64, 64), quality)))
+    assert abs(estimate_jpeg_quality(image.quantization) - quality) <= 1
+
+def test_estimate_jpeg_quality_without_tables():
+    assert estimate_jpeg_quality(None) is None
+    assert estimate_jpeg_quality({}) is None
+
+def test_strip_jpeg_metadata_drops_exif_and_keeps_pixels_and_icc():
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    original = jpeg(photo(120, 80), 80, exif=camera_exif(), icc_profile=icc_profile)
+
+    stripped = strip_jpeg_metadata(original)
+
+    assert b"Exif\x00\x00" in original and b"Exif\x00\x00" not in stripped
+    assert len(stripped) < len(original)
+    stripped_image = Image.open(io.BytesIO(stripped))
+    assert len(stripped_image.getexif()) == 0
+    assert stripped_image.info.get("icc_profile") == icc_profile
+    assert np.array_equal(
+        np.asarray(Image.open(io.BytesIO(original))), np.asarray(stripped_image)
+    )
+
+def test_small_low_quality_jpeg_passes_through_without_metadata():
+    # Smaller than the thumb and below PHOTO_JPEG_QUALITY: every size is the upload minus metadata
+    original = jpeg(photo(80, 60), 70, exif=camera_exif())
+    rendered = render_photo_derivatives(original)
+    for size_name in PHOTO_SIZES:
+        assert rendered["derivatives"][size_name] == strip_jpeg_metadata(original)
+    # Passed-through sizes are served as that JPEG whatever the client accepts
+    assert rendered["webp_derivatives"] == {}
+
+@pytest.mark.skipif(not server.PHOTO_WEBP_ENABLED, reason="Pillow built without WebP")
+def test_webp_renditions_only_for_re_encoded_sizes():
+    # 600px: full is passed through, card and thumb are downscaled
+    rendered = render_photo_derivatives(jpeg(photo(600, 400), 70))
+    assert rendered["derivatives"]["full"] == strip_jpeg_metadata(jpeg(photo(600, 400), 70))
+    assert rendered["webp_derivatives"].keys() == {"card", "thumb"}
+    for size_name, data in rendered["webp_derivatives"].items():
+        rendition = Image.open(io.BytesIO(data))
+        assert rendition.format == "WEBP"
+        assert max(rendition.size) == PHOTO_SIZES[size_name]
+
+def test_rotated_jpeg_is_re_encoded_upright():
+    original = jpeg(photo(200, 100), 70, exif=camera_exif(orientation=6))
+    rendered = render_photo_derivatives(original)
+    assert (rendered["width"], rendered["height"]) == (100, 200)
+    full = Image.open(io.BytesIO(rendered["derivatives"]["full"]))
+    assert full.size == (100, 200)
+    assert len(full.getexif()) == 0
+
+def test_large_upload_gets_every_rendition_at_its_size():
+    rendered = render_photo_derivatives(jpeg(photo(2400, 1600), 92))
+    for size_name, max_side in PHOTO_SIZES.items():
+        rendition = Image.open(io.BytesIO(rendered["derivatives"][size_name]))
+        assert max(rendition.size) == max_side
+
+def test_decompression_bombs_are_refused_from_the_header(monkeypatch):
+    monkeypatch.setattr(server, "PHOTO_MAX_PIXELS", 100 * 100)
+    with pytest.raises(ValueError):
+        render_photo_derivatives(jpeg(photo(200, 200), 80))
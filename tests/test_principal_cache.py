@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import PrincipalCache
+
+class Clock:
+    def __init__(self):
+        self.now = 500.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "principal_cache", PrincipalCache())
+    monkeypatch.setattr(server, "revocation_list", server.RevocationList())
+    fake_db.database.users.insert_one({"id": "u1", "email_verified": True})
+    return TestClient(server.app)
+
+def bearer(user_id):
+    token = server.create_access_token(user_id, session_id="s1", email_verified=True)
+    return {"Authorization": f"Bearer {token}"}
+
+def test_every_token_is_checked_once_then_cached(client, fake_db):
+    headers = bearer("u1")
+    assert client.get("/api/profile/me", headers=headers).status_code == 200
+    assert client.get("/api/profile/me", headers=headers).status_code == 200
+    stats = server.principal_cache.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 1, 1)
+
+def test_deleted_user_is_rejected_once_invalidated(client, fake_db):
+    headers = bearer("u1")
+    assert client.get("/api/profile/me", headers=headers).status_code == 200
+
+    fake_db.database.users.delete_one({"id": "u1"})
+    server.invalidate_principal("u1")
+    assert server.principal_cache.stats()["entries"] == 0
+    response = client.get("/api/profile/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User not found"
+
+def test_unverified_user_is_rejected(client, fake_db):
+    fake_db.database.users.insert_one({"id": "u2", "email_verified": False})
+    response = client.get("/api/profile/me", headers=bearer("u2"))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Email not verified"
+    assert server.principal_cache.stats()["entries"] == 0
+
+def test_revoked_user_is_evicted_and_rejected(client, fake_db):
+    headers = bearer("u1")
+    assert client.get("/api/profile/me", headers=headers).status_code == 200
+
+    asyncio.run(server.revoke_user_tokens("u1"))
+    assert server.principal_cache.stats()["entries"] == 0
+    assert client.get("/api/profile/me", headers=headers).status_code == 401
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PrincipalCache(ttl_seconds=30)
+    cache.add("u1", "jti-1")
+    clock.now += 29
+    assert cache.contains("u1", "jti-1")
+    clock.now += 2
+    assert not cache.contains("u1", "jti-1")
+    assert cache.keys_by_user == {}
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = PrincipalCache(max_entries=2)
+    cache.add("u1", "a")
+    cache.add("u2", "b")
+    assert cache.contains("u1", "a")
+    cache.add("u3", "c")
+    assert not cache.contains("u2", "b")
+    assert cache.contains("u1", "a") and cache.contains("u3", "c")
+    assert cache.stats()["evictions"] == 1
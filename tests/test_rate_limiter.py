@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import InMemoryRateLimiter, RateLimiter, RateLimitRule, client_ip
+
+RULE = RateLimitRule(name="login:email", burst=3, refill_seconds=10)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+def hit(limiter, key="a@example.com", rule=RULE):
+    return asyncio.run(limiter.hit(rule, key))
+
+def test_burst_then_retry_after(clock):
+    limiter = InMemoryRateLimiter()
+    assert [hit(limiter) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert hit(limiter) == pytest.approx(10.0)
+    clock.now += 4
+    assert hit(limiter) == pytest.approx(6.0)
+    assert limiter.stats()["allowed"] == {"login:email": 3}
+    assert limiter.stats()["limited"] == {"login:email": 2}
+
+def test_tokens_refill_over_time_up_to_burst(clock):
+    limiter = InMemoryRateLimiter()
+    for _ in range(3):
+        hit(limiter)
+    clock.now += 10
+    assert hit(limiter) == 0.0
+    assert hit(limiter) > 0
+
+    # A long idle period refills to the burst, not beyond
+    clock.now += 1000
+    assert [hit(limiter) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert hit(limiter) > 0
+
+def test_buckets_are_per_key_and_rule(clock):
+    limiter = InMemoryRateLimiter()
+    for _ in range(3):
+        hit(limiter)
+    assert hit(limiter, key="b@example.com") == 0.0
+    assert hit(limiter, rule=RateLimitRule(name="login:ip", burst=1, refill_seconds=1)) == 0.0
+
+def test_evicting_a_bucket_only_errs_towards_allowing(clock):
+    limiter = InMemoryRateLimiter(max_buckets=1)
+    for _ in range(3):
+        hit(limiter)
+    hit(limiter, key="b@example.com")
+    assert len(limiter.buckets) == 1
+    assert hit(limiter) == 0.0
+
+def test_rate_limiter_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimiter()
+
+def request_from(peer, forwarded_for=None):
+    headers = {"x-forwarded-for": forwarded_for} if forwarded_for is not None else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=peer))
+
+@pytest.mark.parametrize("hops, forwarded_for, expected", [
+    # nginx appends the address it saw; whatever the client sent stays to the left
+    (1, "203.0.113.7", "203.0.113.7"),
+    (1, "1.2.3.4, 203.0.113.7", "203.0.113.7"),
+    (2, "1.2.3.4, 203.0.113.7, 10.0.0.2", "203.0.113.7"),
+    (2, "203.0.113.7", "203.0.113.7"),
+    (0, "1.2.3.4", "127.0.0.1"),
+    (1, None, "127.0.0.1"),
+    (1, " , ", "127.0.0.1"),
+])
+def test_client_ip(monkeypatch, hops, forwarded_for, expected):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", hops)
+    assert client_ip(request_from("127.0.0.1", forwarded_for)) == expected
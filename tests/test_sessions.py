@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+from server import RevocationList
+
+PASSWORD = "Correct-horse1!"
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "revocation_list", RevocationList())
+    monkeypatch.setattr(server, "auth_rate_limiter", server.InMemoryRateLimiter())
+    fake_db.database.users.insert_one({
+        "id": "u1", "email": "u1@example.com", "email_verified": True, "first_name": "Ann", "age": 30,
+        "gender": "female", "gender_preference": "male", "password_hash": server.hash_password(PASSWORD)
+    })
+    return TestClient(server.app)
+
+def login(client):
+    response = client.post("/api/login", json={"email": "u1@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+def test_rotated_refresh_token_is_rejected_on_reuse(client):
+    tokens = login(client)
+    rotated = client.post("/api/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    assert rotated.json()["refresh_token"] != tokens["refresh_token"]
+
+    reused = client.post("/api/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reused.status_code == 401
+    assert client.post("/api/token/refresh", json={"refresh_token": rotated.json()["refresh_token"]}).status_code == 200
+
+def test_logged_out_session_is_rejected(client):
+    tokens = login(client)
+    other = login(client)
+    assert client.post("/api/logout", headers=bearer(tokens)).status_code == 200
+
+    response = client.get("/api/profile/me", headers=bearer(tokens))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Session revoked"
+    assert client.post("/api/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # Other sessions of the same user are unaffected
+    assert client.get("/api/profile/me", headers=bearer(other)).status_code == 200
+
+def test_logged_out_session_is_rejected_on_the_websocket(client):
+    tokens = login(client)
+    with client.websocket_connect(f"/ws/u1?token={tokens['access_token']}"):
+        pass
+    client.post("/api/logout", headers=bearer(tokens))
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/ws/u1?token={tokens['access_token']}") as websocket:
+            websocket.receive_text()
+    assert closed.value.code == 4001
+
+def test_user_cutoff_rejects_tokens_issued_before_it(client):
+    before = login(client)
+    asyncio.run(server.revoke_user_tokens("u1"))
+    after = login(client)
+
+    assert client.get("/api/profile/me", headers=bearer(before)).status_code == 401
+    assert client.post("/api/token/refresh", json={"refresh_token": before["refresh_token"]}).status_code == 401
+    assert client.get("/api/profile/me", headers=bearer(after)).status_code == 200
+
+def test_logout_all_and_password_change_end_every_session(client):
+    first, second = login(client), login(client)
+    assert client.post("/api/logout-all", headers=bearer(first)).status_code == 200
+    assert client.get("/api/profile/me", headers=bearer(second)).status_code == 401
+
+    third = login(client)
+    changed = client.put(
+        "/api/profile/password",
+        json={"current_password": PASSWORD, "new_password": "Battery-staple2!"},
+        headers=bearer(third)
+    )
+    assert changed.status_code == 200
+    assert client.get("/api/profile/me", headers=bearer(third)).status_code == 401
+    assert client.get("/api/profile/me", headers=bearer(changed.json())).status_code == 200
+
+def test_other_workers_pick_up_revocations_on_sync(client):
+    tokens = login(client)
+    payload = server.jwt.decode(tokens["access_token"], server.JWT_SECRET, algorithms=[server.JWT_ALGORITHM])
+    asyncio.run(server.revoke_session(payload["sid"]))
+
+    other_worker = RevocationList()
+    assert not other_worker.is_revoked(payload)
+    asyncio.run(other_worker.sync())
+    assert other_worker.is_revoked(payload)
+    assert other_worker.stats()["revoked_sessions"] == 1
+
+def test_revocation_list_cutoff_and_expiry():
+    revocations = RevocationList()
+    now = datetime.utcnow()
+    revocations.add({
+        "kind": "user", "user_id": "u1", "revoked_before": now, "expires_at": now + timedelta(minutes=5)
+    })
+    issued = now.replace(tzinfo=timezone.utc).timestamp()
+    assert revocations.is_revoked({"user_id": "u1", "iat": issued - 0.001})
+    assert not revocations.is_revoked({"user_id": "u1", "iat": issued + 0.001})
+    assert not revocations.is_revoked({"user_id": "u2", "iat": issued - 60})
+    # An older cutoff never replaces a newer one
+    revocations.add({
+        "kind": "user", "user_id": "u1", "revoked_before": now - timedelta(minutes=1),
+        "expires_at": now + timedelta(minutes=5)
+    })
+    assert revocations.is_revoked({"user_id": "u1", "iat": issued - 1})
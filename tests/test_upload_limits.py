@@ -0,0 +1,103 @@
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+import server
+from server import MAX_IMAGE_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware
+
+UPLOAD_PATH = "/api/profile/upload-photo"
+UPLOAD_LIMIT = MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
+async def read_body_app(scope, receive, send):
+    """Reads the whole body like a form parser would, then answers 200 with its size"""
+    size = 0
+    while True:
+        message = await receive()
+        size += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = json.dumps({"received": size}).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+def call(path, chunks, content_length=None):
+    """Run a request through the middleware; returns (status, body, chunks the app pulled)"""
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    pending = list(chunks)
+    pulled = 0
+    sent = []
+
+    async def receive():
+        nonlocal pulled
+        pulled += 1
+        body = pending.pop(0) if pending else b""
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(UploadSizeLimitMiddleware(read_body_app)(scope, receive, send))
+    status = next(message["status"] for message in sent if message["type"] == "http.response.start")
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return status, body, pulled
+
+def test_body_within_limit_passes_through():
+    status, body, _ = call(UPLOAD_PATH, [b"x" * 1024] * 4, content_length=4096)
+    assert status == 200
+    assert json.loads(body) == {"received": 4096}
+
+def test_declared_length_over_limit_is_rejected_before_reading():
+    status, body, pulled = call(UPLOAD_PATH, [b"x" * 1024], content_length=UPLOAD_LIMIT + 1)
+    assert status == 413
+    assert json.loads(body) == {"detail": "Request body too large"}
+    assert pulled == 0
+
+def test_streamed_body_is_cut_off_once_the_limit_is_crossed():
+    chunk = b"x" * (1024 * 1024)
+    chunks = [chunk] * (UPLOAD_LIMIT // len(chunk) + 10)
+    status, _, pulled = call(UPLOAD_PATH, chunks)
+    assert status == 413
+    assert pulled == UPLOAD_LIMIT // len(chunk) + 1
+
+def test_other_paths_are_not_limited():
+    chunks = [b"x" * (1024 * 1024)] * (UPLOAD_LIMIT // (1024 * 1024) + 2)
+    status, _, _ = call("/api/profile", chunks)
+    assert status == 200
+
+def image_bytes(image_format="JPEG", exif=None, size=(64, 48)):
+    buffer = io.BytesIO()
+    options = {"exif": exif.tobytes()} if exif is not None else {}
+    Image.new("RGB", size, "green").save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+def upload(data, filename="photo.jpg"):
+    return UploadFile(io.BytesIO(data), filename=filename)
+
+def test_read_image_upload_rejects_non_images():
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.read_image_upload(upload(b"%PDF-1.7 not an image")))
+    assert raised.value.status_code == 400
+
+def test_read_image_upload_rejects_oversize_files():
+    data = image_bytes()
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.read_image_upload(upload(data + b"\0" * 2048), max_bytes=len(data)))
+    assert raised.value.status_code == 413
+
+def test_read_image_upload_returns_contents_and_sniffed_type():
+    data = image_bytes("PNG")
+    assert asyncio.run(server.read_image_upload(upload(data, "photo.jpg"))) == (data, "image/png")
+
+def test_private_photos_lose_gps_and_keep_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees
+    exif.get_ifd(0x8825)[2] = (51.0, 30.0, 0.0)  # GPS latitude
+    rendered = Image.open(io.BytesIO(server.render_private_photo(image_bytes(exif=exif, size=(64, 48)))))
+    assert rendered.format == "JPEG"
+    assert rendered.size == (48, 64)
+    assert len(rendered.getexif()) == 0
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import server
+from server import UserLoader
+
+USERS = {
+    "a": {"id": "a", "first_name": "Ann", "gender": "female", "blocked_users": ["c"]},
+    "b": {"id": "b", "first_name": "Bob", "gender": "male", "blocked_users": []},
+}
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeUsers:
+    """Answers the {"id": {"$in": ...}} queries UserLoader sends and records them"""
+
+    def __init__(self):
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append((sorted(query["id"]["$in"]), projection))
+        fields = {field for field, included in projection.items() if included and field != "_id"}
+        return FakeCursor(
+            {field: value for field, value in USERS[user_id].items() if not fields or field in fields}
+            for user_id in query["id"]["$in"] if user_id in USERS
+        )
+
+@pytest.fixture
+def users(monkeypatch):
+    users = FakeUsers()
+    monkeypatch.setattr(server, "db", type("FakeDB", (), {"users": users})())
+    return users
+
+def test_concurrent_loads_share_one_query(users):
+    async def scenario():
+        loader = UserLoader()
+        return loader, await asyncio.gather(
+            loader.load("a", ["first_name"]),
+            loader.load("b", ["gender"]),
+            loader.load("missing", ["first_name"]),
+        )
+
+    loader, (ann, bob, missing) = asyncio.run(scenario())
+    assert len(users.queries) == 1
+    assert users.queries[0][0] == ["a", "b", "missing"]
+    assert users.queries[0][1] == {"_id": 0, "id": 1, "first_name": 1, "gender": 1}
+    assert ann == {"id": "a", "first_name": "Ann"}
+    assert bob == {"id": "b", "gender": "male"}
+    assert missing is None
+    assert (loader.lookups, loader.round_trips) == (3, 1)
+
+def test_loaded_fields_are_served_from_memory(users):
+    async def scenario():
+        loader = UserLoader()
+        await loader.load("a", ["first_name", "gender"])
+        again = await loader.load("a", ["gender"])
+        missing_twice = [await loader.load("missing"), await loader.load("missing")]
+        return again, missing_twice
+
+    again, missing_twice = asyncio.run(scenario())
+    assert again == {"id": "a", "gender": "female"}
+    assert missing_twice == [None, None]
+    # One query for "a", one for "missing"
+    assert len(users.queries) == 2
+
+def test_only_missing_fields_are_fetched(users):
+    async def scenario():
+        loader = UserLoader()
+        await loader.load("a", ["first_name"])
+        return await loader.load("a", ["first_name", "blocked_users"])
+
+    user_doc = asyncio.run(scenario())
+    assert user_doc == {"id": "a", "first_name": "Ann", "blocked_users": ["c"]}
+    assert users.queries[1][1] == {"_id": 0, "id": 1, "blocked_users": 1}
+
+def test_whole_document_and_copies(users):
+    async def scenario():
+        loader = UserLoader()
+        full = await loader.load("b")
+        full["first_name"] = "changed"
+        return await loader.load("b", ["first_name"])
+
+    assert asyncio.run(scenario()) == {"id": "b", "first_name": "Bob"}
+    assert users.queries[0][1] == {"_id": 0}
+    assert len(users.queries) == 1
+
+def test_forget_refetches(users):
+    async def scenario():
+        loader = UserLoader()
+        await loader.load("a", ["first_name"])
+        loader.forget("a")
+        await loader.load("a", ["first_name"])
+
+    asyncio.run(scenario())
+    assert len(users.queries) == 2